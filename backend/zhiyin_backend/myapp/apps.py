@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from myapp.utils.audio import connect_audio_signals
+        from myapp.utils.lyrics import connect_lyric_signals
+        from myapp.utils.slow_query import install_slow_query_wrapper
+        from myapp.utils.storage import connect_media_ref_signals
+
+        # 慢查询记录
+        connection_created.connect(install_slow_query_wrapper, dispatch_uid="myapp_slow_query")
+        # 媒体文件引用计数
+        connect_media_ref_signals()
+        # 歌曲音频文件变化后分析时长、码率等属性
+        connect_audio_signals()
+        # 歌词文件变化后重新生成搜索用的歌词文本
+        connect_lyric_signals()
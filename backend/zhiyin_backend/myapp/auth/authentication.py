@@ -1,10 +1,14 @@
 # token验证
+import hmac
 
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
 from myapp.models import User
 from myapp.utils.common import get_redis_token_key
 from myapp.utils.jwt_token import decode_jwt
+from myapp.logging.context import bind as bind_log_context
 from myapp.logging.logger import logger
 from myapp.utils.redis import get_redis_client
 
@@ -41,6 +45,7 @@ class BaseTokenAuthentication(BaseAuthentication):
             if not r.exists(redis_key):
                 raise AuthenticationFailed("Token 已失效，请重新登录")
 
+            bind_log_context(user_id=str(user.id))
             return user, token
 
         except AuthenticationFailed:
@@ -71,3 +76,21 @@ class UserAuthentication(BaseTokenAuthentication):
     """
 
     pass
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    监控指标抓取认证（Prometheus 使用 settings.METRICS_TOKEN 作为 Bearer Token）
+    未配置或不匹配时返回 None，交由后续认证类处理
+    """
+
+    def authenticate(self, request):
+        expected = getattr(settings, "METRICS_TOKEN", "")
+        auth_header = request.headers.get("Authorization", "")
+        if not expected or not auth_header.startswith("Bearer "):
+            return None
+
+        token = auth_header.split(" ")[1]
+        if hmac.compare_digest(token.encode(), expected.encode()):
+            return AnonymousUser(), token
+        return None
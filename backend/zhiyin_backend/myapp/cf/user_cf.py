@@ -4,6 +4,10 @@
 import math
 from typing import Dict, List, Tuple, Optional
 
+from myapp.logging.tracing import get_tracer, stage
+
+tracer = get_tracer("user_cf")
+
 
 class UserCf:
     """基于用户的协同过滤推荐系统（使用字符串user_id）"""
@@ -41,7 +45,7 @@ class UserCf:
                 return 0.0
             return numerator / (denominator_x * denominator_y)
         except Exception as e:
-            print(f"计算皮尔逊相关系数时出错: {str(e)}")
+            tracer.debug("计算皮尔逊相关系数时出错: %s", e)
             return None
 
     def nearest_users(self, user_id: str, n: int = 1) -> List[Tuple[str, float]]:
@@ -63,8 +67,9 @@ class UserCf:
             sim = self.pearson(target_user, items)
             if sim is not None:
                 similarities[other_user] = sim
-        print(f"用户 {user_id} 的相似用户及相似度: {similarities}")
-        return sorted(similarities.items(), key=lambda x: abs(x[1]), reverse=True)[:n]
+        nearest = sorted(similarities.items(), key=lambda x: abs(x[1]), reverse=True)[:n]
+        tracer.debug("用户 %s 共有 %d 个可比较的用户，最相似: %s", user_id, len(similarities), nearest)
+        return nearest
 
     def recommend(self, user_id: str, n_neighbors: int = 1) -> List[str]:
         """
@@ -77,10 +82,14 @@ class UserCf:
             raise ValueError(f"用户ID {user_id} 不存在于数据集中")
         recommendations = set()
         target_items = self.data[user_id].keys()
-        for neighbor, _ in self.nearest_users(user_id, n_neighbors):
-            for item in self.data[neighbor]:
-                if item not in target_items:
-                    recommendations.add(item)
-                    print(f"从相似用户 {neighbor} 推荐物品: {item}")
+        with stage("similarity"):
+            neighbors = self.nearest_users(user_id, n_neighbors)
+        with stage("selection"):
+            for neighbor, _ in neighbors:
+                before = len(recommendations)
+                for item in self.data[neighbor]:
+                    if item not in target_items:
+                        recommendations.add(item)
+                tracer.debug("从相似用户 %s 推荐 %d 个物品", neighbor, len(recommendations) - before)
 
         return list(recommendations)
@@ -0,0 +1,50 @@
+# 日志上下文（请求 ID、用户 ID、路由、请求开始时间）
+# 由 RequestContextMiddleware 和认证类写入，异步日志处理器在调用线程中把它们复制到日志记录上
+
+import contextvars
+import time
+
+_log_context = contextvars.ContextVar("log_context", default=None)
+
+
+def bind_request(request_id: str):
+    """请求开始时调用，返回用于结束时恢复的 token"""
+    return _log_context.set({
+        "request_id": request_id,
+        "user_id": None,
+        "route": None,
+        "start": time.perf_counter(),
+    })
+
+
+def unbind_request(token):
+    _log_context.reset(token)
+
+
+def bind(**values):
+    """补充当前请求的上下文（如认证后的 user_id、解析后的 route）"""
+    context = _log_context.get()
+    if context is not None:
+        context.update(values)
+
+
+def current_context():
+    """当前请求的原始上下文（字典），不在请求中时为 None"""
+    return _log_context.get()
+
+
+def get_log_context(context: dict = None) -> dict:
+    """
+    请求上下文中需要写入日志的字段，latency_ms 为从请求开始到现在的耗时
+    context 默认取当前请求的上下文
+    """
+    if context is None:
+        context = _log_context.get()
+    if context is None:
+        return {}
+    return {
+        "request_id": context["request_id"],
+        "user_id": context["user_id"],
+        "route": context["route"],
+        "latency_ms": round((time.perf_counter() - context["start"]) * 1000, 2),
+    }
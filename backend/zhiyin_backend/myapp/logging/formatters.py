@@ -0,0 +1,41 @@
+# 结构化 JSON 日志格式
+
+import datetime
+import json
+import logging
+
+# 日志记录的标准属性，其余属性（extra 传入的字段）原样输出
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_CONTEXT_FIELDS = ("request_id", "user_id", "route", "latency_ms")
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.thread,
+            "message": record.getMessage(),
+        }
+        for field in _CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key not in _CONTEXT_FIELDS and key not in data and not key.startswith("_"):
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
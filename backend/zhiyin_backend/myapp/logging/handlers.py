@@ -0,0 +1,127 @@
+# 异步日志处理器
+# 调用线程只负责整理日志记录并放入队列，文件写入、滚动和压缩都在每个进程一个的后台线程中完成，
+# 请求线程不会因为文件锁或 gzip 压缩而阻塞
+#
+# 在 LOGGING 中的用法（需要设置 LOGGING_CONFIG = "myapp.logging.handlers.configure_logging"）：
+#   "queue_app": {
+#       "class": "myapp.logging.handlers.AsyncHandler",
+#       "handlers": ["console", "app_file", "error_file"],
+#   }
+
+import atexit
+import logging
+import logging.config
+import os
+import queue
+import threading
+
+from myapp.logging.context import get_log_context
+
+_STOP = object()
+
+
+class _Dispatcher:
+    """每个进程一个队列和一个后台线程，按记录所属的异步处理器分发给目标处理器"""
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def put(self, targets, record):
+        pid = os.getpid()
+        if self._pid != pid:
+            # 首次使用或 fork 之后重新创建队列和线程
+            with self._lock:
+                if self._pid != pid:
+                    self._queue = queue.SimpleQueue()
+                    self._thread = threading.Thread(target=self._run, name="log-dispatcher", daemon=True)
+                    self._thread.start()
+                    self._pid = pid
+        self._queue.put((targets, record))
+
+    def _run(self):
+        q = self._queue
+        while True:
+            item = q.get()
+            if item is _STOP:
+                break
+            targets, record = item
+            for handler in targets:
+                if record.levelno >= handler.level:
+                    try:
+                        handler.handle(record)
+                    except Exception:
+                        handler.handleError(record)
+
+    def stop(self):
+        """进程退出时写完队列中剩余的日志"""
+        if self._pid == os.getpid() and self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+
+
+_dispatcher = _Dispatcher()
+atexit.register(_dispatcher.stop)
+
+
+class AsyncHandler(logging.Handler):
+    """
+    把日志记录放入队列，由后台线程交给 handlers 中列出的处理器
+    handlers 可以是处理器对象，也可以是 LOGGING 中的处理器名称，名称由 configure_logging 在全部处理器创建之后绑定
+    """
+
+    def __init__(self, handlers=(), level=logging.NOTSET):
+        super().__init__(level)
+        self.handler_names = [name for name in handlers if not isinstance(name, logging.Handler)]
+        self.targets = None if self.handler_names else list(handlers)
+
+    def bind(self, handlers: dict):
+        """按名称绑定目标处理器（名称 -> 处理器对象）"""
+        missing = [name for name in self.handler_names if not isinstance(handlers.get(name), logging.Handler)]
+        if missing:
+            raise ValueError(f"日志处理器 {self.name} 引用了不存在的处理器: {missing}")
+        self.targets = [handlers[name] for name in self.handler_names]
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """在调用线程中完成消息格式化并附加请求上下文，之后记录不再依赖调用方的对象"""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        context = get_log_context()
+        if not context and hasattr(record, "request"):
+            # django.request 在中间件返回之后才记录 4xx/5xx 日志，此时从请求对象上取上下文
+            context = get_log_context(getattr(record.request, "log_context", None))
+        for key, value in context.items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.targets is None:
+                raise RuntimeError(f"日志处理器 {self.name} 的目标处理器未绑定，请使用 configure_logging 加载日志配置")
+            _dispatcher.put(self.targets, self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class LoggingConfigurator(logging.config.DictConfigurator):
+    """在 dictConfig 创建完全部处理器之后为异步处理器绑定目标，不依赖处理器的创建顺序"""
+
+    def configure(self):
+        super().configure()
+        handlers = self.config.get("handlers", {})
+        for name in list(handlers):
+            handler = handlers[name]
+            if isinstance(handler, AsyncHandler):
+                # 目标处理器只被异步处理器引用，绑定后由它持有强引用，配置对象释放后也不会被回收
+                handler.bind(handlers)
+
+
+def configure_logging(config: dict):
+    """LOGGING_CONFIG 使用的配置函数，用法同 logging.config.dictConfig"""
+    LoggingConfigurator(config).configure()
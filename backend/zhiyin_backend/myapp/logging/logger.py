@@ -1,7 +1,24 @@
 # core/logger.py
 import logging
+import os
+import random
+import threading
+import time
 from typing import Optional, Any
 
+_THIS_FILE = os.path.normcase(__file__)
+# 限流状态超过该数量时清理过期窗口，防止 rate_key 过多导致内存增长
+_MAX_RATE_WINDOWS = 10000
+
+
+def _lookup(config: dict, name: str):
+    """按记录器层级查找配置：myapp.recommend -> myapp"""
+    while name:
+        if name in config:
+            return config[name]
+        name = name.rpartition(".")[0]
+    return None
+
 
 class AppLogger:
     """
@@ -10,41 +27,124 @@ class AppLogger:
     from core.logger import logger
     logger.info("Processing request", extra={"user": user.id})
     logger.error("Failed to process", exc_info=True)
+
+    采样和限流（默认取 settings.LOG_SAMPLE_RATES / LOG_RATE_LIMITS 中本记录器或上级记录器的配置）：
+    - sample_rates: {"DEBUG": 0.1} 表示 DEBUG 日志只保留 10%
+    - rate_limit: (count, seconds) 同一调用位置 seconds 秒内最多记录 count 条，
+      超出的只计数，下个窗口的第一条日志附带被丢弃的数量；rate_key 参数可以让多个位置共用一个限额
+    - 记录器没有配置限流时，只有指定了 rate_key 的调用按 settings.LOG_RATE_KEY_LIMIT 限流，
+      其他日志（尤其是错误日志）不会被丢弃
     """
 
-    def __init__(self, name: str = "myapp"):
+    def __init__(self, name: str = "myapp", sample_rates: Optional[dict] = None,
+                 rate_limit: Optional[tuple] = None):
         self._logger = logging.getLogger(name)
+        self._sample_rates = sample_rates
+        self._rate_limit = rate_limit
+        self._rate_key_limit = None
+        self._windows = {}  # 限流键 -> [窗口开始时间, 已记录条数, 被丢弃条数]
+        self._lock = threading.Lock()
+
+    @property
+    def sample_rates(self) -> dict:
+        if self._sample_rates is None:
+            from django.conf import settings
+            self._sample_rates = _lookup(getattr(settings, "LOG_SAMPLE_RATES", {}), self._logger.name) or {}
+        return self._sample_rates
+
+    @property
+    def rate_limit(self):
+        if self._rate_limit is None:
+            from django.conf import settings
+            self._rate_limit = _lookup(getattr(settings, "LOG_RATE_LIMITS", {}), self._logger.name) or ()
+        return self._rate_limit
+
+    @property
+    def rate_key_limit(self):
+        if self._rate_key_limit is None:
+            from django.conf import settings
+            self._rate_key_limit = tuple(getattr(settings, "LOG_RATE_KEY_LIMIT", ()) or ())
+        return self._rate_key_limit
+
+    @staticmethod
+    def _find_caller():
+        """返回 (调用位置, stacklevel)，跳过本文件内的调用"""
+        frame = logging.currentframe().f_back
+        depth = 0
+        while frame and os.path.normcase(frame.f_code.co_filename) == _THIS_FILE:
+            frame = frame.f_back
+            depth += 1
+        if frame is None:
+            return None, 1
+        # stacklevel=1 对应 _log 本身
+        return (frame.f_code.co_filename, frame.f_lineno), depth + 1
+
+    def _check_rate(self, key, limit: tuple):
+        """返回 (是否记录, 上个窗口被丢弃的条数)"""
+        count, seconds = limit
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= seconds:
+                suppressed = window[2] if window else 0
+                if len(self._windows) >= _MAX_RATE_WINDOWS:
+                    self._windows = {k: w for k, w in self._windows.items() if now - w[0] < seconds}
+                self._windows[key] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < count:
+                window[1] += 1
+                return True, 0
+            window[2] += 1
+            return False, 0
+
+    def _log(self, level: int, msg: str, *args, rate_key: Optional[str] = None, **kwargs):
+        if not self._logger.isEnabledFor(level):
+            return
+
+        sample_rate = self.sample_rates.get(logging.getLevelName(level))
+        if sample_rate is not None and random.random() >= sample_rate:
+            return
+
+        caller, stacklevel = self._find_caller()
+        limit = self.rate_limit or (rate_key and self.rate_key_limit)
+        if limit:
+            allowed, suppressed = self._check_rate(rate_key or caller, limit)
+            if not allowed:
+                return
+            if suppressed:
+                msg = f"{msg}（此前 {limit[1]} 秒内有 {suppressed} 条同类日志被限流）"
 
-    def _log(self, level: int, msg: str, **kwargs):
         # 自动添加调用上下文信息
         extra = kwargs.pop('extra', {})
         if 'extra' not in kwargs:
             kwargs['extra'] = extra
+        # 日志中的模块和行号指向业务代码，而不是本文件
+        kwargs.setdefault('stacklevel', stacklevel)
 
-        self._logger.log(level, msg, **kwargs)
+        self._logger.log(level, msg, *args, **kwargs)
 
-    def debug(self, msg: str, **kwargs):
-        self._log(logging.DEBUG, msg, **kwargs)
+    def debug(self, msg: str, *args, **kwargs):
+        self._log(logging.DEBUG, msg, *args, **kwargs)
 
-    def info(self, msg: str, **kwargs):
-        self._log(logging.INFO, msg, **kwargs)
+    def info(self, msg: str, *args, **kwargs):
+        self._log(logging.INFO, msg, *args, **kwargs)
 
-    def warning(self, msg: str, **kwargs):
-        self._log(logging.WARNING, msg, **kwargs)
+    def warning(self, msg: str, *args, **kwargs):
+        self._log(logging.WARNING, msg, *args, **kwargs)
 
-    def error(self, msg: str, exc_info: Optional[Any] = True, **kwargs):
+    def error(self, msg: str, *args, exc_info: Optional[Any] = True, **kwargs):
         """
         增强的error记录，自动捕获异常堆栈
         :param exc_info: True|False|异常对象
         """
-        self._log(logging.ERROR, msg, exc_info=exc_info, **kwargs)
+        self._log(logging.ERROR, msg, *args, exc_info=exc_info, **kwargs)
 
-    def critical(self, msg: str, exc_info: Optional[Any] = True, **kwargs):
-        self._log(logging.CRITICAL, msg, exc_info=exc_info, **kwargs)
+    def critical(self, msg: str, *args, exc_info: Optional[Any] = True, **kwargs):
+        self._log(logging.CRITICAL, msg, *args, exc_info=exc_info, **kwargs)
 
-    def exception(self, msg: str, **kwargs):
+    def exception(self, msg: str, *args, **kwargs):
         """专门记录异常的方法"""
-        self.error(msg, exc_info=True, **kwargs)
+        self.error(msg, *args, exc_info=True, **kwargs)
 
 
 # 默认应用日志记录器
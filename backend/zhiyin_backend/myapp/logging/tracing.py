@@ -0,0 +1,125 @@
+# 调试追踪
+# 记录器 myapp.trace.* 默认为 INFO 级别，此时 span / stage 都是空操作，不计时、不格式化任何内容；
+# 在 LOGGING 中把 myapp.trace（或某个子记录器）设为 DEBUG 即可开启，每个 span 结束时输出一行各阶段耗时
+#
+# 用法：
+#   tracer = get_tracer("recommend")
+#   with tracer.span("get_recommend", user_id=user_id) as span:
+#       with stage("load"):
+#           ...
+#       span.set(users=len(user_data))
+#       tracer.debug("推荐结果: %s", ids)  # 参数只在开启时才格式化
+#
+# stage() 挂在当前上下文中正在进行的 span 上，被调用的函数（如 UserCf）不需要传递 span 对象
+
+import contextvars
+import logging
+import time
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+
+class _NoopSpan:
+    """未开启追踪时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Stage:
+    __slots__ = ("span", "name", "start")
+
+    def __init__(self, span, name: str):
+        self.span = span
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.stages.append((self.name, (time.perf_counter() - self.start) * 1000))
+        return False
+
+    def set(self, **fields):
+        self.span.set(**fields)
+
+
+class Span:
+    """一次追踪，记录总耗时、各阶段耗时和附加字段，结束时输出一条 DEBUG 日志"""
+
+    def __init__(self, logger: logging.Logger, name: str, fields: dict):
+        self._logger = logger
+        self.name = name
+        self.fields = fields
+        self.stages = []
+        self.elapsed_ms = None
+        self.error = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (time.perf_counter() - self._start) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self._logger.debug("%s", self, stacklevel=2)
+        return False
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __str__(self):
+        parts = [f"[trace] {self.name} {self.elapsed_ms:.2f}ms"]
+        if self.stages:
+            parts.append(" ".join(f"{name}={ms:.2f}ms" for name, ms in self.stages))
+        if self.fields:
+            parts.append(" ".join(f"{key}={value}" for key, value in self.fields.items()))
+        if self.error:
+            parts.append(f"error={self.error}")
+        return " | ".join(parts)
+
+
+class Tracer:
+    def __init__(self, name: str):
+        self._logger = logging.getLogger(f"myapp.trace.{name}")
+
+    @property
+    def enabled(self) -> bool:
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def span(self, name: str, **fields):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self._logger, name, fields)
+
+    def debug(self, msg: str, *args):
+        """参数按 % 格式延迟格式化，未开启时不做任何处理"""
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(msg, *args, stacklevel=2)
+
+
+def stage(name: str):
+    """在当前 span 中记录一个阶段的耗时，没有进行中的 span 时为空操作"""
+    span = _current_span.get()
+    if span is None:
+        return _NOOP_SPAN
+    return _Stage(span, name)
+
+
+def get_tracer(name: str) -> Tracer:
+    return Tracer(name)
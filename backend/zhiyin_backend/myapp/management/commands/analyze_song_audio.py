@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils._os import safe_join
+
+from myapp.models import Song
+from myapp.utils.audio import AudioParseError, analyze_audio, apply_audio_metadata
+
+
+class Command(BaseCommand):
+    help = "并行分析 upload/source 中已有歌曲的音频文件，补充时长、码率、采样率、文件大小等属性"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="分析进程数（默认 CPU 核数）")
+        parser.add_argument("--force", action="store_true", help="重新分析已有时长的歌曲")
+        parser.add_argument("--progress", type=int, default=500, help="每分析多少个文件输出一次进度（默认 500）")
+
+    def handle(self, *args, **options):
+        queryset = Song.objects.filter(source__startswith="source/")
+        if not options["force"]:
+            queryset = queryset.filter(duration__isnull=True)
+
+        # 内容相同的文件路径相同，每个文件只分析一次
+        songs_by_source = {}
+        for pk, source in queryset.values_list("pk", "source").iterator():
+            songs_by_source.setdefault(source, []).append(pk)
+        total = len(songs_by_source)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("没有需要分析的音频文件"))
+            return
+        self.stdout.write(f"待分析 {total} 个音频文件，{options['workers']} 个进程")
+
+        started = time.monotonic()
+        done = failed = updated = total_bytes = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {}
+            for source in songs_by_source:
+                try:
+                    futures[executor.submit(analyze_audio, safe_join(settings.MEDIA_ROOT, source))] = source
+                except Exception as e:
+                    self.stderr.write(f"{source}: {e}")
+                    failed += 1
+
+            for future in as_completed(futures):
+                source = futures[future]
+                done += 1
+                try:
+                    result = future.result()
+                except (AudioParseError, OSError) as e:
+                    self.stderr.write(f"{source}: {e}")
+                    failed += 1
+                else:
+                    total_bytes += result["file_size"]
+                    for pk in songs_by_source[source]:
+                        updated += apply_audio_metadata(pk, source, result)
+                if done % options["progress"] == 0:
+                    self._report(done, total, total_bytes, started)
+
+        self._report(done, total, total_bytes, started)
+        self.stdout.write(self.style.SUCCESS(f"完成，更新 {updated} 首歌曲，{failed} 个文件分析失败"))
+
+    def _report(self, done, total, total_bytes, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"已分析 {done}/{total} 个文件，耗时 {elapsed:.1f}s，"
+            f"{done / elapsed:.1f} 个/s，{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s"
+        )
@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from myapp.models import ClassificationStats, Comment, DailyStats, LoginLog, Song, User
+
+
+class Command(BaseCommand):
+    help = "按日期重新统计每日汇总数据（新增用户、歌曲、评论、登录）及各分类歌曲数，建议每晚执行"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=2, help="重新统计最近几天（默认 2，即昨天和今天）")
+        parser.add_argument("--date", help="只统计指定日期，格式 YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            try:
+                dates = [datetime.datetime.strptime(options["date"], "%Y-%m-%d").date()]
+            except ValueError:
+                raise CommandError("日期格式错误，应为 YYYY-MM-DD")
+        else:
+            if options["days"] < 1:
+                raise CommandError("--days 必须大于 0")
+            today = datetime.date.today()
+            dates = [today - datetime.timedelta(days=i) for i in range(options["days"] - 1, -1, -1)]
+
+        for date in dates:
+            stats = self.backfill(date)
+            self.stdout.write(f"{date}: {stats}")
+
+        counts = self.recount_classifications()
+        self.stdout.write(f"分类歌曲数: {counts}")
+
+        self.stdout.write(self.style.SUCCESS(f"统计完成，共 {len(dates)} 天"))
+
+    @staticmethod
+    def backfill(date: datetime.date) -> dict:
+        """
+        使用 [当天 0 点, 次日 0 点) 的时间范围统计，可以走时间列索引
+        播放次数没有明细记录，保留增量统计的结果
+        """
+        start = datetime.datetime.combine(date, datetime.time.min)
+        end = start + datetime.timedelta(days=1)
+
+        stats = {
+            "new_users": User.objects.filter(create_time__gte=start, create_time__lt=end).count(),
+            "new_songs": Song.objects.filter(create_time__gte=start, create_time__lt=end).count(),
+            "comments": Comment.objects.filter(comment_time__gte=start, comment_time__lt=end).count(),
+            "logins": LoginLog.objects.filter(log_time__gte=start, log_time__lt=end).count(),
+        }
+        DailyStats.objects.update_or_create(date=date, defaults=stats)
+        return stats
+
+    @staticmethod
+    def recount_classifications() -> dict:
+        """按歌曲表重新统计各分类的歌曲数，修正增量维护之外的修改（如批量导入）造成的偏差"""
+        counts = dict(
+            Song.objects.filter(classification__isnull=False)
+            .values_list("classification_id")
+            .annotate(count=Count("id"))
+        )
+        with transaction.atomic():
+            ClassificationStats.objects.exclude(classification_id__in=counts.keys()).update(song_count=0)
+            for classification_id, count in counts.items():
+                ClassificationStats.objects.update_or_create(
+                    classification_id=classification_id, defaults={"song_count": count}
+                )
+        return counts
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils.storage import collect_unreferenced_blobs, recount_refs
+
+
+class Command(BaseCommand):
+    help = "回收内容寻址存储中没有被引用的媒体文件"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours", type=float, default=getattr(settings, "MEDIA_BLOB_GRACE_HOURS", 24),
+            help="引用数为 0 的文件至少保留的小时数（默认 MEDIA_BLOB_GRACE_HOURS）",
+        )
+        parser.add_argument("--recount", action="store_true", help="回收前按业务数据重新统计引用次数")
+        parser.add_argument("--dry-run", action="store_true", help="只列出将要删除的文件")
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            self.stdout.write(f"重新统计引用次数，{recount_refs()} 个文件有变化")
+
+        paths = collect_unreferenced_blobs(int(options["grace_hours"] * 3600), dry_run=options["dry_run"])
+        for path in paths:
+            self.stdout.write(path)
+        action = "将删除" if options["dry_run"] else "已删除"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(paths)} 个未被引用的文件"))
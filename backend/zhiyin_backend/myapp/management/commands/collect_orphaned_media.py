@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils.media_gc import collect_orphaned_media
+
+
+class Command(BaseCommand):
+    help = "回收 MEDIA_ROOT 中没有被歌曲、歌单、用户、广告、反馈引用的文件（含衍生图、波形和遗留的临时文件）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours", type=float, default=getattr(settings, "MEDIA_BLOB_GRACE_HOURS", 24),
+            help="最近修改过的文件至少保留的小时数（默认 MEDIA_BLOB_GRACE_HOURS）",
+        )
+        parser.add_argument("--workers", type=int, default=4, help="并行遍历和删除的线程数（默认 4）")
+        parser.add_argument("--dry-run", action="store_true", help="只列出将要删除的文件")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        files = collect_orphaned_media(
+            int(options["grace_hours"] * 3600), dry_run=options["dry_run"], workers=max(1, options["workers"])
+        )
+        for path, size in files:
+            self.stdout.write(f"{path}\t{size}")
+        total = sum(size for _, size in files)
+        action = "将删除" if options["dry_run"] else "已删除"
+        self.stdout.write(self.style.SUCCESS(
+            f"{action} {len(files)} 个孤立文件，共 {total / 1024 / 1024:.1f}MB，耗时 {time.monotonic() - started:.1f}s"
+        ))
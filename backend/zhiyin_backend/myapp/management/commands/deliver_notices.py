@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils.notice_delivery import get_unfinished_deliveries, run_notice_delivery
+
+
+class Command(BaseCommand):
+    help = "恢复未完成的定向通知投递（待投递、失败或执行进程崩溃的任务）"
+
+    def handle(self, *args, **options):
+        notice_ids = list(get_unfinished_deliveries())
+        if not notice_ids:
+            self.stdout.write("没有未完成的通知投递任务")
+            return
+
+        for notice_id in notice_ids:
+            if run_notice_delivery(notice_id):
+                self.stdout.write(f"已处理通知投递任务: {notice_id}")
+            else:
+                self.stdout.write(f"任务已被其他进程执行，跳过: {notice_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"处理完成，共 {len(notice_ids)} 个任务"))
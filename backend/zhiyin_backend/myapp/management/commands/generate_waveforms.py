@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils._os import safe_join
+
+from myapp.models import Song
+from myapp.utils.waveform import compute_waveforms, get_targets, is_generated, np, supports_waveform
+
+
+class Command(BaseCommand):
+    help = "并行为已有歌曲生成波形峰值文件"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="生成进程数（默认 CPU 核数）")
+        parser.add_argument("--force", action="store_true", help="重新生成已有波形的歌曲")
+
+    def handle(self, *args, **options):
+        sources = set()
+        skipped = 0
+        for source in Song.objects.filter(source__startswith="source/").values_list("source", flat=True).iterator():
+            if not supports_waveform(source):
+                skipped += 1
+            elif options["force"] or not is_generated(source):
+                sources.add(source)
+        if skipped:
+            self.stdout.write(f"{skipped} 首歌曲的音频格式无法解码（非 WAV 文件需要 ffmpeg），已跳过")
+        if not sources:
+            self.stdout.write(self.style.SUCCESS("没有需要生成波形的歌曲"))
+            return
+        if np is None:
+            self.stdout.write("未安装 NumPy，使用纯 Python 计算（较慢）")
+        self.stdout.write(f"待生成 {len(sources)} 个音频文件的波形，{options['workers']} 个进程")
+
+        started = time.monotonic()
+        done = failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            futures = {}
+            for source in sources:
+                try:
+                    full_path = safe_join(settings.MEDIA_ROOT, source)
+                    futures[executor.submit(compute_waveforms, full_path, get_targets(source))] = source
+                except Exception as e:
+                    self.stderr.write(f"{source}: {e}")
+                    failed += 1
+
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as e:
+                    self.stderr.write(f"{futures[future]}: {e}")
+                    failed += 1
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"完成，生成 {done} 个，失败 {failed} 个，耗时 {elapsed:.1f}s（{(done + failed) / elapsed:.1f} 个/s）"
+        ))
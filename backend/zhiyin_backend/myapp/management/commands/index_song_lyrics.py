@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from myapp.models import Song
+from myapp.utils.lyrics import load_timeline, lyric_search_text
+
+
+class Command(BaseCommand):
+    help = "为已有歌曲生成搜索用的歌词文本"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="重新生成已有歌词文本的歌曲")
+
+    def handle(self, *args, **options):
+        queryset = Song.objects.exclude(lyric__isnull=True).exclude(lyric="")
+        if not options["force"]:
+            queryset = queryset.filter(lyric_text__isnull=True)
+
+        indexed = failed = 0
+        for pk, lyric in queryset.values_list("pk", "lyric").iterator():
+            try:
+                text = lyric_search_text(load_timeline(lyric).timeline)
+            except Exception as e:
+                self.stderr.write(f"{lyric}: {e}")
+                failed += 1
+                continue
+            Song.objects.filter(pk=pk, lyric=lyric).update(lyric_text=text)
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"完成，生成 {indexed} 首歌曲的歌词文本，{failed} 个歌词文件读取失败"))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utils.retention import (
+    CHUNK_SIZE,
+    RETENTION_FILTERS,
+    RETENTION_TABLES,
+    SLEEP_MS,
+    drop_partitions,
+    get_cutoff,
+    get_expired_partitions,
+    purge_in_chunks,
+)
+
+
+class Command(BaseCommand):
+    help = "按 DATA_RETENTION_DAYS 配置清理过期的登录日志、浏览记录和用户通知（建议每晚执行）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", action="append", choices=list(RETENTION_TABLES),
+                            help="只清理指定的表，可重复指定（默认全部已配置的表）")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"每批删除条数（默认 {CHUNK_SIZE}）")
+        parser.add_argument("--sleep", type=int, default=SLEEP_MS, help=f"每批之间休眠的毫秒数（默认 {SLEEP_MS}）")
+        parser.add_argument("--max-seconds", type=float, help="每张表最长执行时间（秒），超时后留到下次继续")
+        parser.add_argument("--no-partitions", action="store_true", help="不使用 DROP PARTITION")
+        parser.add_argument("--dry-run", action="store_true", help="只统计待删除的数据量，不删除")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size 必须大于 0")
+
+        for table in options["table"] or list(RETENTION_TABLES):
+            cutoff = get_cutoff(table)
+            if cutoff is None:
+                self.stdout.write(f"{table}: 未配置保留天数，跳过")
+                continue
+            model, time_field = RETENTION_TABLES[table]
+            condition = RETENTION_FILTERS.get(table)
+
+            # 分区会整块删除，有条件的表只能逐批删除
+            if not options["no_partitions"] and condition is None:
+                partitions = get_expired_partitions(table, cutoff)
+                if partitions:
+                    if options["dry_run"]:
+                        self.stdout.write(f"{table}: 将删除分区 {', '.join(partitions)}")
+                    else:
+                        drop_partitions(table, partitions)
+                        self.stdout.write(f"{table}: 已删除分区 {', '.join(partitions)}")
+
+            count = purge_in_chunks(
+                model,
+                time_field,
+                cutoff,
+                chunk_size=options["chunk_size"],
+                sleep_ms=options["sleep"],
+                max_seconds=options["max_seconds"],
+                dry_run=options["dry_run"],
+                condition=condition,
+            )
+            action = "待删除" if options["dry_run"] else "已删除"
+            self.stdout.write(self.style.SUCCESS(f"{table}: {action} {cutoff:%Y-%m-%d} 之前的数据 {count} 条"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils.dashboard import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "重新生成仪表盘统计快照（可由定时任务调用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="忽略刷新锁，直接重新计算")
+
+    def handle(self, *args, **options):
+        snapshot = refresh_snapshot(force=options["force"])
+        if snapshot is None:
+            self.stdout.write("其他进程正在刷新快照，跳过")
+            return
+        self.stdout.write(self.style.SUCCESS(f"快照已生成: {snapshot['data']['generated_at']}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import LoginLog
+from myapp.utils.ip_region import get_searcher, lookup_location
+
+
+class Command(BaseCommand):
+    help = "为没有登录地点的历史登录日志解析 IP 归属地"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的日志条数（默认 1000）")
+
+    def handle(self, *args, **options):
+        if get_searcher() is None:
+            raise CommandError("IP 归属地数据文件不可用，请检查 IP_REGION_DB_PATH")
+
+        batch_size = options["batch_size"]
+        queryset = LoginLog.objects.filter(location__isnull=True).exclude(ip__isnull=True).order_by("pk")
+        resolved = 0
+        last_pk = None
+        while True:
+            batch_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            batch = list(batch_qs.only("id", "ip")[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            updates = []
+            for log in batch:
+                log.location = lookup_location(log.ip)
+                if log.location:
+                    updates.append(log)
+            LoginLog.objects.bulk_update(updates, ["location"])
+            resolved += len(updates)
+            self.stdout.write(f"已解析 {resolved} 条")
+
+        self.stdout.write(self.style.SUCCESS(f"完成，共解析 {resolved} 条登录日志"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils.slow_query import THRESHOLD_MS, get_slow_query_report, reset_slow_queries
+
+
+class Command(BaseCommand):
+    help = "按 SQL 指纹汇总的慢查询报告"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="显示前 N 条（默认 20）")
+        parser.add_argument("--order", choices=["total", "count", "max"], default="total",
+                            help="排序方式：total 累计耗时（默认）、count 次数、max 最大耗时")
+        parser.add_argument("--explain", action="store_true", help="同时输出 EXPLAIN 结果")
+        parser.add_argument("--reset", action="store_true", help="清空已记录的慢查询")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_slow_queries()
+            self.stdout.write(self.style.SUCCESS("慢查询记录已清空"))
+            return
+
+        report = get_slow_query_report(options["top"], options["order"])
+        if not report:
+            self.stdout.write(f"没有超过 {THRESHOLD_MS} ms 的慢查询记录")
+            return
+
+        for index, item in enumerate(report, 1):
+            self.stdout.write(self.style.WARNING(
+                f"#{index} [{item['fingerprint']}] 次数 {item['count']}，累计 {item['totalMs']} ms，"
+                f"平均 {item['avgMs']} ms，最大 {item['maxMs']} ms，最近视图 {item['lastView'] or '-'}"
+            ))
+            self.stdout.write(f"  {item['sql']}")
+            self.stdout.write(f"  参数: {item['lastParams']}")
+            if options["explain"] and item["explain"]:
+                for line in item["explain"].splitlines():
+                    self.stdout.write(f"    {line}")
@@ -0,0 +1,235 @@
+# 自定义中间件
+
+import re
+import threading
+import time
+import uuid
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+
+from myapp.auth.authentication import AdminAuthentication
+from myapp.logging.context import bind as bind_log_context
+from myapp.logging.context import bind_request, current_context, unbind_request
+from myapp.logging.logger import logger
+from myapp.utils.metrics import registry
+from myapp.utils.profiler import QueryLogger, StackSampler, is_profile_requested, save_profile
+from myapp.utils.redis import start_command_count, stop_command_count
+from myapp.utils.slow_query import current_view
+
+
+class _QueryCounter:
+    """通过 connection.execute_wrapper 统计数据库查询次数和耗时"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+_REQUEST_ID_RE = re.compile(r"^[\w\-.:]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """
+    请求日志上下文中间件
+    为每个请求分配请求 ID（沿用合法的 X-Request-ID 请求头，否则生成新的），通过 X-Request-ID 响应头返回；
+    请求期间的日志都会带上请求 ID、用户 ID、路由和已耗时间
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _get_request_id(request) -> str:
+        request_id = request.headers.get("X-Request-ID", "")
+        return request_id if _REQUEST_ID_RE.match(request_id) else uuid.uuid4().hex
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        request_id = self._get_request_id(request)
+        token = bind_request(request_id)
+        request.log_context = current_context()
+        try:
+            response = self.get_response(request)
+        finally:
+            unbind_request(token)
+        response["X-Request-ID"] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id = self._get_request_id(request)
+        token = bind_request(request_id)
+        request.log_context = current_context()
+        try:
+            response = await self.get_response(request)
+        finally:
+            unbind_request(token)
+        response["X-Request-ID"] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        bind_log_context(route=request.resolver_match.route)
+        return None
+
+
+class RequestMetricsMiddleware:
+    """
+    请求指标中间件
+    按路由名称统计请求数、耗时分布、数据库查询次数和耗时、Redis 命令数、响应大小
+    异步视图的 ORM 查询在其他线程中执行，这里不统计其数据库查询
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        queries = _QueryCounter()
+        token = start_command_count()
+        view_token = current_view.set(None)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - start
+            redis_commands = stop_command_count(token)
+            current_view.reset(view_token)
+
+        self._record(request, response, duration, queries, redis_commands)
+        return response
+
+    async def __acall__(self, request):
+        token = start_command_count()
+        view_token = current_view.set(None)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration = time.perf_counter() - start
+            redis_commands = stop_command_count(token)
+            current_view.reset(view_token)
+
+        self._record(request, response, duration, None, redis_commands)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # 记录当前视图名称，慢查询日志据此定位发起查询的接口
+        current_view.set(request.resolver_match.url_name)
+        return None
+
+    @staticmethod
+    def _record(request, response, duration, queries, redis_commands):
+        try:
+            match = getattr(request, "resolver_match", None)
+            # 未匹配的路由统一归为 unresolved，避免指标数量无限增长
+            # 前后台存在同名路由，同时记录路由规则加以区分
+            view = match.url_name if match and match.url_name else "unresolved"
+            route = match.route if match else ""
+            # 流式响应的大小未知，不计入
+            size = 0 if response.streaming else len(response.content)
+            registry.observe_request(
+                view=view,
+                route=route,
+                method=request.method,
+                status=response.status_code,
+                duration=duration,
+                db_queries=queries.count if queries else 0,
+                db_seconds=queries.seconds if queries else 0.0,
+                redis_commands=redis_commands,
+                response_size=size,
+            )
+        except Exception as e:
+            logger.warning(f"请求指标记录失败: {e}")
+
+
+class RequestProfilerMiddleware:
+    """
+    按需性能分析中间件
+    只有管理员带上 X-Profile: 1 请求头或 ?__profile=1 参数的请求才会被分析，
+    其他请求只多一次请求头判断；分析结果 ID 通过 X-Profile-Id 响应头返回
+    ASGI 部署时中间件链为异步模式，被分析的请求改为在一个工作线程中同步处理，同步视图回到该线程执行，
+    采样器抓取的就是它的调用栈；async def 视图在事件循环线程中执行，只能记录 SQL，采样不到调用栈
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not is_profile_requested(request):
+            return self.get_response(request)
+
+        user = self._authenticate(request)
+        if user is None:
+            return self.get_response(request)
+        return self._profile(request, user, self.get_response)
+
+    async def __acall__(self, request):
+        if not is_profile_requested(request):
+            return await self.get_response(request)
+
+        user = await sync_to_async(self._authenticate)(request)
+        if user is None:
+            return await self.get_response(request)
+        # 当前工作线程同步等待后续处理，期间 thread_sensitive 的同步代码（视图、数据库查询）都在本线程中执行
+        return await sync_to_async(self._profile)(request, user, async_to_sync(self.get_response))
+
+    @staticmethod
+    def _authenticate(request):
+        try:
+            user, _ = AdminAuthentication().authenticate(request)
+            return user
+        except Exception:
+            # 非管理员忽略分析标记，按普通请求处理
+            return None
+
+    @staticmethod
+    def _profile(request, user, get_response):
+        sampler = StackSampler(threading.get_ident())
+        queries = QueryLogger()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            with connection.execute_wrapper(queries):
+                response = get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - start
+
+        try:
+            response["X-Profile-Id"] = save_profile(request, user, response, duration, sampler, queries.queries)
+        except Exception as e:
+            logger.warning(f"性能分析结果保存失败: {e}")
+        return response
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0025_playlist_collect_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='announcement_read_time',
+            field=models.DateTimeField(blank=True, help_text='公告已读水位线，此时间之前发布的公告均视为已读', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_user_announcement_read_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemnotice',
+            name='delivered_count',
+            field=models.IntegerField(default=0, help_text='已处理的接收用户数（投递游标）'),
+        ),
+        migrations.AddField(
+            model_name='systemnotice',
+            name='delivery_heartbeat',
+            field=models.DateTimeField(blank=True, help_text='投递任务最近一次心跳时间', null=True),
+        ),
+        migrations.AddField(
+            model_name='systemnotice',
+            name='delivery_status',
+            field=models.CharField(choices=[('pending', '待投递'), ('running', '投递中'), ('done', '已完成'), ('failed', '投递失败')], default='done', help_text='投递状态', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='systemnotice',
+            name='recipient_count',
+            field=models.IntegerField(default=0, help_text='接收用户数'),
+        ),
+        migrations.AddField(
+            model_name='systemnotice',
+            name='recipients',
+            field=models.JSONField(blank=True, help_text='定向通知的接收用户ID列表', null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def init_classification_stats(apps, schema_editor):
+    Song = apps.get_model('myapp', 'Song')
+    ClassificationStats = apps.get_model('myapp', 'ClassificationStats')
+    counts = (
+        Song.objects.filter(classification__isnull=False)
+        .values_list('classification_id')
+        .annotate(count=models.Count('id'))
+    )
+    ClassificationStats.objects.bulk_create(
+        ClassificationStats(classification_id=classification_id, song_count=count)
+        for classification_id, count in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0027_systemnotice_delivery_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='统计日期', unique=True)),
+                ('new_users', models.IntegerField(default=0, help_text='新增用户数')),
+                ('new_songs', models.IntegerField(default=0, help_text='新增歌曲数')),
+                ('plays', models.IntegerField(default=0, help_text='播放次数')),
+                ('comments', models.IntegerField(default=0, help_text='新增评论数')),
+                ('logins', models.IntegerField(default=0, help_text='登录次数')),
+                ('update_time', models.DateTimeField(auto_now=True, help_text='更新时间')),
+            ],
+            options={
+                'verbose_name': '每日统计',
+                'verbose_name_plural': '每日统计',
+                'db_table': 'daily_stats',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClassificationStats',
+            fields=[
+                ('classification', models.OneToOneField(help_text='分类', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.classification')),
+                ('song_count', models.IntegerField(default=0, help_text='歌曲数')),
+                ('update_time', models.DateTimeField(auto_now=True, help_text='更新时间')),
+            ],
+            options={
+                'verbose_name': '分类统计',
+                'verbose_name_plural': '分类统计',
+                'db_table': 'classification_stats',
+            },
+        ),
+        migrations.RunPython(init_classification_stats, migrations.RunPython.noop),
+    ]
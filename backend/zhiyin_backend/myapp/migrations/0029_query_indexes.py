@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:41
+
+from django.db import migrations, models
+
+
+def merge_duplicate_records(apps, schema_editor):
+    """添加唯一约束前合并同一用户同一歌曲的重复记录（得分累加，保留最早的一条）"""
+    Record = apps.get_model("myapp", "Record")
+    duplicates = (
+        Record.objects.values("user_id", "song_id")
+        .annotate(total=models.Sum("score"), n=models.Count("id"))
+        .filter(n__gt=1)
+    )
+    for item in duplicates:
+        records = list(
+            Record.objects.filter(user_id=item["user_id"], song_id=item["song_id"]).order_by("create_time")
+        )
+        keep = records[0]
+        keep.score = item["total"]
+        keep.save(update_fields=["score"])
+        Record.objects.filter(pk__in=[record.pk for record in records[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0028_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_records, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='record',
+            unique_together={('user', 'song')},
+        ),
+        migrations.AddIndex(
+            model_name='browsehistory',
+            index=models.Index(fields=['user', 'browse_time'], name='browse_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['song', 'status', 'comment_time'], name='comment_song_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginlog',
+            index=models.Index(fields=['log_time'], name='login_log_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['status', 'plays'], name='song_status_plays_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['status', 'create_time'], name='song_status_ctime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usernotice',
+            index=models.Index(fields=['user', 'is_read', 'receive_time'], name='user_notice_user_read_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0029_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginlog',
+            name='log_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='登录时间', null=True),
+        ),
+    ]
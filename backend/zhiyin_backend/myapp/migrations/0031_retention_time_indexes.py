@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0030_login_log_time_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='browsehistory',
+            index=models.Index(fields=['browse_time'], name='browse_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usernotice',
+            index=models.Index(fields=['receive_time'], name='user_notice_receive_time_idx'),
+        ),
+    ]
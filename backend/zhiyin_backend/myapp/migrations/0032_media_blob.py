@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0031_retention_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='相对 MEDIA_ROOT 的路径', max_length=200, unique=True)),
+                ('sha256', models.CharField(help_text='文件内容的 SHA-256', max_length=64)),
+                ('size', models.BigIntegerField(default=0, help_text='文件大小（字节）')),
+                ('ref_count', models.IntegerField(default=0, help_text='引用次数')),
+                ('create_time', models.DateTimeField(auto_now_add=True, help_text='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, help_text='最近一次上传或引用变化的时间')),
+            ],
+            options={
+                'verbose_name': '媒体文件',
+                'verbose_name_plural': '媒体文件',
+                'db_table': 'media_blob',
+                'indexes': [models.Index(fields=['ref_count', 'update_time'], name='media_blob_ref_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-19 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0032_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='bitrate',
+            field=models.IntegerField(blank=True, help_text='码率（kbps）', null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='时长（秒）', null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, help_text='音频文件大小（字节）', null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='sample_rate',
+            field=models.IntegerField(blank=True, help_text='采样率（Hz）', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['status', 'duration'], name='song_status_duration_idx'),
+        ),
+    ]
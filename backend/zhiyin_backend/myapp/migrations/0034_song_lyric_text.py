@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0033_song_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='lyric_text',
+            field=models.TextField(blank=True, help_text='歌词文本', null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-19 22:10
+
+from django.db import migrations
+
+INDEX_NAME = 'song_lyric_text_ngram'
+
+
+def create_fulltext_index(apps, schema_editor):
+    # 中文没有空格分词，需要 ngram 解析器；其他数据库（开发用的 sqlite）按 LIKE 查询，不建索引
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f'ALTER TABLE `song` ADD FULLTEXT INDEX `{INDEX_NAME}` (`lyric_text`) WITH PARSER ngram'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f'ALTER TABLE `song` DROP INDEX `{INDEX_NAME}`')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0034_song_lyric_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
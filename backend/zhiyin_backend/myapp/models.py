@@ -1,6 +1,11 @@
-from django.db import models, transaction
+from datetime import date, timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 import uuid
 
+from myapp.logging.logger import logger
+
 
 class User(models.Model):
     GENDER_CHOICES = (
@@ -55,6 +60,9 @@ class User(models.Model):
     push_switch = models.BooleanField(
         blank=True, null=True, default=True, help_text="推送开关"
     )
+    announcement_read_time = models.DateTimeField(
+        null=True, blank=True, help_text="公告已读水位线，此时间之前发布的公告均视为已读"
+    )
 
     class Meta:
         db_table = "user"
@@ -163,9 +171,22 @@ class Song(models.Model):
     )
     plays = models.IntegerField(default=0, help_text="播放次数")
     comment_count = models.IntegerField(default=0, help_text="评论数")
+    # 音频文件属性，上传后由 myapp.utils.audio 分析填写
+    duration = models.FloatField(blank=True, null=True, help_text="时长（秒）")
+    bitrate = models.IntegerField(blank=True, null=True, help_text="码率（kbps）")
+    sample_rate = models.IntegerField(blank=True, null=True, help_text="采样率（Hz）")
+    file_size = models.BigIntegerField(blank=True, null=True, help_text="音频文件大小（字节）")
+    # 歌词纯文本，保存时由 myapp.utils.lyrics 生成，用于按歌词搜索
+    lyric_text = models.TextField(blank=True, null=True, help_text="歌词文本")
 
     class Meta:
         db_table = "song"
+        indexes = [
+            # 前台歌曲列表：上架歌曲按热度 / 发布时间 / 时长排序
+            models.Index(fields=["status", "plays"], name="song_status_plays_idx"),
+            models.Index(fields=["status", "create_time"], name="song_status_ctime_idx"),
+            models.Index(fields=["status", "duration"], name="song_status_duration_idx"),
+        ]
 
 
 class Playlist(models.Model):
@@ -280,6 +301,10 @@ class Comment(models.Model):
     class Meta:
         db_table = "comment"
         ordering = ["-comment_time"]
+        indexes = [
+            # 歌曲评论列表
+            models.Index(fields=["song", "status", "comment_time"], name="comment_song_status_time_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if self.parent:
@@ -325,6 +350,7 @@ class Record(models.Model):
     class Meta:
         db_table = "record"
         ordering = ["-create_time"]
+        unique_together = ("user", "song")  # 每个用户对每首歌只有一条记录
         verbose_name = "用户-歌曲评分"
         verbose_name_plural = "用户-歌曲评分"
 
@@ -341,11 +367,15 @@ class LoginLog(models.Model):
         max_length=100, blank=True, null=True, help_text="登录地点"
     )
     ua = models.CharField(max_length=200, blank=True, null=True, help_text="用户代理")
-    log_time = models.DateTimeField(auto_now_add=True, null=True, help_text="登录时间")
+    # 登录日志异步批量写入，登录时间在登录时确定，不能使用 auto_now_add
+    log_time = models.DateTimeField(default=timezone.now, null=True, help_text="登录时间")
 
     class Meta:
         db_table = "login_log"
         ordering = ["-log_time"]
+        indexes = [
+            models.Index(fields=["log_time"], name="login_log_time_idx"),
+        ]
         verbose_name = "登录日志"
         verbose_name_plural = "登录日志"
 
@@ -414,6 +444,13 @@ class SystemNotice(models.Model):
         ("notification", "普通通知"),
     )
 
+    DELIVERY_STATUS_CHOICES = (
+        ("pending", "待投递"),
+        ("running", "投递中"),
+        ("done", "已完成"),
+        ("failed", "投递失败"),
+    )
+
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False, help_text="通知ID"
     )
@@ -432,6 +469,18 @@ class SystemNotice(models.Model):
     create_time = models.DateTimeField(
         auto_now_add=True, null=True, help_text="创建时间"
     )
+    recipients = models.JSONField(null=True, blank=True, help_text="定向通知的接收用户ID列表")
+    recipient_count = models.IntegerField(default=0, help_text="接收用户数")
+    delivered_count = models.IntegerField(default=0, help_text="已处理的接收用户数（投递游标）")
+    delivery_status = models.CharField(
+        max_length=10,
+        choices=DELIVERY_STATUS_CHOICES,
+        default="done",
+        help_text="投递状态",
+    )
+    delivery_heartbeat = models.DateTimeField(
+        null=True, blank=True, help_text="投递任务最近一次心跳时间"
+    )
 
     class Meta:
         db_table = "system_notice"
@@ -441,24 +490,171 @@ class SystemNotice(models.Model):
 
     def send_to_users(self, user_ids: list = None):
         """
-        向指定用户或所有用户发送通知。
-        如果 is_global=True，将忽略 user_ids，自动向所有用户发送。
+        向指定用户发送通知（同步执行，后台投递见 myapp.utils.notice_delivery）。
+        全局公告（is_global=True）只存一条记录，读取时合并（见 unread_announcements），这里不再逐个用户写入。
         """
         if self.is_global:
-            valid_users = User.objects.values_list("id", flat=True)
-        else:
-            if not user_ids:
-                return
-            valid_users = User.objects.filter(id__in=user_ids).values_list(
-                "id", flat=True
+            return
+        if not user_ids:
+            return
+        self.set_recipients(user_ids)
+        self.deliver()
+
+    def set_recipients(self, user_ids: list):
+        """保存接收用户列表（去重并丢弃非法ID）并重置投递进度"""
+        recipients = []
+        for user_id in user_ids:
+            try:
+                recipients.append(str(uuid.UUID(str(user_id))))
+            except ValueError:
+                continue
+        # 统一格式之后再去重，同一用户的不同写法（大小写、UUID 对象）只投递一次
+        self.recipients = list(dict.fromkeys(recipients))
+        self.recipient_count = len(self.recipients)
+        self.delivered_count = 0
+        self.delivery_status = "pending"
+        self.delivery_heartbeat = None
+        self.save(
+            update_fields=[
+                "recipients",
+                "recipient_count",
+                "delivered_count",
+                "delivery_status",
+                "delivery_heartbeat",
+            ]
+        )
+
+    def claim_delivery(self, stale_seconds: int = 300) -> bool:
+        """
+        抢占投递任务，保证同一时间只有一个执行者
+        待投递、失败或心跳超时（执行进程崩溃）的任务可以被抢占
+        """
+        stale_before = timezone.now() - timedelta(seconds=stale_seconds)
+        claimed = (
+            SystemNotice.objects.filter(pk=self.pk)
+            .filter(
+                models.Q(delivery_status__in=["pending", "failed"])
+                | models.Q(delivery_status="running", delivery_heartbeat__lt=stale_before)
+                | models.Q(delivery_status="running", delivery_heartbeat__isnull=True)
             )
+            .update(delivery_status="running", delivery_heartbeat=timezone.now())
+        )
+        if claimed:
+            self.refresh_from_db(fields=["recipients", "delivered_count", "delivery_status"])
+        return bool(claimed)
 
-        user_notice_list = [
-            UserNotice(notice=self, user_id=user_id) for user_id in valid_users
-        ]
+    def deliver(self, chunk_size: int = 1000, on_chunk=None):
+        """
+        从 delivered_count 处继续，分批写入 UserNotice
+        每批写入与进度更新在同一事务中提交，进程崩溃后可从上一批之后恢复
+        on_chunk: 每批提交后以该批有效用户ID列表回调（如更新未读计数）
+        """
+        recipients = self.recipients or []
+        offset = self.delivered_count
+
+        while offset < len(recipients):
+            chunk = recipients[offset:offset + chunk_size]
+            valid_users = list(User.objects.filter(id__in=chunk).values_list("id", flat=True))
+
+            with transaction.atomic():
+                UserNotice.objects.bulk_create(
+                    [UserNotice(notice=self, user_id=user_id) for user_id in valid_users],
+                    batch_size=chunk_size,
+                    ignore_conflicts=True,
+                )
+                offset += len(chunk)
+                updated = SystemNotice.objects.filter(pk=self.pk).update(
+                    delivered_count=offset, delivery_heartbeat=timezone.now()
+                )
+                if not updated:
+                    # 通知在投递过程中被删除
+                    transaction.set_rollback(True)
+                    return
+
+            self.delivered_count = offset
+            if on_chunk and valid_users:
+                on_chunk(valid_users)
+
+        self.delivery_status = "done"
+        SystemNotice.objects.filter(pk=self.pk).update(
+            delivery_status="done", delivery_heartbeat=timezone.now()
+        )
+
+    @classmethod
+    def unread_announcements(cls, user):
+        """
+        用户未读的全局公告
+        已读状态稀疏存储：水位线之前的公告视为已读，水位线之后只有被单独标记过的公告才有 UserNotice 记录
+        """
+        queryset = cls.objects.filter(status="0", type="announcement", is_global=True)
+        if user.announcement_read_time:
+            queryset = queryset.filter(create_time__gt=user.announcement_read_time)
+        read_receipts = UserNotice.objects.filter(
+            user=user, notice=models.OuterRef("pk"), is_read=True
+        )
+        return queryset.exclude(models.Exists(read_receipts))
+
+    def mark_announcement_read(self, user) -> bool:
+        """
+        标记全局公告为已读，返回是否由未读变为已读
+        水位线推进到最早一条未读公告之前，并清理水位线之前的已读记录，保持记录稀疏
+        """
+        watermark = user.announcement_read_time
+        if watermark and self.create_time <= watermark:
+            return False
 
         with transaction.atomic():
-            UserNotice.objects.bulk_create(user_notice_list, ignore_conflicts=True)
+            receipt, created = UserNotice.objects.get_or_create(
+                user=user,
+                notice=self,
+                defaults={"is_read": True, "read_time": timezone.now()},
+            )
+            if not created:
+                if receipt.is_read:
+                    return False
+                receipt.is_read = True
+                receipt.read_time = timezone.now()
+                receipt.save(update_fields=["is_read", "read_time"])
+
+            read_before = SystemNotice.objects.filter(
+                status="0", type="announcement", is_global=True
+            )
+            first_unread = (
+                SystemNotice.unread_announcements(user)
+                .order_by("create_time")
+                .values_list("create_time", flat=True)
+                .first()
+            )
+            if first_unread:
+                read_before = read_before.filter(create_time__lt=first_unread)
+            SystemNotice.advance_announcement_watermark(
+                user, read_before.aggregate(latest=models.Max("create_time"))["latest"]
+            )
+        return True
+
+    @classmethod
+    def mark_all_announcements_read(cls, user):
+        """将所有已发布的全局公告标记为已读（只推进水位线）"""
+        latest = cls.objects.filter(
+            status="0", type="announcement", is_global=True
+        ).aggregate(latest=models.Max("create_time"))["latest"]
+        cls.advance_announcement_watermark(user, latest)
+
+    @staticmethod
+    def advance_announcement_watermark(user, new_watermark):
+        """推进公告已读水位线，并清理水位线之前已不再需要的已读记录"""
+        watermark = user.announcement_read_time
+        if not new_watermark or (watermark and new_watermark <= watermark):
+            return
+
+        User.objects.filter(pk=user.pk).update(announcement_read_time=new_watermark)
+        user.announcement_read_time = new_watermark
+        UserNotice.objects.filter(
+            user=user,
+            notice__type="announcement",
+            notice__is_global=True,
+            notice__create_time__lte=new_watermark,
+        ).delete()
 
 
 class UserNotice(models.Model):
@@ -476,6 +672,12 @@ class UserNotice(models.Model):
         verbose_name = "用户通知"
         verbose_name_plural = "用户通知"
         unique_together = ("notice", "user")  # 防止重复发送
+        indexes = [
+            # 用户未读通知列表
+            models.Index(fields=["user", "is_read", "receive_time"], name="user_notice_user_read_idx"),
+            # 过期数据清理
+            models.Index(fields=["receive_time"], name="user_notice_receive_time_idx"),
+        ]
 
 
 class Feedback(models.Model):
@@ -554,5 +756,108 @@ class BrowseHistory(models.Model):
     class Meta:
         db_table = "browse_history"
         ordering = ["-browse_time"]
+        indexes = [
+            models.Index(fields=["user", "browse_time"], name="browse_user_time_idx"),
+            # 过期数据清理
+            models.Index(fields=["browse_time"], name="browse_time_idx"),
+        ]
         verbose_name = "浏览记录"
         verbose_name_plural = "浏览记录"
+
+
+class DailyStats(models.Model):
+    """
+    每日统计汇总（仪表盘使用）
+    由写操作增量维护，backfill_daily_stats 命令每晚按时间范围重新统计
+    """
+
+    date = models.DateField(unique=True, help_text="统计日期")
+    new_users = models.IntegerField(default=0, help_text="新增用户数")
+    new_songs = models.IntegerField(default=0, help_text="新增歌曲数")
+    plays = models.IntegerField(default=0, help_text="播放次数")
+    comments = models.IntegerField(default=0, help_text="新增评论数")
+    logins = models.IntegerField(default=0, help_text="登录次数")
+    update_time = models.DateTimeField(auto_now=True, help_text="更新时间")
+
+    class Meta:
+        db_table = "daily_stats"
+        ordering = ["-date"]
+        verbose_name = "每日统计"
+        verbose_name_plural = "每日统计"
+
+    @classmethod
+    def incr(cls, day=None, **deltas):
+        """当日计数增量更新，统计失败不影响业务写操作"""
+        incr_daily_counters(cls, {"date": day or date.today()}, deltas)
+
+
+class ClassificationStats(models.Model):
+    """
+    按分类的歌曲数量汇总（仪表盘分类统计使用）
+    由歌曲的新增、删除、修改分类增量维护，backfill_daily_stats 命令每晚按歌曲表重新统计
+    """
+
+    classification = models.OneToOneField(
+        Classification,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        help_text="分类",
+    )
+    song_count = models.IntegerField(default=0, help_text="歌曲数")
+    update_time = models.DateTimeField(auto_now=True, help_text="更新时间")
+
+    class Meta:
+        db_table = "classification_stats"
+        verbose_name = "分类统计"
+        verbose_name_plural = "分类统计"
+
+    @classmethod
+    def incr(cls, classification_id, **deltas):
+        if not classification_id:
+            return
+        incr_daily_counters(cls, {"classification_id": classification_id}, deltas)
+
+
+class MediaBlob(models.Model):
+    """
+    内容寻址存储中的文件（myapp.utils.storage.ContentAddressedStorage）
+    路径由文件内容的 SHA-256 决定，相同内容只保存一份；ref_count 为业务数据中引用该路径的字段数，
+    为 0 且超过保留期的文件可以被回收
+    """
+
+    path = models.CharField(max_length=200, unique=True, help_text="相对 MEDIA_ROOT 的路径")
+    sha256 = models.CharField(max_length=64, help_text="文件内容的 SHA-256")
+    size = models.BigIntegerField(default=0, help_text="文件大小（字节）")
+    ref_count = models.IntegerField(default=0, help_text="引用次数")
+    create_time = models.DateTimeField(auto_now_add=True, help_text="创建时间")
+    update_time = models.DateTimeField(auto_now=True, help_text="最近一次上传或引用变化的时间")
+
+    class Meta:
+        db_table = "media_blob"
+        indexes = [
+            # 回收未被引用的文件
+            models.Index(fields=["ref_count", "update_time"], name="media_blob_ref_idx"),
+        ]
+        verbose_name = "媒体文件"
+        verbose_name_plural = "媒体文件"
+
+
+def incr_daily_counters(model, lookup: dict, deltas: dict):
+    """
+    对统计行做 UPDATE ... SET x = x + n，行不存在时创建
+    在保存点中执行，失败只记录日志
+    """
+    try:
+        with transaction.atomic():
+            updates = {field: models.F(field) + value for field, value in deltas.items()}
+            if model.objects.filter(**lookup).update(**updates):
+                return
+            try:
+                with transaction.atomic():
+                    model.objects.create(**lookup, **deltas)
+            except IntegrityError:
+                # 并发创建，改为更新
+                model.objects.filter(**lookup).update(**updates)
+    except Exception as e:
+        logger.error(f"每日统计更新失败: {model.__name__} {lookup} {deltas}, {str(e)}")
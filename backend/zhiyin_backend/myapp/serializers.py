@@ -14,6 +14,23 @@ from .models import (
 )
 from django.conf import settings
 
+from myapp.utils.images import get_image_variants
+from myapp.utils.waveform import get_waveform_urls
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """图片衍生图地址（thumb / list / detail 的 webp 和 jpg）、主色调和 blurhash，不支持的文件为 None"""
+
+    def to_representation(self, value):
+        return get_image_variants(value)
+
+
+class WaveformField(serializers.ReadOnlyField):
+    """各分辨率波形峰值文件的地址（点数 -> 地址），尚未生成时为 None"""
+
+    def to_representation(self, value):
+        return get_waveform_urls(value)
+
 
 # 用户部分序列化器
 class CreateUserSerializer(serializers.ModelSerializer):
@@ -27,6 +44,7 @@ class CreateUserSerializer(serializers.ModelSerializer):
             "password": {"write_only": True},
             "status": {"read_only": True},
             "create_time": {"read_only": True},
+            "announcement_read_time": {"read_only": True},
         }
 
 
@@ -38,6 +56,7 @@ class LoginSerializer(serializers.ModelSerializer):
 
 # 普通用户api使用
 class UserInfoSerializer(serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField(source="avatar")
     create_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     update_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -48,6 +67,7 @@ class UserInfoSerializer(serializers.ModelSerializer):
             "username",
             "nickname",
             "avatar",
+            "avatar_variants",
             "avatarHash",
             "email",
             "mobile",
@@ -70,6 +90,7 @@ class UserInfoSerializer(serializers.ModelSerializer):
 
 # 管理员api使用
 class AdminUserInfoSerializer(serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField(source="avatar")
     create_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     update_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -84,6 +105,7 @@ class AdminUserInfoSerializer(serializers.ModelSerializer):
             "gender",
             "description",
             "avatar",
+            "avatar_variants",
             "avatarHash",
             "status",
             "role",
@@ -102,11 +124,16 @@ class SongSerializer(serializers.ModelSerializer):
     classification_name = serializers.ReadOnlyField(source="classification.name")
     language_name = serializers.ReadOnlyField(source="language.name")
     username = serializers.ReadOnlyField(source="user.username")
+    cover_variants = ImageVariantsField(source="cover")
+    waveform = WaveformField(source="source")
     create_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
     class Meta:
         model = Song
-        fields = "__all__"
+        # 歌词文本只用于搜索
+        exclude = ["lyric_text"]
+        # 由音频分析填写
+        read_only_fields = ["duration", "bitrate", "sample_rate", "file_size"]
 
 
 class PlaylistSerializer(serializers.ModelSerializer):
@@ -120,6 +147,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
         many=True, queryset=Classification.objects.all(), required=False
     )
     collect_count = serializers.IntegerField(source="collect_users.count", read_only=True)
+    cover_variants = ImageVariantsField(source="cover")
 
     create_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     update_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
@@ -127,7 +155,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
     class Meta:
         model = Playlist
         fields = [
-            "id", "name", "description", "cover", "creator",
+            "id", "name", "description", "cover", "cover_variants", "creator",
             "songs", "visibility", "create_time", "update_time",
             "collect_users", "collect_count", "play_count", "status", "song_count", "classifications",
         ]
@@ -179,6 +207,7 @@ class FeedbackSerializer(serializers.ModelSerializer):
 
 
 class AdSerializer(serializers.ModelSerializer):
+    cover_variants = ImageVariantsField(source="cover")
     create_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     update_time = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
@@ -222,7 +251,8 @@ class SystemNoticeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SystemNotice
-        fields = "__all__"
+        exclude = ["recipients", "delivery_heartbeat"]
+        read_only_fields = ["recipient_count", "delivered_count", "delivery_status"]
 
 
 class UserNoticeSerializer(serializers.ModelSerializer):
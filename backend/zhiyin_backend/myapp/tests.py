@@ -1,3 +1,1433 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import ipaddress
+import json
+import logging
+import logging.handlers
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import wave
+from io import StringIO
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from myapp.models import (
+    BrowseHistory,
+    Classification,
+    ClassificationStats,
+    Comment,
+    DailyStats,
+    Language,
+    LoginLog,
+    MediaBlob,
+    Song,
+    SystemNotice,
+    User,
+    UserNotice,
+)
+from myapp.utils.audio import AudioParseError, analyze_audio
+from myapp.utils.cache import TwoLevelCache
+from myapp.utils.dashboard import compute_totals
+from myapp.logging.context import bind_request, unbind_request
+from myapp.logging.formatters import JsonFormatter
+from myapp.logging.handlers import AsyncHandler, configure_logging
+from myapp.logging.logger import AppLogger
+from myapp.utils import ip_region
+from myapp.utils.images import (
+    DerivativeFailedError,
+    ensure_derivatives,
+    get_derived_dir,
+    get_image_variants,
+    get_sizes,
+    render_derivatives,
+)
+from myapp.utils.jwt_token import generate_jwt
+from myapp.utils.lyrics import filter_lyric_text, find_line, lyric_search_text, parse_lrc
+from myapp.utils.media_gc import collect_orphaned_media
+from myapp.utils.metrics import MetricsRegistry, render_prometheus
+from myapp.utils.profiler import QueryLogger, StackSampler, to_flamegraph_html, to_speedscope
+from myapp.utils.notice_counter import count_unread_from_db
+from myapp.utils.storage import extract_media_paths, recount_refs
+from myapp.utils import waveform
+from myapp.utils.waveform import compute_waveforms
+from myapp.utils.redis import get_redis_client
+
+redis_available = get_redis_client() is not None
+
+
+@skipIf(not redis_available, "需要 Redis")
+class TwoLevelCacheTests(SimpleTestCase):
+    """二级缓存：与失效并发的加载不会把旧值写回 L2"""
+
+    def setUp(self):
+        self.cache = TwoLevelCache(prefix="test:refcache:")
+        self.redis = get_redis_client()
+
+    def tearDown(self):
+        self.redis.delete("test:refcache:key", "test:refcache:version:key")
+
+    def test_invalidate_during_load(self):
+        data = {"value": "old"}
+
+        def loader():
+            value = data["value"]
+            # 加载期间其他请求修改了数据并使缓存失效
+            data["value"] = "new"
+            self.cache.invalidate("key")
+            return value
+
+        self.assertEqual(self.cache.get_or_set("key", loader), "old")
+        self.assertIsNone(self.redis.get("test:refcache:key"))
+        self.assertEqual(self.cache.get_or_set("key", lambda: data["value"]), "new")
+        self.assertEqual(self.redis.get("test:refcache:key"), '"new"')
+
+
+class NoticeDeliveryTests(TestCase):
+    """定向通知的分批投递：任务抢占、失败后从游标恢复、重复接收用户"""
+
+    def setUp(self):
+        self.users = User.objects.bulk_create([User(username=f"u{i}", password="x") for i in range(5)])
+        self.notice = SystemNotice.objects.create(title="t", content="c", type="notification")
+
+    def test_claim_stale_heartbeat(self):
+        self.notice.set_recipients([user.id for user in self.users])
+        self.assertTrue(self.notice.claim_delivery(stale_seconds=300))
+        # 执行者心跳正常时不能被抢占
+        other = SystemNotice.objects.get(pk=self.notice.pk)
+        self.assertFalse(other.claim_delivery(stale_seconds=300))
+
+        SystemNotice.objects.filter(pk=self.notice.pk).update(
+            delivery_heartbeat=timezone.now() - datetime.timedelta(seconds=301)
+        )
+        self.assertTrue(other.claim_delivery(stale_seconds=300))
+        self.assertFalse(self.notice.claim_delivery(stale_seconds=300))
+
+        SystemNotice.objects.filter(pk=self.notice.pk).update(delivery_status="done")
+        self.assertFalse(other.claim_delivery(stale_seconds=300))
+
+    def test_resume_after_failed_chunk(self):
+        self.notice.set_recipients([user.id for user in self.users])
+        self.assertTrue(self.notice.claim_delivery())
+        bulk_create = UserNotice.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise DatabaseError("connection lost")
+            return bulk_create(*args, **kwargs)
+
+        delivered = []
+        with mock.patch.object(UserNotice.objects, "bulk_create", side_effect=fail_second_chunk):
+            with self.assertRaises(DatabaseError):
+                self.notice.deliver(chunk_size=2, on_chunk=delivered.extend)
+
+        # 失败批次回滚，游标停在已提交的第一批之后
+        self.notice.refresh_from_db()
+        self.assertEqual(self.notice.delivered_count, 2)
+        self.assertEqual(UserNotice.objects.count(), 2)
+
+        SystemNotice.objects.filter(pk=self.notice.pk).update(delivery_status="failed")
+        resumed = SystemNotice.objects.get(pk=self.notice.pk)
+        self.assertTrue(resumed.claim_delivery())
+        resumed.deliver(chunk_size=2, on_chunk=delivered.extend)
+
+        resumed.refresh_from_db()
+        self.assertEqual((resumed.delivery_status, resumed.delivered_count), ("done", 5))
+        self.assertEqual(sorted(delivered), sorted(user.id for user in self.users))
+        self.assertEqual(
+            sorted(UserNotice.objects.values_list("user_id", flat=True)), sorted(user.id for user in self.users)
+        )
+
+    def test_duplicate_recipients(self):
+        first, second = self.users[:2]
+        self.notice.set_recipients([first.id, str(first.id), str(first.id).upper(), "bad", second.id, first.id])
+        self.assertEqual(self.notice.recipients, [str(first.id), str(second.id)])
+        self.assertEqual(self.notice.recipient_count, 2)
+
+        self.notice.deliver(chunk_size=1)
+        # 进程在更新游标之前崩溃时，恢复后会重复处理同一批，不能重复写入
+        SystemNotice.objects.filter(pk=self.notice.pk).update(delivered_count=0, delivery_status="failed")
+        retry = SystemNotice.objects.get(pk=self.notice.pk)
+        self.assertTrue(retry.claim_delivery())
+        retry.deliver(chunk_size=1)
+
+        self.assertEqual(UserNotice.objects.filter(notice=self.notice).count(), 2)
+
+
+@skipIf(not redis_available, "需要 Redis")
+class NoticeCounterTests(TestCase):
+    """缓存的未读计数在各种写操作之后与数据库一致"""
+
+    def setUp(self):
+        self.admin = User.objects.create(username="admin", password="x", role="0")
+        self.user = User.objects.create(username="reader", password="x")
+        self.other = User.objects.create(username="other", password="x")
+        self.redis = get_redis_client()
+        self.redis.delete(f"notice_unread:{self.user.id}")
+
+    def client_for(self, user):
+        token = generate_jwt({"user_id": str(user.id)})
+        self.redis.set(f"jwt_token_{user.id}", token)
+        return self.client_class(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def assertCounts(self, notification, announcement):
+        data = self.client_for(self.user).get("/notice/getUnreadCount/").json()["data"]
+        self.user.refresh_from_db()
+        db = count_unread_from_db(self.user)
+        self.assertEqual((data["notification"], data["announcement"]), (db["notification"], db["announcement"]))
+        self.assertEqual((data["notification"], data["announcement"]), (notification, announcement))
+
+    def send(self, title, receivers):
+        # 投递在事务提交后由后台线程执行，这里在当前线程同步执行
+        with mock.patch("myapp.utils.notice_delivery._executor.submit", side_effect=lambda fn, *args: fn(*args)), \
+                mock.patch("myapp.utils.notice_delivery.close_old_connections"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.admin).post(
+                "/admin/notice/createForSome/", {"title": title, "content": "c", "receivers": receivers}
+            )
+        return response.json()["data"]["id"]
+
+    def announce(self, title):
+        response = self.client_for(self.admin).post("/admin/notice/createForAll/", {"title": title, "content": "c"})
+        return response.json()["data"]["id"]
+
+    def test_counts_follow_writes(self):
+        self.assertCounts(0, 0)
+
+        first = self.send("n1", [str(self.user.id), str(self.other.id)])
+        second = self.send("n2", [str(self.user.id)])
+        announcement = self.announce("a1")
+        self.assertCounts(2, 1)
+
+        self.client_for(self.user).post(f"/notice/{first}/markRead/")
+        self.client_for(self.user).post(f"/notice/{announcement}/markRead/")
+        self.assertCounts(1, 0)
+
+        # 管理员下线通知后不再计入未读，之后标记已读也不能再减少计数
+        self.client_for(self.admin).put(
+            f"/admin/notice/{second}/update/", {"status": "1"}, content_type="application/json"
+        )
+        self.assertCounts(0, 0)
+        third = self.send("n3", [str(self.user.id)])
+        self.client_for(self.user).post(f"/notice/{second}/markRead/")
+        self.assertCounts(1, 0)
+
+        self.announce("a2")
+        self.announce("a3")
+        self.assertCounts(1, 2)
+
+        self.client_for(self.admin).delete("/admin/notice/delete/", [third], content_type="application/json")
+        self.assertCounts(0, 2)
+
+        self.send("n4", [str(self.user.id)])
+        self.assertCounts(1, 2)
+        self.client_for(self.user).post("/notice/markAllRead/")
+        self.assertCounts(0, 0)
+
+
+class MetricsTests(TestCase):
+    """Prometheus 文本输出和 /metrics 的访问控制"""
+
+    def render(self, observations):
+        registry = MetricsRegistry()
+        # 不合并到 Redis，只读取本进程内存中的数据
+        with mock.patch("myapp.utils.metrics.r", None):
+            for view, duration in observations:
+                registry.observe_request(view, "song/list/", "GET", 200, duration)
+            return render_prometheus(registry.collect())
+
+    def test_histogram_buckets(self):
+        lines = self.render([("list", 0.003), ("list", 0.2), ("list", 20)]).splitlines()
+        buckets = [line for line in lines if line.startswith("http_request_duration_seconds_bucket")]
+        le = [re.search(r'le="([^"]+)"', line).group(1) for line in buckets]
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+
+        # 桶按上限升序排列，计数是累计值，+Inf 等于请求总数
+        self.assertEqual(le[-1], "+Inf")
+        self.assertEqual([float(value) for value in le[:-1]], sorted(float(value) for value in le[:-1]))
+        self.assertEqual(dict(zip(le, counts)), {
+            "0.005": 1, "0.01": 1, "0.025": 1, "0.05": 1, "0.1": 1, "0.25": 2,
+            "0.5": 2, "1.0": 2, "2.5": 2, "5.0": 2, "10.0": 2, "+Inf": 3,
+        })
+        self.assertIn('http_request_duration_seconds_count{view="list",route="song/list/",method="GET"} 3', lines)
+        self.assertIn('http_request_duration_seconds_sum{view="list",route="song/list/",method="GET"} 20.203', lines)
+        self.assertEqual(lines.count("# TYPE http_request_duration_seconds histogram"), 1)
+        self.assertIn("# TYPE http_requests_total counter", lines)
+
+    def test_label_escaping(self):
+        text = self.render([('a"b\\c\nd', 0.1)])
+        self.assertIn('http_requests_total{view="a\\"b\\\\c\\nd",route="song/list/",method="GET",status="200"} 1', text)
+        # 每个样本占一行，标签值中的换行不能拆开样本
+        for line in text.splitlines():
+            self.assertTrue(line.startswith("#") or line.startswith("http_"), line)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_auth(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    @skipIf(not redis_available, "需要 Redis 保存登录令牌")
+    def test_metrics_admin_fallback(self):
+        for role, status in (("1", 403), ("0", 200)):
+            user = User.objects.create(username=f"role{role}", password="x", role=role)
+            token = generate_jwt({"user_id": str(user.id)})
+            get_redis_client().set(f"jwt_token_{user.id}", token)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION=f"Bearer {token}").status_code, status)
+
+
+class ProfilerExportTests(SimpleTestCase):
+    """性能分析结果导出"""
+
+    profile = {
+        "meta": {
+            "method": "GET", "path": "/song/?q=<x>", "durationMs": 12.5,
+            "sampleCount": 4, "queryCount": 1, "queryMs": 1.2,
+        },
+        "interval": 0.005,
+        "stacks": [
+            {"frames": [["main", "a.py", 1], ["view", "b.py", 10]], "count": 3},
+            {"frames": [["main", "a.py", 1], ["<lambda>", "c.py", 5]], "count": 1},
+        ],
+        "queries": [{"sql": "SELECT * FROM song WHERE title = '<b>'", "params": "()", "ms": 1.2}],
+    }
+
+    def test_speedscope(self):
+        data = to_speedscope(self.profile)
+        self.assertEqual(data["$schema"], "https://www.speedscope.app/file-format-schema.json")
+        # 相同的帧只出现一次，样本按帧下标引用
+        self.assertEqual([frame["name"] for frame in data["shared"]["frames"]], ["main", "view", "<lambda>"])
+        profile = data["profiles"][0]
+        self.assertEqual(profile["type"], "sampled")
+        self.assertEqual(profile["samples"], [[0, 1], [0, 2]])
+        self.assertEqual(profile["weights"], [15.0, 5.0])
+        self.assertEqual(profile["endValue"], 20.0)
+
+    def test_flamegraph_html(self):
+        page = to_flamegraph_html(self.profile)
+        self.assertIn("<title>GET /song/?q=&lt;x&gt;</title>", page)
+        self.assertIn("&lt;lambda&gt; (c.py:5)", page)
+        self.assertIn("title = &#x27;&lt;b&gt;&#x27;", page)
+        self.assertNotIn("<b>", page)
+        # 根节点占满宽度，子节点按样本比例
+        self.assertIn('style="width:100.000%"><div class="frame" title="all 4 samples"', page)
+        self.assertIn('style="width:75.000%"><div class="frame" title="view (b.py:10) 3 samples"', page)
+
+
+@skipIf(not redis_available, "需要 Redis 保存登录令牌和分析结果")
+class RequestProfilerTests(TestCase):
+    """按需性能分析只对管理员生效，WSGI 和 ASGI 下都能分析"""
+
+    def setUp(self):
+        self.admin = User.objects.create(username="admin", password="x", role="0")
+        self.user = User.objects.create(username="user", password="x")
+        self.headers = {}
+        for user in (self.admin, self.user):
+            token = generate_jwt({"user_id": str(user.id)})
+            get_redis_client().set(f"jwt_token_{user.id}", token)
+            self.headers[user.username] = {"Authorization": f"Bearer {token}"}
+
+    def test_admin_only(self):
+        response = self.client.get("/song/getSongList/", {"__profile": "1"}, headers=self.headers["user"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        response = self.client.get("/song/getSongList/", headers={**self.headers["admin"], "X-Profile": "0"})
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_profile_and_download(self):
+        response = self.client.get("/admin/song/getSongList/", headers={**self.headers["admin"], "X-Profile": "1"})
+        profile_id = response["X-Profile-Id"]
+
+        listed = self.client.get("/admin/profile/getProfileList/", headers=self.headers["admin"]).json()
+        meta = next(item for item in listed["data"]["list"] if item["id"] == profile_id)
+        self.assertEqual((meta["view"], meta["status"], meta["user"]), ("get_music_list", 200, "admin"))
+        self.assertGreater(meta["queryCount"], 0)
+
+        download = self.client.get(f"/admin/profile/{profile_id}/download/", headers=self.headers["admin"])
+        self.assertIn(f"profile-{profile_id}.speedscope.json", download["Content-Disposition"])
+        self.assertEqual(json.loads(download.content)["profiles"][0]["type"], "sampled")
+        page = self.client.get(
+            f"/admin/profile/{profile_id}/download/", {"type": "html"}, headers=self.headers["admin"]
+        )
+        self.assertTrue(page["Content-Type"].startswith("text/html"))
+        self.assertIn("SELECT", page.content.decode())
+
+        # 普通用户不能查看分析结果
+        forbidden = self.client.get(f"/admin/profile/{profile_id}/download/", headers=self.headers["user"])
+        self.assertEqual(forbidden.status_code, 403)
+
+    async def test_asgi_profile(self):
+        samplers, query_threads = [], set()
+
+        class RecordingSampler(StackSampler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                samplers.append(self)
+
+        class RecordingQueryLogger(QueryLogger):
+            def __call__(self, *args):
+                query_threads.add(threading.get_ident())
+                return super().__call__(*args)
+
+        with mock.patch("myapp.middleware.StackSampler", RecordingSampler), \
+                mock.patch("myapp.middleware.QueryLogger", RecordingQueryLogger):
+            response = await self.async_client.get(
+                "/admin/song/getSongList/", {"__profile": "1"}, headers=self.headers["admin"]
+            )
+            plain = await self.async_client.get("/admin/song/getSongList/", headers=self.headers["admin"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("X-Profile-Id", response)
+        self.assertNotIn("X-Profile-Id", plain)
+        # 视图的查询在被采样的线程中执行
+        self.assertEqual(len(samplers), 1)
+        self.assertEqual(query_threads, {samplers[0].thread_id})
+
+
+class QueryPlanTests(TestCase):
+    """
+    主要列表接口的查询计划回归测试
+    对接口实际执行的列表查询运行 EXPLAIN，断言使用了对应的索引而不是全表扫描
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", password="x", role="0")
+        cls.users = [User.objects.create(username=f"user{i}", password="x") for i in range(20)]
+        classification = Classification.objects.create(name="流行")
+
+        cls.songs = Song.objects.bulk_create([
+            Song(
+                title=f"song{i}",
+                classification=classification,
+                status="0" if i % 5 else "1",
+                plays=i * 7 % 101,
+            )
+            for i in range(300)
+        ])
+        cls.song = cls.songs[1]
+
+        Comment.objects.bulk_create([
+            Comment(content=f"comment{i}", user=cls.users[i % 20], song=cls.songs[i % 30], status="0")
+            for i in range(600)
+        ])
+        BrowseHistory.objects.bulk_create([
+            BrowseHistory(user=cls.users[i % 20], song=cls.songs[i % 300])
+            for i in range(600)
+        ])
+
+        # 每条定向通知只发给少数用户
+        notices = SystemNotice.objects.bulk_create([
+            SystemNotice(title=f"notice{i}", content="c", type="notification", is_global=False)
+            for i in range(300)
+        ])
+        UserNotice.objects.bulk_create([
+            UserNotice(user=cls.users[(i + j) % 20], notice=notice, is_read=bool(i % 3))
+            for i, notice in enumerate(notices)
+            for j in range(2)
+        ])
+
+        now = datetime.datetime.now()
+        logs = LoginLog.objects.bulk_create([LoginLog(username=f"user{i % 20}", ip="127.0.0.1") for i in range(600)])
+        for i, log in enumerate(logs):
+            log.log_time = now - datetime.timedelta(minutes=i)
+        LoginLog.objects.bulk_update(logs, ["log_time"])
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute("ANALYZE TABLE song, comment, browse_history, user_notice, login_log")
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+
+    def _auth_client(self, user):
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {generate_jwt({'user_id': str(user.id)})}"
+        return self.client
+
+    def _list_queries(self, captured, table):
+        """取出接口执行的、针对 table 且带 ORDER BY 的列表查询"""
+        pattern = re.compile(rf"FROM [`\"]{table}[`\"]", re.IGNORECASE)
+        return [
+            query["sql"]
+            for query in captured
+            if query["sql"].lstrip().upper().startswith("SELECT")
+            and pattern.search(query["sql"])
+            and "ORDER BY" in query["sql"].upper()
+        ]
+
+    def _explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, captured, table, index_name=None):
+        """
+        断言列表查询没有对 table 做全表扫描
+        SQLite 的查询计划是确定的，同时检查使用的是 index_name；MySQL 只检查使用了索引
+        """
+        queries = self._list_queries(captured, table)
+        self.assertTrue(queries, f"没有捕获到 {table} 的列表查询")
+
+        for sql in queries:
+            plan = self._explain(sql)
+            if connection.vendor == "sqlite":
+                details = [row["detail"] for row in plan]
+                self.assertNotIn(f"SCAN {table}", details, f"{table} 全表扫描：{details}")
+                if index_name:
+                    self.assertTrue(
+                        any(index_name in detail for detail in details),
+                        f"{table} 未使用索引 {index_name}：{details}",
+                    )
+            elif connection.vendor == "mysql":
+                rows = [row for row in plan if row["table"] == table]
+                self.assertTrue(rows, plan)
+                for row in rows:
+                    self.assertNotEqual(row["type"], "ALL", f"{table} 全表扫描：{row}")
+                    self.assertIsNotNone(row["key"], f"{table} 未使用索引：{row}")
+            else:
+                self.skipTest(f"不支持的数据库：{connection.vendor}")
+
+    def test_song_list_hot(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/song/getSongList/", {"sort": "hot", "page": 1, "pageSize": 10})
+        self.assertEqual(response.json()["code"], 0)
+        self.assertUsesIndex(captured, "song", "song_status_plays_idx")
+
+    def test_song_list_recent(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/song/getSongList/", {"sort": "recent", "page": 1, "pageSize": 10})
+        self.assertEqual(response.json()["code"], 0)
+        self.assertUsesIndex(captured, "song", "song_status_ctime_idx")
+
+    def test_comments_by_song(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(
+                "/comment/getCommentsBySong/", {"song_id": str(self.song.id), "page": 1, "pageSize": 10}
+            )
+        self.assertEqual(response.json()["code"], 0)
+        self.assertUsesIndex(captured, "comment", "comment_song_status_time_idx")
+
+    @skipIf(not redis_available, "需要 Redis 保存登录 Token")
+    def test_browse_history_list(self):
+        client = self._auth_client(self.users[0])
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get("/browseHistory/getBrowseHistoryList/", {"page": 1, "pageSize": 10})
+        self.assertEqual(response.json()["code"], 0)
+        self.assertUsesIndex(captured, "browse_history", "browse_user_time_idx")
+
+    @skipIf(not redis_available, "需要 Redis 保存登录 Token")
+    def test_user_notice_list(self):
+        client = self._auth_client(self.users[0])
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get("/notice/getUserNoticeList/")
+        self.assertEqual(response.json()["code"], 0)
+        # SQLite 把 is_read=False 渲染为 NOT is_read，只能用到索引的 user 前缀，这里不检查索引名；
+        # MySQL 会直接比较布尔值，可以用到 user_notice_user_read_idx 的全部列
+        self.assertUsesIndex(captured, "user_notice")
+
+    @skipIf(not redis_available, "需要 Redis 保存登录 Token")
+    def test_login_log_list(self):
+        client = self._auth_client(self.admin)
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get("/admin/loginLog/getLoginLogList/", {"page": 1, "pageSize": 10})
+        self.assertEqual(response.json()["code"], 0)
+        self.assertUsesIndex(captured, "login_log", "login_log_time_idx")
+
+
+def build_xdb(path, segments):
+    """
+    按 ip2region 生成工具的方式写入 xdb 文件：区段在 /16 边界处拆分，
+    向量索引记录每个前缀第一个区段的位置和最后一个区段之后的位置
+    """
+    regions, region_ptrs = bytearray(), {}
+    base = ip_region.HEADER_LENGTH + 256 * ip_region.VECTOR_INDEX_COLS * ip_region.VECTOR_INDEX_SIZE
+    for _, _, region in segments:
+        if region not in region_ptrs:
+            region_ptrs[region] = base + len(regions)
+            regions += region.encode()
+
+    vector = bytearray(256 * ip_region.VECTOR_INDEX_COLS * ip_region.VECTOR_INDEX_SIZE)
+    index = bytearray()
+    ptr = base + len(regions)
+    for start, end, region in segments:
+        start, end = int(ipaddress.ip_address(start)), int(ipaddress.ip_address(end))
+        while start <= end:
+            block_end = min(end, start | 0xFFFF)
+            index += struct.pack("<IIHI", start, block_end, len(region.encode()), region_ptrs[region])
+            offset = (start >> 16) * ip_region.VECTOR_INDEX_SIZE
+            if not struct.unpack_from("<I", vector, offset)[0]:
+                struct.pack_into("<I", vector, offset, ptr)
+            struct.pack_into("<I", vector, offset + 4, ptr + ip_region.SEGMENT_INDEX_SIZE)
+            ptr += ip_region.SEGMENT_INDEX_SIZE
+            start = block_end + 1
+
+    with open(path, "wb") as f:
+        f.write(bytes(ip_region.HEADER_LENGTH) + vector + regions + index)
+
+
+class IpRegionTests(SimpleTestCase):
+    """离线 IP 归属地查询"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.path = os.path.join(self.tmp, "ip2region.xdb")
+        build_xdb(self.path, [
+            ("0.0.0.0", "0.0.0.255", "0|0|0|保留地址|0"),
+            ("1.2.0.0", "1.2.0.255", "中国|0|广东省|深圳市|电信"),
+            ("1.2.1.0", "1.2.255.255", "中国|0|北京|北京市|联通"),
+            ("1.3.200.0", "1.4.9.255", "中国|0|浙江省|杭州市|移动"),
+            ("255.255.0.0", "255.255.255.255", "0|0|0|0|0"),
+        ])
+        self.searcher = ip_region.IpRegionSearcher(self.path)
+        self.addCleanup(self.searcher.close)
+
+    def search(self, ip):
+        return self.searcher.search(int(ipaddress.ip_address(ip)))
+
+    def test_first_and_last_ip(self):
+        self.assertEqual(self.search("0.0.0.0"), "0|0|0|保留地址|0")
+        self.assertEqual(self.search("255.255.255.255"), "0|0|0|0|0")
+        self.assertEqual(self.search("255.254.255.255"), None)
+
+    def test_vector_block_ends(self):
+        self.assertEqual(self.search("1.2.0.0"), "中国|0|广东省|深圳市|电信")
+        self.assertEqual(self.search("1.2.0.255"), "中国|0|广东省|深圳市|电信")
+        self.assertEqual(self.search("1.2.1.0"), "中国|0|北京|北京市|联通")
+        self.assertEqual(self.search("1.2.255.255"), "中国|0|北京|北京市|联通")
+        self.assertEqual(self.search("1.1.255.255"), None)
+
+    def test_segment_split_across_blocks(self):
+        for ip in ("1.3.200.0", "1.3.255.255", "1.4.0.0", "1.4.9.255"):
+            self.assertEqual(self.search(ip), "中国|0|浙江省|杭州市|移动", ip)
+        self.assertEqual(self.search("1.3.199.255"), None)
+        self.assertEqual(self.search("1.4.10.0"), None)
+
+    def test_gap_after_last_segment(self):
+        # 最后一个区段之后没有数据，查找不能越过该前缀的区段范围
+        path = os.path.join(self.tmp, "partial.xdb")
+        build_xdb(path, [("255.255.0.0", "255.255.0.255", "0|0|0|0|0")])
+        searcher = ip_region.IpRegionSearcher(path)
+        self.addCleanup(searcher.close)
+        self.assertEqual(searcher.search(int(ipaddress.ip_address("255.255.0.255"))), "0|0|0|0|0")
+        self.assertEqual(searcher.search(int(ipaddress.ip_address("255.255.255.255"))), None)
+
+    def lookup(self, path, ip):
+        ip_region.lookup_location.cache_clear()
+        self.addCleanup(ip_region.lookup_location.cache_clear)
+        with mock.patch.multiple(ip_region, DB_PATH=path, _searcher=None, _searcher_missing=False):
+            return ip_region.lookup_location(ip)
+
+    def test_lookup_location(self):
+        self.assertEqual(self.lookup(self.path, "1.2.3.4"), "中国 北京 北京市")
+        self.assertEqual(self.lookup(self.path, "::1"), None)
+
+    def test_lookup_location_without_file(self):
+        missing = os.path.join(self.tmp, "missing.xdb")
+        with mock.patch.object(ip_region.logger, "warning") as warning:
+            self.assertEqual(self.lookup(missing, "1.2.3.4"), None)
+        warning.assert_called_once()
+
+
+class RetentionTests(TestCase):
+    """过期数据清理不删除全局公告的已读记录"""
+
+    def test_keep_announcement_receipts(self):
+        user = User.objects.create(username="reader", password="x")
+        old, new = SystemNotice.objects.bulk_create([
+            SystemNotice(title="old", content="c", type="announcement", is_global=True),
+            SystemNotice(title="new", content="c", type="announcement", is_global=True),
+        ])
+        notification = SystemNotice.objects.create(title="n", content="c", type="notification", is_global=False)
+        expired = datetime.datetime.now() - datetime.timedelta(days=400)
+        SystemNotice.objects.filter(pk=old.pk).update(create_time=expired)
+        SystemNotice.objects.filter(pk=new.pk).update(create_time=expired + datetime.timedelta(days=1))
+        # 只读了较新的公告，水位线不能越过未读的旧公告，已读状态只保存在 UserNotice 中
+        UserNotice.objects.bulk_create([
+            UserNotice(user=user, notice=new, is_read=True),
+            UserNotice(user=user, notice=notification, is_read=True),
+        ])
+        UserNotice.objects.update(receive_time=expired)
+
+        call_command("purge_expired_data", "--table", "user_notice", "--sleep", "0", stdout=StringIO())
+
+        self.assertEqual(list(UserNotice.objects.values_list("notice_id", flat=True)), [new.pk])
+        self.assertEqual(list(SystemNotice.unread_announcements(user)), [old])
+
+
+class DailyStatsTests(TestCase):
+    """仪表盘汇总表的增量维护与按日重新统计"""
+
+    def test_incr_creates_then_updates(self):
+        day = datetime.date(2026, 1, 1)
+        DailyStats.incr(day=day, plays=1)
+        DailyStats.incr(day=day, plays=2, comments=1)
+        DailyStats.incr(day=day + datetime.timedelta(days=1), logins=1)
+
+        row = DailyStats.objects.get(date=day)
+        self.assertEqual((row.plays, row.comments, row.logins), (3, 1, 0))
+        self.assertEqual(DailyStats.objects.count(), 2)
+
+    def test_backfill_day_boundaries(self):
+        day = datetime.date(2026, 1, 1)
+        midnight = datetime.datetime.combine(day, datetime.time.min)
+        next_midnight = midnight + datetime.timedelta(days=1)
+        user = User.objects.create(username="u", password="x")
+        # 当天 0 点计入当天，次日 0 点计入次日，前一天最后一刻不计入
+        LoginLog.objects.bulk_create([
+            LoginLog(username="u", log_time=midnight - datetime.timedelta(microseconds=1)),
+            LoginLog(username="u", log_time=midnight),
+            LoginLog(username="u", log_time=next_midnight - datetime.timedelta(microseconds=1)),
+            LoginLog(username="u", log_time=next_midnight),
+        ])
+        User.objects.filter(pk=user.pk).update(create_time=next_midnight)
+        # 增量维护的播放次数不被覆盖
+        DailyStats.incr(day=day, plays=5, logins=99)
+
+        call_command("backfill_daily_stats", "--date", "2026-01-01", stdout=StringIO())
+        call_command("backfill_daily_stats", "--date", "2026-01-02", stdout=StringIO())
+
+        first, second = DailyStats.objects.get(date=day), DailyStats.objects.get(date=next_midnight.date())
+        self.assertEqual((first.logins, first.new_users, first.plays), (2, 0, 5))
+        self.assertEqual((second.logins, second.new_users), (1, 1))
+
+    @skipIf(not redis_available, "需要 Redis 保存登录令牌")
+    def test_classification_stats(self):
+        admin = User.objects.create(username="admin", password="x", role="0")
+        token = generate_jwt({"user_id": str(admin.id)})
+        get_redis_client().set(f"jwt_token_{admin.id}", token)
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        pop = Classification.objects.create(name="pop")
+        rock = Classification.objects.create(name="rock")
+        language = Language.objects.create(name="zh")
+
+        ids = []
+        for title in ("a", "b", "c"):
+            response = self.client.post("/admin/song/create/", {
+                "title": title, "cover": "cover/a.jpg", "source": "song/a.mp3", "singer": "s",
+                "classification": str(pop.id), "language": str(language.id),
+            })
+            ids.append(response.json()["data"]["id"])
+        self.client.patch(
+            f"/admin/song/{ids[0]}/update/", {"classification": str(rock.id)}, content_type="application/json"
+        )
+        self.client.delete("/admin/song/delete/", [ids[1]], content_type="application/json")
+
+        counts = dict(ClassificationStats.objects.values_list("classification__name", "song_count"))
+        self.assertEqual(counts, {"pop": 1, "rock": 1})
+        self.assertEqual(
+            sorted(row["name"] for row in compute_totals()["classification_rank_data"]), ["pop", "rock"]
+        )
+
+        # 汇总表被绕开修改时，每晚的重新统计按歌曲表修正
+        Song.objects.filter(pk=ids[2]).update(classification=rock)
+        call_command("backfill_daily_stats", "--days", "1", stdout=StringIO())
+        counts = dict(ClassificationStats.objects.values_list("classification__name", "song_count"))
+        self.assertEqual(counts, {"pop": 0, "rock": 2})
+        self.assertEqual(compute_totals()["classification_rank_data"], [{"name": "rock", "count": 2}])
+
+
+class LoggingTests(SimpleTestCase):
+    """异步日志处理器、JSON 格式、采样和限流"""
+
+    def capture(self, name):
+        handler = logging.handlers.BufferingHandler(capacity=1000)
+        target = logging.getLogger(name)
+        target.setLevel(logging.DEBUG)
+        target.propagate = False
+        target.addHandler(handler)
+        self.addCleanup(target.removeHandler, handler)
+        return handler.buffer
+
+    def test_async_handler_binds_targets_in_any_order(self):
+        stream = StringIO()
+        # 异步处理器的名称排在目标处理器之前，目标处理器只被它引用
+        configure_logging({
+            "version": 1,
+            "disable_existing_loggers": False,
+            "handlers": {
+                "a_queue": {"class": "myapp.logging.handlers.AsyncHandler", "handlers": ["z_target"]},
+                "z_target": {"class": "logging.StreamHandler", "stream": stream},
+            },
+            "loggers": {"tests.async": {"handlers": ["a_queue"], "level": "INFO", "propagate": False}},
+        })
+        self.addCleanup(configure_logging, settings.LOGGING)
+
+        logging.getLogger("tests.async").info("hello %s", "world")
+        for _ in range(100):
+            if stream.getvalue():
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(stream.getvalue(), "hello world\n")
+
+    def test_bind_missing_handler(self):
+        handler = AsyncHandler(["missing"])
+        with self.assertRaises(ValueError):
+            handler.bind({})
+
+    def test_json_formatter(self):
+        token = bind_request("req-1")
+        try:
+            record = logging.LogRecord("myapp", logging.ERROR, __file__, 10, "failed %s", ("x",), None)
+            record.song_id = 42
+            record.exc_info = (ValueError, ValueError("bad"), None)
+            data = json.loads(JsonFormatter().format(AsyncHandler([]).prepare(record)))
+        finally:
+            unbind_request(token)
+
+        self.assertEqual(data["level"], "ERROR")
+        self.assertEqual(data["logger"], "myapp")
+        self.assertEqual(data["line"], 10)
+        self.assertEqual(data["message"], "failed x")
+        self.assertEqual(data["request_id"], "req-1")
+        self.assertIn("latency_ms", data)
+        self.assertNotIn("user_id", data)
+        self.assertEqual(data["song_id"], 42)
+        self.assertIn("ValueError: bad", data["exception"])
+        for key in ("time", "module", "process", "thread"):
+            self.assertIn(key, data)
+
+    def test_sampling(self):
+        records = self.capture("tests.sampling")
+        log = AppLogger("tests.sampling", sample_rates={"DEBUG": 0.3})
+        with mock.patch("myapp.logging.logger.random.random", return_value=0.5):
+            log.debug("dropped")
+            log.info("kept")
+        with mock.patch("myapp.logging.logger.random.random", return_value=0.2):
+            log.debug("sampled")
+        self.assertEqual([record.getMessage() for record in records], ["kept", "sampled"])
+
+    @override_settings(LOG_RATE_LIMITS={}, LOG_RATE_KEY_LIMIT=(2, 60))
+    def test_rate_key_limit(self):
+        records = self.capture("tests.rate_key")
+        log = AppLogger("tests.rate_key", sample_rates={})
+        now = [1000.0]
+        with mock.patch("myapp.logging.logger.time.monotonic", side_effect=lambda: now[0]):
+            for i in range(5):
+                log.warning(f"slow {i}", rate_key="slow")
+            # 没有 rate_key 的日志不受限流影响
+            for i in range(5):
+                log.warning(f"other {i}")
+            now[0] += 60
+            log.warning("slow again", rate_key="slow")
+
+        messages = [record.getMessage() for record in records]
+        self.assertEqual(messages[:2], ["slow 0", "slow 1"])
+        self.assertEqual(messages[2:7], [f"other {i}" for i in range(5)])
+        self.assertEqual(messages[7], "slow again（此前 60 秒内有 3 条同类日志被限流）")
+        self.assertEqual(len(messages), 8)
+
+    def test_errors_not_dropped_by_default(self):
+        records = self.capture("tests.errors")
+        log = AppLogger("tests.errors")
+        for i in range(100):
+            log.error(f"error {i}", exc_info=False)
+        self.assertEqual(len(records), 100)
+
+
+class MediaServeTests(SimpleTestCase):
+    """上传文件访问：Range / If-Range / 条件请求"""
+
+    content = bytes(range(256)) * 4
+    url = "/upload/source/test.mp3"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.media_root, "source"))
+        with open(os.path.join(cls.media_root, "source", "test.mp3"), "wb") as f:
+            f.write(cls.content)
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+        super().tearDownClass()
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Length"], str(len(self.content)))
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", response)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+
+    def test_open_and_suffix_range(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1000-")
+        self.assertEqual(b"".join(response.streaming_content), self.content[1000:])
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+
+    def test_multiple_ranges_return_full_file(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-1,5-6")
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range(self):
+        etag = self.client.head(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified(self):
+        etag = self.client.head(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_path_outside_media_root(self):
+        self.assertEqual(self.client.get("/upload/../manage.py").status_code, 404)
+        self.assertEqual(self.client.get("/upload/source/missing.mp3").status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_MODE="x-accel-redirect", MEDIA_ACCEL_REDIRECT_PREFIX="/protected/")
+    def test_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/source/test.mp3")
+        self.assertEqual(response.content, b"")
+
+
+class MediaRefCountTests(TestCase):
+    """上传文件引用计数：字段替换、删除、update_fields、富文本中的地址和重新统计"""
+
+    paths = ["cover/a.jpg", "cover/b.jpg", "cover/c.jpg", "video/v.mp4"]
+
+    def setUp(self):
+        MediaBlob.objects.bulk_create([MediaBlob(path=path, sha256="0" * 64) for path in self.paths])
+
+    def refs(self) -> dict:
+        return dict(MediaBlob.objects.values_list("path", "ref_count"))
+
+    def test_replace_and_delete(self):
+        song = Song.objects.create(title="t", cover="cover/a.jpg")
+        self.assertEqual(self.refs()["cover/a.jpg"], 1)
+
+        song.cover = "cover/b.jpg"
+        song.save()
+        self.assertEqual((self.refs()["cover/a.jpg"], self.refs()["cover/b.jpg"]), (0, 1))
+
+        # 只保存其他字段时不读取旧值、不修改引用
+        song.plays = 10
+        with self.assertNumQueries(1):
+            song.save(update_fields=["plays"])
+        self.assertEqual(self.refs()["cover/b.jpg"], 1)
+
+        song.delete()
+        self.assertEqual(self.refs()["cover/b.jpg"], 0)
+
+    def test_rich_text(self):
+        content = (
+            '<p><img src="http://localhost:8000/upload/cover/c.jpg" alt=""></p>'
+            '<video><source src="/upload/video/v.mp4" type="video/mp4"></video>'
+            '<p><img src="http://localhost:8000/upload/cover/c.jpg"></p>'
+        )
+        self.assertEqual(extract_media_paths(content), ["cover/c.jpg", "video/v.mp4"])
+
+        notice = SystemNotice.objects.create(title="n", content=content, type="notification", is_global=False)
+        self.assertEqual((self.refs()["cover/c.jpg"], self.refs()["video/v.mp4"]), (1, 1))
+
+        notice.content = '<video src="/upload/video/v.mp4"></video>'
+        notice.save(update_fields=["content"])
+        self.assertEqual((self.refs()["cover/c.jpg"], self.refs()["video/v.mp4"]), (0, 1))
+
+        notice.delete()
+        self.assertEqual(self.refs()["video/v.mp4"], 0)
+
+    def test_recount(self):
+        Song.objects.create(title="t", cover="cover/a.jpg", description='<img src="/upload/cover/a.jpg">')
+        SystemNotice.objects.create(title="n", content='<img src="/upload/cover/c.jpg">', type="notification")
+        self.assertEqual(self.refs()["cover/a.jpg"], 2)
+        # update() 不触发信号，计数被破坏后按业务数据重新统计
+        MediaBlob.objects.update(ref_count=5)
+        self.assertEqual(recount_refs(), 4)
+        self.assertEqual(self.refs(), {"cover/a.jpg": 2, "cover/b.jpg": 0, "cover/c.jpg": 1, "video/v.mp4": 0})
+
+
+@skipIf(not redis_available, "需要 Redis 保存上传会话")
+class ChunkedUploadTests(TestCase):
+    """分片上传：初始化、校验失败后续传、分片位置错误、完成后按内容去重"""
+
+    content = "[00:01.00]第一行\n[00:02.00]第二行\n".encode() * 10
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def init(self) -> dict:
+        response = self.client.post(
+            "/chunkUpload/init/", {"type": "lyric", "filename": "song.lrc", "size": len(self.content)},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json()["code"], 0, response.json())
+        return response.json()["data"]
+
+    def put(self, upload_id: str, offset: int, data: bytes, checksum: str = None):
+        checksum = checksum or hashlib.sha256(data).hexdigest()
+        return self.client.put(
+            f"/chunkUpload/{upload_id}/?offset={offset}&checksum={checksum}",
+            data=data, content_type="application/octet-stream",
+        ).json()
+
+    def upload(self) -> str:
+        upload_id = self.init()["uploadId"]
+        half = len(self.content) // 2
+        self.assertEqual(self.put(upload_id, 0, self.content[:half])["data"]["offset"], half)
+        self.assertEqual(self.put(upload_id, half, self.content[half:])["data"]["offset"], len(self.content))
+        response = self.client.post(f"/chunkUpload/{upload_id}/complete/").json()
+        self.assertEqual(response["code"], 0, response)
+        return response["data"]["path"]
+
+    def test_init(self):
+        info = self.init()
+        self.assertEqual((info["offset"], info["size"]), (0, len(self.content)))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, "lyric", f".{info['uploadId']}.part")))
+        response = self.client.get(f"/chunkUpload/{info['uploadId']}/").json()
+        self.assertEqual(response["data"]["offset"], 0)
+
+    def test_resume_after_bad_checksum(self):
+        upload_id = self.init()["uploadId"]
+        half = len(self.content) // 2
+        self.put(upload_id, 0, self.content[:half])
+
+        response = self.put(upload_id, half, self.content[half:], checksum="0" * 64)
+        self.assertNotEqual(response["code"], 0)
+        # 校验失败的数据被截断，从原来的位置继续
+        self.assertEqual(response["data"]["offset"], half)
+        self.assertEqual(os.path.getsize(os.path.join(self.media_root, "lyric", f".{upload_id}.part")), half)
+
+        self.assertEqual(self.put(upload_id, half, self.content[half:])["data"]["offset"], len(self.content))
+        path = self.client.post(f"/chunkUpload/{upload_id}/complete/").json()["data"]["path"]
+        with open(os.path.join(self.media_root, path), "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_wrong_offset(self):
+        upload_id = self.init()["uploadId"]
+        response = self.put(upload_id, 10, self.content[10:20])
+        self.assertNotEqual(response["code"], 0)
+        self.assertEqual(response["data"]["offset"], 0)
+
+        # 未上传完整时不能完成
+        self.assertNotEqual(self.client.post(f"/chunkUpload/{upload_id}/complete/").json()["code"], 0)
+
+    def test_complete_deduplicates(self):
+        first, second = self.upload(), self.upload()
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(f"lyric/{hashlib.sha256(self.content).hexdigest()[:2]}/"))
+        self.assertEqual(MediaBlob.objects.filter(path=first).count(), 1)
+        self.assertFalse([name for name in os.listdir(os.path.join(self.media_root, "lyric")) if name.endswith(".part")])
+
+    def test_complete_missing_part(self):
+        upload_id = self.init()["uploadId"]
+        self.put(upload_id, 0, self.content)
+        os.unlink(os.path.join(self.media_root, "lyric", f".{upload_id}.part"))
+        response = self.client.post(f"/chunkUpload/{upload_id}/complete/").json()
+        self.assertNotEqual(response["code"], 0)
+        self.assertNotEqual(self.client.get(f"/chunkUpload/{upload_id}/").json()["code"], 0)
+
+
+class ImageDerivativeTests(SimpleTestCase):
+    """衍生图生成：并发生成同一张图、meta 中记录原图尺寸"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_concurrent_render(self):
+        from PIL import Image
+
+        path = "cover/large.jpg"
+        source = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(source))
+        Image.new("RGB", (3000, 2000), (200, 30, 30)).save(source)
+
+        results, errors = [], []
+
+        def render():
+            try:
+                results.append(render_derivatives(source, get_derived_dir(path), get_sizes(path), 80, 82))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 4)
+        # JPEG 按 draft 缩小解码，meta 中仍是原图尺寸
+        self.assertEqual((results[0]["width"], results[0]["height"]), (3000, 2000))
+        files = os.listdir(get_derived_dir(path))
+        self.assertFalse([name for name in files if name.endswith(".tmp")])
+        self.assertIn("meta.json", files)
+        with Image.open(os.path.join(get_derived_dir(path), "detail.jpg")) as image:
+            self.assertEqual(image.size, (800, 800))
+
+    def test_missing_source_not_scheduled(self):
+        with mock.patch("myapp.utils.images.derivative_pool.submit") as submit:
+            variants = get_image_variants("cover/missing.jpg")
+        submit.assert_not_called()
+        self.assertIn("thumb", variants)
+
+    def test_failed_source_not_retried(self):
+        from PIL import Image
+
+        path = "cover/broken.jpg"
+        source = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(source))
+        with open(source, "wb") as f:
+            f.write(b"not an image")
+
+        with self.assertRaises(Exception):
+            render_derivatives(source, get_derived_dir(path), get_sizes(path), 80, 82)
+        self.assertTrue(os.path.exists(os.path.join(get_derived_dir(path), "failed")))
+
+        with mock.patch("myapp.utils.images.derivative_pool.submit") as submit, \
+                mock.patch("myapp.utils.images.render_derivatives") as render:
+            self.assertIsNone(get_image_variants(path))
+            with self.assertRaises(DerivativeFailedError):
+                ensure_derivatives(path)
+        submit.assert_not_called()
+        render.assert_not_called()
+        self.assertEqual(self.client.get(f"/image/thumb/webp/{path}").status_code, 404)
+
+        # 原图被替换后重新生成，成功后清除失败标记
+        Image.new("RGB", (100, 100)).save(source, "JPEG")
+        later = os.path.getmtime(os.path.join(get_derived_dir(path), "failed")) + 10
+        os.utime(source, (later, later))
+        with mock.patch("myapp.utils.images.derivative_pool.submit") as submit:
+            self.assertIsNone(get_image_variants(path)["color"])
+        submit.assert_called_once()
+        ensure_derivatives(path)
+        self.assertFalse(os.path.exists(os.path.join(get_derived_dir(path), "failed")))
+
+
+class AudioMetadataTests(SimpleTestCase):
+    """音频文件头解析：时长、码率、采样率、标签"""
+
+    # MPEG-1 Layer III，128kbps，44100Hz，立体声，每帧 417 字节、1152 个采样
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, name: str, content: bytes) -> str:
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def test_cbr_mp3_with_id3(self):
+        title = b"\x03" + "和你".encode()
+        frame = b"TIT2" + struct.pack(">I", len(title)) + b"\x00\x00" + title
+        tag = b"ID3\x03\x00\x00" + bytes([0, 0, 0, len(frame)]) + frame
+        path = self.write("a.mp3", tag + self.frame * 1000)
+        result = analyze_audio(path)
+        self.assertEqual(result["format"], "mp3")
+        self.assertEqual(result["bitrate"], 128)
+        self.assertEqual(result["sample_rate"], 44100)
+        self.assertAlmostEqual(result["duration"], 417000 * 8 / 128000, places=2)
+        self.assertEqual(result["title"], "和你")
+        self.assertEqual(result["file_size"], len(tag) + 417000)
+
+    def test_vbr_mp3_uses_frame_count(self):
+        first = self.frame[:36] + b"Xing" + struct.pack(">II", 1, 2000)
+        first += b"\x00" * (417 - len(first))
+        result = analyze_audio(self.write("v.mp3", first + self.frame * 10))
+        self.assertAlmostEqual(result["duration"], 2000 * 1152 / 44100, places=2)
+
+    def test_wav(self):
+        path = os.path.join(self.tmp_dir, "a.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b"\x00" * 4 * 8000 * 2)
+        result = analyze_audio(path)
+        self.assertEqual(result["duration"], 2.0)
+        self.assertEqual(result["sample_rate"], 8000)
+        self.assertEqual(result["bitrate"], 256)
+
+    def test_unknown_format(self):
+        with self.assertRaises(AudioParseError):
+            analyze_audio(self.write("a.bin", b"not audio" * 10))
+
+
+class LyricTimelineTests(SimpleTestCase):
+    """LRC 解析：多时间标签展开、排序、offset、按时间查找行"""
+
+    lrc = "\n".join([
+        "[ti:和你]",
+        "[ar:余佳运]",
+        "[00:14.06]许多回忆 藏在心底",
+        "[00:20.1][01:20.12]总来不及 都告诉你",
+        "[00:26.130]<00:26.13>和你<00:27.00>一起",
+        "没有时间标签的行",
+    ])
+
+    def test_parse(self):
+        timeline = parse_lrc(self.lrc)
+        self.assertEqual(timeline["times"], [14060, 20100, 26130, 80120])
+        self.assertEqual(timeline["lines"], ["许多回忆 藏在心底", "总来不及 都告诉你", "和你一起", "总来不及 都告诉你"])
+        self.assertEqual(timeline["meta"], {"ti": "和你", "ar": "余佳运"})
+
+    def test_offset(self):
+        timeline = parse_lrc("[offset:100]\n[00:00.05]a\n[00:01.00]b")
+        self.assertEqual(timeline["times"], [0, 900])
+
+    def test_find_line(self):
+        times = parse_lrc(self.lrc)["times"]
+        self.assertEqual(find_line(times, 0), -1)
+        self.assertEqual(find_line(times, 14060), 0)
+        self.assertEqual(find_line(times, 26000), 1)
+        self.assertEqual(find_line(times, 999999), 3)
+
+    def test_search_text_removes_duplicates(self):
+        text = lyric_search_text(parse_lrc(self.lrc))
+        self.assertEqual(text.split("\n"), ["许多回忆 藏在心底", "总来不及 都告诉你", "和你一起"])
+
+
+class LyricSearchTests(TestCase):
+    """按歌词搜索：MySQL 使用 ngram 全文索引，其他数据库用 LIKE"""
+
+    def setUp(self):
+        self.song = Song.objects.create(title="和你", status="0")
+        self.other = Song.objects.create(title="其他", status="0")
+        # 保存信号会按歌词文件重新生成 lyric_text
+        Song.objects.filter(pk=self.song.pk).update(lyric_text="许多回忆 藏在心底\n总来不及 都告诉你")
+        Song.objects.filter(pk=self.other.pk).update(lyric_text="Hello World")
+
+    def search(self, keyword):
+        return list(filter_lyric_text(Song.objects.all(), keyword).values_list("pk", flat=True))
+
+    @skipIf(connection.vendor == "mysql", "MySQL 使用全文索引")
+    def test_like_fallback(self):
+        self.assertEqual(self.search("回忆"), [self.song.pk])
+        self.assertEqual(self.search("hello"), [self.other.pk])
+        self.assertEqual(self.search("告诉我"), [])
+
+    def test_mysql_uses_fulltext_index(self):
+        with mock.patch.object(connection, "vendor", "mysql"):
+            sql = str(filter_lyric_text(Song.objects.all(), '回忆"').query)
+            short = str(filter_lyric_text(Song.objects.all(), "忆").query)
+        self.assertIn('MATCH (', sql)
+        self.assertIn('AGAINST ("回忆" IN BOOLEAN MODE)', sql)
+        self.assertNotIn("LIKE", sql)
+        # 短于 ngram 词元的关键字无法使用全文索引
+        self.assertNotIn("MATCH", short)
+        self.assertIn("LIKE", short)
+
+
+class WaveformTests(SimpleTestCase):
+    """WAV 波形峰值：.dat 文件头和各点的最小 / 最大值"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_compute_waveforms(self):
+        path = os.path.join(self.tmp_dir, "a.wav")
+        # 1 秒静音 + 1 秒满幅方波，单声道 8000Hz
+        samples = [0] * 8000 + [32767, -32768] * 4000
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+        targets = {2: os.path.join(self.tmp_dir, "a-2.dat"), 1000: os.path.join(self.tmp_dir, "a-1000.dat")}
+        # 每秒 100 个细粒度峰值，2 秒只有 200 个点
+        self.assertEqual(compute_waveforms(path, targets), {2: 2, 1000: 200})
+
+        with open(targets[2], "rb") as f:
+            content = f.read()
+        self.assertEqual(struct.unpack("<iIiiI", content[:20]), (1, 1, 8000, 8000, 2))
+        self.assertEqual(struct.unpack("<4b", content[20:]), (0, 0, -128, 127))
+
+    values = [-32768, -12345, -256, -1, 0, 1, 255, 12345, 32767]
+
+    def encode(self, width, values):
+        """按 width 字节的小端 PCM 编码，低位字节填入不影响结果的数据"""
+        if width == 1:
+            return bytes((value >> 8) + 128 for value in values)
+        if width == 2:
+            return struct.pack(f"<{len(values)}h", *values)
+        extra = width - 2
+        return b"".join(
+            ((value << (8 * extra)) | (0xAB if extra == 1 else 0x1234)).to_bytes(width, "little", signed=True)
+            for value in values
+        )
+
+    def expected(self, width):
+        # 8 位采样只保留高 8 位
+        return [(value >> 8) << 8 for value in self.values] if width == 1 else self.values
+
+    def test_to_int16_python(self):
+        with mock.patch.object(waveform, "np", None):
+            for width in (1, 2, 3, 4):
+                with self.subTest(width=width):
+                    samples = waveform._to_int16(self.encode(width, self.values), width)
+                    self.assertEqual(list(samples), self.expected(width))
+
+    @skipUnless(waveform.np, "需要 NumPy")
+    def test_to_int16_numpy_matches_python(self):
+        for width in (1, 2, 3, 4):
+            with self.subTest(width=width):
+                data = self.encode(width, self.values)
+                with mock.patch.object(waveform, "np", None):
+                    python_samples = list(waveform._to_int16(data, width))
+                numpy_samples = waveform._to_int16(data, width)
+                self.assertEqual(numpy_samples.dtype, waveform.np.int16)
+                self.assertEqual(numpy_samples.tolist(), python_samples)
+                self.assertEqual(python_samples, self.expected(width))
+
+    def write_stereo(self, width):
+        path = os.path.join(self.tmp_dir, f"stereo-{width}.wav")
+        # 左声道静音，右声道前半秒正半周、后半秒负半周，单独看任何一个声道都得不到完整的峰值
+        frames = []
+        for i in range(8000):
+            right = 20000 if i < 4000 else -20000
+            frames += [0, right]
+        with wave.open(path, "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(width)
+            f.setframerate(8000)
+            f.writeframes(self.encode(width, frames))
+        return path
+
+    def test_stereo(self):
+        for width in (1, 2, 3, 4):
+            with self.subTest(width=width):
+                path = self.write_stereo(width)
+                targets = {2: os.path.join(self.tmp_dir, f"stereo-{width}.dat")}
+                with mock.patch.object(waveform, "np", None):
+                    self.assertEqual(compute_waveforms(path, targets), {2: 2})
+                with open(targets[2], "rb") as f:
+                    content = f.read()
+                # 8000 帧两个点，每点 4000 帧（不是 8000 个交错采样）
+                self.assertEqual(struct.unpack("<iIiiI", content[:20]), (1, 1, 8000, 4000, 2))
+                self.assertEqual(struct.unpack("<4b", content[20:]), (0, 20000 >> 8, -20000 >> 8, 0))
+
+    @skipUnless(waveform.np, "需要 NumPy")
+    def test_numpy_waveform_matches_python(self):
+        for width in (1, 2, 3, 4):
+            with self.subTest(width=width):
+                path = self.write_stereo(width)
+                python_target = {1000: os.path.join(self.tmp_dir, "python.dat")}
+                numpy_target = {1000: os.path.join(self.tmp_dir, "numpy.dat")}
+                with mock.patch.object(waveform, "np", None):
+                    compute_waveforms(path, python_target)
+                compute_waveforms(path, numpy_target)
+                with open(python_target[1000], "rb") as f, open(numpy_target[1000], "rb") as g:
+                    self.assertEqual(f.read(), g.read())
+
+
+class OrphanedMediaTests(TestCase):
+    """孤立文件回收：未被引用且超过保留期的文件及其衍生文件"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.song = Song.objects.create(title="和你", cover="cover/keep.jpg", source="source/keep.mp3")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def create(self, path: str, age: int = 7200):
+        full_path = os.path.join(self.media_root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as f:
+            f.write(b"x")
+        mtime = datetime.datetime.now().timestamp() - age
+        os.utime(full_path, (mtime, mtime))
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(os.path.join(self.media_root, path))
+
+    def test_collect(self):
+        for path in ["cover/keep.jpg", "derived/cover/keep/thumb.webp", "source/keep.mp3",
+                     "source/keep.waveform-200.dat", "cover/old.jpg", "derived/cover/old/thumb.webp",
+                     "source/old.waveform-200.dat", "avatar/default.png"]:
+            self.create(path)
+        self.create("cover/new.jpg", age=0)
+
+        orphans = ["cover/old.jpg", "derived/cover/old/thumb.webp", "source/old.waveform-200.dat"]
+        dry_run = collect_orphaned_media(3600, dry_run=True, workers=2)
+        self.assertEqual([path for path, _ in dry_run], orphans)
+        self.assertTrue(all(self.exists(path) for path in orphans))
+
+        removed = collect_orphaned_media(3600, workers=2)
+        self.assertEqual([path for path, _ in removed], orphans)
+        self.assertFalse(any(self.exists(path) for path in orphans))
+        self.assertFalse(self.exists("derived/cover/old"))
+        for path in ["cover/keep.jpg", "derived/cover/keep/thumb.webp", "source/keep.waveform-200.dat",
+                     "cover/new.jpg", "avatar/default.png"]:
+            self.assertTrue(self.exists(path), path)
+
+    def test_keep_rich_text_media(self):
+        # 富文本编辑器上传的图片和视频只出现在 HTML 中
+        for path in ["cover/embedded.jpg", "derived/cover/embedded/thumb.webp", "video/clip.mp4", "video/old.mp4"]:
+            self.create(path)
+        SystemNotice.objects.create(
+            title="n", type="notification",
+            content='<p><img src="http://localhost:8000/upload/cover/embedded.jpg"></p>'
+                    '<video controls><source src="http://localhost:8000/upload/video/clip.mp4"></video>',
+        )
+        removed = collect_orphaned_media(3600, workers=2)
+        self.assertEqual([path for path, _ in removed], ["video/old.mp4"])
+        for path in ["cover/embedded.jpg", "derived/cover/embedded/thumb.webp", "video/clip.mp4"]:
+            self.assertTrue(self.exists(path), path)
+
+    def test_keep_parts_without_redis(self):
+        part = f"source/.{'a' * 32}.part"
+        self.create(part)
+        # Redis 不可用时无法确认会话是否过期，保留 .part 文件
+        with mock.patch("myapp.utils.chunked_upload.r", None):
+            self.assertEqual(collect_orphaned_media(3600, workers=2), [])
+        self.assertTrue(self.exists(part))
@@ -60,6 +60,11 @@ urlpatterns = [
     # 系统信息部分
     path('admin/overview/sysInfo/', admin.sys_info, name='get_sys_info'),
     path('admin/overview/getDashboardInfo/', admin.get_dashboard_info, name='get_dashboard_info'),
+    path('metrics', admin.metrics, name='metrics'),
+    path('admin/profile/getProfileList/', admin.get_request_profile_list, name='get_request_profile_list'),
+    path('admin/profile/<str:pk>/download/', admin.download_request_profile, name='download_request_profile'),
+    path('admin/slowQuery/getSlowQueryList/', admin.get_slow_query_list, name='get_slow_query_list'),
+    path('admin/slowQuery/reset/', admin.reset_slow_query, name='reset_slow_query'),
 
     # 通知部分
     path('admin/notice/createForAll/', admin.create_notice_all, name='create_notice_all'),
@@ -67,6 +72,7 @@ urlpatterns = [
     path('admin/notice/delete/', admin.delete_notices, name='delete_notices'),
     path('admin/notice/<str:pk>/update/', admin.update_notice, name='update_notice'),
     path('admin/notice/get/', admin.list_all_notices, name='list_all_notices'),
+    path('admin/notice/<str:pk>/progress/', admin.get_notice_delivery_progress, name='get_notice_delivery_progress'),
 
     # ================ 前台api================
     # 用户部分
@@ -86,6 +92,8 @@ urlpatterns = [
     path('song/addPlays/', index.add_plays, name='add_plays'),
     path('song/getRecommendSong/', index.get_recommend_song, name='get_recommend_song'),
     path('song/<str:pk>/getSongInfo/', index.get_song_info, name='get_music_info'),
+    path('song/<str:pk>/getLyrics/', index.get_lyrics, name='get_lyrics'),
+    path('song/searchLyrics/', index.search_lyrics, name='search_lyrics'),
 
     # 歌单部分
     path('playlist/create/', index.create_playlist, name='create_playlist'),
@@ -126,6 +134,9 @@ urlpatterns = [
     path('notice/getUserNoticeList/', index.get_user_notice_list, name='get_user_notice_list'),
     path('notice/getAnnouncementList/', index.get_announcement_list, name='get_announcement_list'),
     path('notice/<str:pk>/markRead/', index.mark_notice_read, name='mark_notice_read'),
+    path('notice/getUnreadCount/', index.get_unread_count, name='get_unread_count'),
+    path('notice/markAllRead/', index.mark_all_notice_read, name='mark_all_notice_read'),
+    path('notice/stream/', index.notice_stream, name='notice_stream'),
 
     # 浏览记录部分
     path('browseHistory/create/', index.create_browse_history, name='create_browse_history'),
@@ -133,4 +144,14 @@ urlpatterns = [
     path('browseHistory/delete/', index.delete_browse_history, name='delete_browse_history'),
 
     path('upload/', FileUploadView.as_view(), name='file-upload'),
+    # 分片上传（断点续传）
+    path('chunkUpload/init/', index.init_chunk_upload, name='init_chunk_upload'),
+    path('chunkUpload/<str:upload_id>/', index.chunk_upload, name='chunk_upload'),
+    path('chunkUpload/<str:upload_id>/complete/', index.complete_chunk_upload, name='complete_chunk_upload'),
+    # 上传文件访问（支持 Range 请求）
+    path('upload/<path:path>', index.serve_media, name='serve_media'),
+    # 图片衍生图（thumb / list / detail，webp / jpg）
+    path('image/<str:variant>/<str:fmt>/<path:path>', index.serve_image_variant, name='serve_image_variant'),
+    # 波形峰值文件
+    path('waveform/<int:points>/<path:path>', index.serve_waveform, name='serve_waveform'),
 ]
@@ -0,0 +1,691 @@
+# 音频元数据分析（时长、码率、采样率、文件大小、内嵌封面、标题和演唱者）
+# 纯 Python 解析文件头和标签，不解码音频数据，支持：
+#   MP3（ID3v1 / ID3v2.2-2.4，Xing / Info / VBRI 头的 VBR 文件按帧数计算时长）
+#   FLAC、WAV、Ogg（Vorbis / Opus）、MP4 / M4A（AAC、ALAC）
+# 歌曲保存后音频文件有变化时提交到进程池分析，结果写回 Song；
+# 标题、演唱者、封面只在歌曲没有填写时使用文件中的值
+#
+# analyze_audio 在子进程中执行，只依赖参数，返回值中的封面为原始字节，由 Web 进程保存；
+# 子进程没有初始化 Django 应用，模型只在 Web 进程中使用的函数内导入
+
+import base64
+import os
+import struct
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.utils._os import safe_join
+
+from myapp.logging.logger import logger
+from myapp.utils.process_pool import BackgroundProcessPool
+
+# 标签中的封面最大读取大小
+MAX_PICTURE_SIZE = 10 * 1024 * 1024
+# 查找 MP3 第一帧时最多读取的字节数
+MP3_SYNC_SEARCH_SIZE = 64 * 1024
+# Ogg 文件末尾读取的字节数（最后一页的 granule position 即总采样数）
+OGG_TAIL_SIZE = 64 * 1024
+PICTURE_EXTENSIONS = {"image/jpeg": ".jpg", "image/jpg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+PROCESS_WORKERS = getattr(settings, "AUDIO_PROCESS_WORKERS", 2)
+
+METADATA_FIELDS = ["duration", "bitrate", "sample_rate", "file_size"]
+
+
+class AudioParseError(Exception):
+    pass
+
+
+# ================ 子进程中执行的部分 ================
+
+def _decode_legacy(data: bytes) -> str:
+    """ID3 中标记为 Latin-1 的文本实际上多为 GBK 编码的中文，依次尝试 UTF-8、GBK"""
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return data.decode("latin-1")
+
+
+def _clean(text):
+    if text is None:
+        return None
+    text = text.replace("\x00", "").strip()
+    return text or None
+
+
+def _picture(mime: str, data: bytes, picture_type: int = 3):
+    if not data or len(data) > MAX_PICTURE_SIZE:
+        return None
+    mime = (mime or "").lower()
+    if data.startswith(b"\xff\xd8"):
+        mime = "image/jpeg"
+    elif data.startswith(b"\x89PNG"):
+        mime = "image/png"
+    if mime not in PICTURE_EXTENSIONS:
+        return None
+    return {"mime": mime, "data": data, "type": picture_type}
+
+
+def _better_picture(current, new):
+    """优先使用封面（图片类型 3）"""
+    if new is None:
+        return current
+    if current is None or (current["type"] != 3 and new["type"] == 3):
+        return new
+    return current
+
+
+# ---- ID3 ----
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _split_encoded(data: bytes, encoding: int):
+    """按编码对应的结束符切分字符串，返回 (字符串字节, 剩余字节)"""
+    if encoding in (1, 2):
+        pos = 0
+        while True:
+            pos = data.find(b"\x00\x00", pos)
+            if pos < 0:
+                return data, b""
+            if pos % 2 == 0:
+                return data[:pos], data[pos + 2:]
+            pos += 1
+    pos = data.find(b"\x00")
+    if pos < 0:
+        return data, b""
+    return data[:pos], data[pos + 1:]
+
+
+def _decode_id3_text(data: bytes, encoding: int) -> str:
+    if encoding == 1:
+        return data.decode("utf-16", errors="replace")
+    if encoding == 2:
+        return data.decode("utf-16-be", errors="replace")
+    if encoding == 3:
+        return data.decode("utf-8", errors="replace")
+    return _decode_legacy(data)
+
+
+def _id3_text_frame(data: bytes):
+    if not data:
+        return None
+    # ID3v2.4 多个值用 \0 分隔，只取第一个
+    text, _ = _split_encoded(data[1:], data[0])
+    return _clean(_decode_id3_text(text, data[0]))
+
+
+def _id3_picture_frame(data: bytes, v22: bool):
+    if len(data) < 4:
+        return None
+    encoding = data[0]
+    if v22:
+        image_format, rest = data[1:4].decode("latin-1").upper(), data[4:]
+        mime = {"JPG": "image/jpeg", "PNG": "image/png"}.get(image_format, "")
+    else:
+        mime, rest = _split_encoded(data[1:], 0)
+        mime = mime.decode("latin-1")
+    if not rest:
+        return None
+    picture_type = rest[0]
+    _, image = _split_encoded(rest[1:], encoding)
+    return _picture(mime, image, picture_type)
+
+
+def _parse_id3v2(header: bytes, tag: bytes, result: dict):
+    major, flags = header[3], header[5]
+    if major < 2 or major > 4:
+        return
+    if major < 4 and flags & 0x80:
+        # 整个标签做过反同步处理
+        tag = tag.replace(b"\xff\x00", b"\xff")
+    pos = 0
+    if flags & 0x40 and major >= 3:
+        # 跳过扩展头
+        if major == 3:
+            pos = 4 + struct.unpack(">I", tag[:4])[0]
+        else:
+            pos = _syncsafe(tag[:4])
+
+    v22 = major == 2
+    id_size, header_size = (3, 6) if v22 else (4, 10)
+    title_ids = ("TT2",) if v22 else ("TIT2",)
+    artist_ids = ("TP1",) if v22 else ("TPE1",)
+    picture_ids = ("PIC",) if v22 else ("APIC",)
+
+    while pos + header_size <= len(tag):
+        frame_id = tag[pos:pos + id_size]
+        if not frame_id.strip(b"\x00") or not frame_id.isalnum():
+            break  # 填充区
+        if v22:
+            size = int.from_bytes(tag[pos + 3:pos + 6], "big")
+            frame_flags = 0
+        else:
+            raw_size = tag[pos + 4:pos + 8]
+            size = _syncsafe(raw_size) if major == 4 else struct.unpack(">I", raw_size)[0]
+            frame_flags = tag[pos + 9]
+        data = tag[pos + header_size:pos + header_size + size]
+        pos += header_size + size
+
+        if major == 4:
+            if frame_flags & 0x01:
+                data = data[4:]  # 数据长度指示
+            if frame_flags & 0x02:
+                data = data.replace(b"\xff\x00", b"\xff")
+        elif frame_flags & 0xc0:
+            continue  # 压缩或加密的帧
+
+        frame_id = frame_id.decode("latin-1")
+        if frame_id in title_ids and not result.get("title"):
+            result["title"] = _id3_text_frame(data)
+        elif frame_id in artist_ids and not result.get("artist"):
+            result["artist"] = _id3_text_frame(data)
+        elif frame_id in picture_ids:
+            result["picture"] = _better_picture(result.get("picture"), _id3_picture_frame(data, v22))
+
+
+def _read_id3v2(f, result: dict) -> int:
+    """读取文件开头的 ID3v2 标签，返回音频数据的起始位置"""
+    f.seek(0)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        return 0
+    size = _syncsafe(header[6:10])
+    end = 10 + size + (10 if header[5] & 0x10 else 0)
+    tag = f.read(min(size, MAX_PICTURE_SIZE + 1024 * 1024))
+    try:
+        _parse_id3v2(header, tag, result)
+    except (IndexError, struct.error, ValueError) as e:
+        # 标签损坏不影响时长等属性
+        logger.debug(f"ID3v2 标签解析失败: {e}")
+    return end
+
+
+def _read_id3v1(f, size: int, result: dict) -> int:
+    """读取文件末尾的 ID3v1 标签（只在 ID3v2 没有时使用），返回标签大小"""
+    if size < 128:
+        return 0
+    f.seek(size - 128)
+    tag = f.read(128)
+    if tag[:3] != b"TAG":
+        return 0
+    result["title"] = result.get("title") or _clean(_decode_legacy(tag[3:33].split(b"\x00")[0]))
+    result["artist"] = result.get("artist") or _clean(_decode_legacy(tag[33:63].split(b"\x00")[0]))
+    return 128
+
+
+# ---- MP3 ----
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _mp3_frame_header(data: bytes, pos: int):
+    """解析 pos 处的 MPEG 音频帧头，不是合法帧头时返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xff or data[pos + 1] & 0xe0 != 0xe0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = {0: 2.5, 2: 2, 3: 1}.get((b1 >> 3) & 0x03)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 0x03)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index]
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        samples, length = 384, (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version != 1 else 1152
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+        "mono": (b3 >> 6) == 3,
+    }
+
+
+def _parse_mp3(f, size: int, result: dict):
+    start = _read_id3v2(f, result)
+    id3v1_size = _read_id3v1(f, size, result)
+    f.seek(start)
+    data = f.read(MP3_SYNC_SEARCH_SIZE)
+
+    # 找到第一个后面紧跟另一个合法帧头的位置，避免把数据中的 0xFFE 误当成帧头
+    frame = None
+    pos = data.find(b"\xff")
+    while 0 <= pos < len(data) - 4:
+        frame = _mp3_frame_header(data, pos)
+        if frame:
+            following = _mp3_frame_header(data, pos + frame["length"])
+            if following or pos + frame["length"] >= len(data):
+                break
+        frame = None
+        pos = data.find(b"\xff", pos + 1)
+    if frame is None:
+        raise AudioParseError("找不到 MPEG 音频帧")
+
+    result["sample_rate"] = frame["sample_rate"]
+    audio_size = size - start - pos - id3v1_size
+
+    # VBR 文件第一帧是 Xing / Info 或 VBRI 头，记录了总帧数
+    if frame["version"] == 1:
+        side_info = 17 if frame["mono"] else 32
+    else:
+        side_info = 9 if frame["mono"] else 17
+    frames = vbr_bytes = None
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        offset = xing + 8
+        if flags & 0x01:
+            frames = struct.unpack(">I", data[offset:offset + 4])[0]
+            offset += 4
+        if flags & 0x02:
+            vbr_bytes = struct.unpack(">I", data[offset:offset + 4])[0]
+    elif data[pos + 36:pos + 40] == b"VBRI":
+        vbr_bytes, frames = struct.unpack(">II", data[pos + 46:pos + 54])
+
+    if frames:
+        duration = frames * frame["samples"] / frame["sample_rate"]
+        result["duration"] = duration
+        result["bitrate"] = round((vbr_bytes or audio_size) * 8 / duration / 1000) if duration else None
+    else:
+        # CBR：按第一帧的码率计算
+        result["bitrate"] = frame["bitrate"]
+        result["duration"] = audio_size * 8 / (frame["bitrate"] * 1000)
+
+
+# ---- FLAC / Vorbis comment ----
+
+def _parse_flac_picture(data: bytes):
+    picture_type, mime_length = struct.unpack(">II", data[:8])
+    mime = data[8:8 + mime_length].decode("latin-1")
+    pos = 8 + mime_length
+    desc_length = struct.unpack(">I", data[pos:pos + 4])[0]
+    pos += 4 + desc_length + 16
+    data_length = struct.unpack(">I", data[pos:pos + 4])[0]
+    return _picture(mime, data[pos + 4:pos + 4 + data_length], picture_type)
+
+
+def _parse_vorbis_comment(data: bytes, result: dict):
+    vendor_length = struct.unpack("<I", data[:4])[0]
+    pos = 4 + vendor_length
+    count = struct.unpack("<I", data[pos:pos + 4])[0]
+    pos += 4
+    for _ in range(count):
+        length = struct.unpack("<I", data[pos:pos + 4])[0]
+        comment = data[pos + 4:pos + 4 + length]
+        pos += 4 + length
+        key, sep, value = comment.partition(b"=")
+        if not sep:
+            continue
+        key = key.decode("ascii", errors="replace").upper()
+        if key == "TITLE" and not result.get("title"):
+            result["title"] = _clean(value.decode("utf-8", errors="replace"))
+        elif key == "ARTIST" and not result.get("artist"):
+            result["artist"] = _clean(value.decode("utf-8", errors="replace"))
+        elif key == "METADATA_BLOCK_PICTURE":
+            try:
+                picture = _parse_flac_picture(base64.b64decode(value))
+            except (ValueError, struct.error):
+                continue
+            result["picture"] = _better_picture(result.get("picture"), picture)
+
+
+def _parse_flac(f, size: int, result: dict):
+    start = _read_id3v2(f, result)
+    f.seek(start)
+    if f.read(4) != b"fLaC":
+        raise AudioParseError("不是 FLAC 文件")
+    total_samples = 0
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            break
+        is_last, block_type = header[0] & 0x80, header[0] & 0x7f
+        length = int.from_bytes(header[1:4], "big")
+        if block_type == 0:
+            info = f.read(length)
+            packed = int.from_bytes(info[10:18], "big")
+            result["sample_rate"] = packed >> 44
+            total_samples = packed & 0xfffffffff
+        elif block_type == 4:
+            _parse_vorbis_comment(f.read(length), result)
+        elif block_type == 6 and length <= MAX_PICTURE_SIZE + 1024:
+            result["picture"] = _better_picture(result.get("picture"), _parse_flac_picture(f.read(length)))
+        else:
+            f.seek(length, os.SEEK_CUR)
+        if is_last:
+            break
+    if not result.get("sample_rate"):
+        raise AudioParseError("FLAC 文件缺少 STREAMINFO")
+    if total_samples:
+        result["duration"] = total_samples / result["sample_rate"]
+        audio_size = size - f.tell()
+        result["bitrate"] = round(audio_size * 8 / result["duration"] / 1000)
+
+
+# ---- WAV ----
+
+def _parse_wav(f, size: int, result: dict):
+    f.seek(12)
+    byte_rate = data_size = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, length = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(length)
+            _, _, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+            result["sample_rate"] = sample_rate
+        elif chunk_id == b"data":
+            # 流式写入的文件 data 块大小可能为 0 或 0xFFFFFFFF，按文件大小计算
+            data_size = length if 0 < length < size else size - f.tell()
+            f.seek(length, os.SEEK_CUR)
+        elif chunk_id == b"LIST" and length < 1024 * 1024:
+            info = f.read(length)
+            if info[:4] == b"INFO":
+                pos = 4
+                while pos + 8 <= len(info):
+                    sub_id, sub_length = info[pos:pos + 4], struct.unpack("<I", info[pos + 4:pos + 8])[0]
+                    value = _clean(_decode_legacy(info[pos + 8:pos + 8 + sub_length]))
+                    if sub_id == b"INAM":
+                        result["title"] = result.get("title") or value
+                    elif sub_id == b"IART":
+                        result["artist"] = result.get("artist") or value
+                    pos += 8 + sub_length + (sub_length & 1)
+        else:
+            f.seek(length, os.SEEK_CUR)
+        if length & 1:
+            f.seek(1, os.SEEK_CUR)  # 块按偶数字节对齐
+    if not byte_rate:
+        raise AudioParseError("WAV 文件缺少 fmt 块")
+    result["bitrate"] = round(byte_rate * 8 / 1000)
+    if data_size:
+        result["duration"] = data_size / byte_rate
+
+
+# ---- Ogg ----
+
+def _ogg_packets(f, count: int):
+    """从文件开头读取前 count 个数据包（跨页的包会拼接起来）"""
+    packets, current = [], b""
+    f.seek(0)
+    while len(packets) < count:
+        header = f.read(27)
+        if len(header) < 27 or header[:4] != b"OggS":
+            break
+        segments = f.read(header[26])
+        for length in segments:
+            current += f.read(length)
+            if length < 255:
+                packets.append(current)
+                current = b""
+                if len(packets) == count:
+                    break
+        if len(current) > MAX_PICTURE_SIZE * 2:
+            break
+    return packets
+
+
+def _parse_ogg(f, size: int, result: dict):
+    packets = _ogg_packets(f, 2)
+    if not packets:
+        raise AudioParseError("不是 Ogg 文件")
+    ident = packets[0]
+    if ident[:7] == b"\x01vorbis":
+        sample_rate = struct.unpack("<I", ident[12:16])[0]
+        granule_rate, pre_skip, comment_prefix = sample_rate, 0, b"\x03vorbis"
+    elif ident[:8] == b"OpusHead":
+        pre_skip, sample_rate = struct.unpack("<HI", ident[10:16])
+        # Opus 的 granule position 固定按 48kHz 计数
+        granule_rate, comment_prefix = 48000, b"OpusTags"
+        sample_rate = sample_rate or 48000
+    else:
+        raise AudioParseError("不支持的 Ogg 编码")
+    result["sample_rate"] = sample_rate
+
+    if len(packets) > 1 and packets[1].startswith(comment_prefix):
+        try:
+            _parse_vorbis_comment(packets[1][len(comment_prefix):], result)
+        except (IndexError, struct.error):
+            pass
+
+    f.seek(max(0, size - OGG_TAIL_SIZE))
+    tail = f.read()
+    pos = tail.rfind(b"OggS")
+    if pos >= 0 and pos + 14 <= len(tail):
+        granule = struct.unpack("<q", tail[pos + 6:pos + 14])[0]
+        if granule > 0:
+            result["duration"] = max(0, granule - pre_skip) / granule_rate
+            if result["duration"]:
+                result["bitrate"] = round(size * 8 / result["duration"] / 1000)
+
+
+# ---- MP4 / M4A ----
+
+_MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"ilst"}
+
+
+def _mp4_atoms(f, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, kind = struct.unpack(">I4s", header)
+        header_size = 8
+        if length == 1:
+            length = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif length == 0:
+            length = end - pos
+        if length < header_size:
+            return
+        yield kind, pos + header_size, pos + length
+        pos += length
+
+
+def _mp4_data(f, start: int, end: int):
+    """ilst 中条目下的 data 原子：(类型, 值)"""
+    for kind, data_start, data_end in _mp4_atoms(f, start, end):
+        if kind == b"data" and data_end - data_start <= MAX_PICTURE_SIZE + 8:
+            f.seek(data_start)
+            payload = f.read(data_end - data_start)
+            return struct.unpack(">I", payload[:4])[0] & 0xffffff, payload[8:]
+    return None, b""
+
+
+def _walk_mp4(f, start: int, end: int, result: dict, state: dict):
+    for kind, body_start, body_end in _mp4_atoms(f, start, end):
+        if kind in _MP4_CONTAINERS:
+            _walk_mp4(f, body_start, body_end, result, state)
+        elif kind == b"meta":
+            # meta 是 full box，有 4 字节版本和标志
+            _walk_mp4(f, body_start + 4, body_end, result, state)
+        elif kind == b"mvhd":
+            f.seek(body_start)
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", f.read(28)[16:28])
+            else:
+                timescale, duration = struct.unpack(">II", f.read(16)[8:16])
+            if timescale:
+                state["duration"] = duration / timescale
+        elif kind == b"hdlr":
+            f.seek(body_start + 8)
+            state["handler"] = f.read(4)
+        elif kind == b"mdhd":
+            f.seek(body_start)
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack(">IQ", f.read(28)[16:28])
+            else:
+                timescale, duration = struct.unpack(">II", f.read(16)[8:16])
+            state.setdefault("tracks", []).append((timescale, duration))
+        elif kind == b"stsd" and state.get("handler") == b"soun":
+            # 音频 sample entry：8 字节 stsd 头 + 8 字节条目头 + 28 字节字段，采样率为 16.16 定点数
+            f.seek(body_start + 8)
+            entry = f.read(36)
+            if len(entry) == 36:
+                state["sample_rate"] = struct.unpack(">I", entry[32:36])[0] >> 16
+        elif kind in (b"\xa9nam", b"\xa9ART", b"covr"):
+            data_type, value = _mp4_data(f, body_start, body_end)
+            if kind == b"covr":
+                mime = {13: "image/jpeg", 14: "image/png"}.get(data_type, "")
+                result["picture"] = _better_picture(result.get("picture"), _picture(mime, value))
+            elif kind == b"\xa9nam" and not result.get("title"):
+                result["title"] = _clean(value.decode("utf-8", errors="replace"))
+            elif kind == b"\xa9ART" and not result.get("artist"):
+                result["artist"] = _clean(value.decode("utf-8", errors="replace"))
+
+
+def _parse_mp4(f, size: int, result: dict):
+    state = {}
+    _walk_mp4(f, 0, size, result, state)
+    if "duration" not in state:
+        raise AudioParseError("MP4 文件缺少 moov")
+    result["duration"] = state["duration"]
+    result["sample_rate"] = state.get("sample_rate")
+    if not result["sample_rate"] and state.get("tracks"):
+        result["sample_rate"] = state["tracks"][0][0]
+    if result["duration"]:
+        result["bitrate"] = round(size * 8 / result["duration"] / 1000)
+
+
+def analyze_audio(path: str) -> dict:
+    """
+    分析音频文件，返回：
+    {"format", "duration"（秒）, "bitrate"（kbps）, "sample_rate"（Hz）, "file_size"（字节）,
+     "title", "artist", "picture": {"mime", "data", "type"} 或 None}
+    无法识别时抛出 AudioParseError
+    """
+    size = os.path.getsize(path)
+    result = {"duration": None, "bitrate": None, "sample_rate": None, "file_size": size,
+              "title": None, "artist": None, "picture": None}
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if head[:3] == b"ID3":
+            # ID3 标签后面可能是 MP3，也可能是 FLAC
+            f.seek(0)
+            f.seek(10 + _syncsafe(f.read(10)[6:10]))
+            audio_format = "flac" if f.read(4) == b"fLaC" else "mp3"
+        elif head[:4] == b"fLaC":
+            audio_format = "flac"
+        elif head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            audio_format = "wav"
+        elif head[:4] == b"OggS":
+            audio_format = "ogg"
+        elif head[4:8] == b"ftyp":
+            audio_format = "mp4"
+        elif head[:2] and head[0] == 0xff and head[1] & 0xe0 == 0xe0:
+            audio_format = "mp3"
+        else:
+            raise AudioParseError("不支持的音频格式")
+
+        parser = {"mp3": _parse_mp3, "flac": _parse_flac, "wav": _parse_wav, "ogg": _parse_ogg, "mp4": _parse_mp4}
+        try:
+            parser[audio_format](f, size, result)
+        except (IndexError, struct.error, ValueError) as e:
+            raise AudioParseError(f"{audio_format} 文件头解析失败: {e}")
+    result["format"] = audio_format
+    if result["duration"] is not None:
+        result["duration"] = round(result["duration"], 3)
+    return result
+
+
+# ================ Web 进程中的部分 ================
+
+audio_pool = BackgroundProcessPool("音频分析", PROCESS_WORKERS)
+
+
+def save_embedded_cover(picture: dict) -> str:
+    """保存内嵌封面（按内容哈希存储，相同封面只保存一份），返回相对路径"""
+    from myapp.utils.images import schedule_derivatives
+
+    name = default_storage.save(f"cover/embedded{PICTURE_EXTENSIONS[picture['mime']]}", ContentFile(picture["data"]))
+    schedule_derivatives(name)
+    return name
+
+
+def apply_audio_metadata(song_id, source: str, result: dict) -> bool:
+    """
+    把分析结果写入歌曲（歌曲的音频文件已被替换时忽略），返回是否写入
+    用 update() 写入，不触发 Song 的保存信号；封面的引用计数手动增加
+    """
+    from myapp.models import Song
+    from myapp.utils.storage import add_refs
+
+    song = Song.objects.filter(pk=song_id, source=source).only("title", "singer", "cover").first()
+    if song is None:
+        return False
+    values = {field: result[field] for field in METADATA_FIELDS}
+    if not song.title and result["title"]:
+        values["title"] = result["title"][:100]
+    if not song.singer and result["artist"]:
+        values["singer"] = result["artist"][:50]
+    cover = None
+    if not song.cover and result["picture"]:
+        cover = values["cover"] = save_embedded_cover(result["picture"])
+
+    updated = Song.objects.filter(pk=song_id, source=source).update(**values)
+    if updated and cover:
+        add_refs([cover])
+    return bool(updated)
+
+
+def _apply_in_background(song_id, source: str):
+    def callback(result):
+        try:
+            apply_audio_metadata(song_id, source, result)
+        finally:
+            # 在进程池的结果线程中执行，用完关闭该线程的数据库连接
+            if not connection.in_atomic_block:
+                connection.close()
+    return callback
+
+
+def schedule_audio_analysis(song_id, source: str):
+    """提交到进程池分析音频文件（不等待结果）"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, source)
+    except Exception as e:
+        logger.warning(f"音频文件路径不合法: {source}, {e}")
+        return
+    audio_pool.submit(f"{song_id}:{source}", analyze_audio, full_path, callback=_apply_in_background(song_id, source))
+
+
+def _analyze_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.source:
+        return
+    if update_fields is not None and "source" not in update_fields:
+        return
+    # 保存前的字段值由 myapp.utils.storage 的 pre_save 信号读取
+    old_source = getattr(instance, "_old_media_values", {}).get("source")
+    if created or old_source != instance.source:
+        song_id, source = instance.pk, instance.source
+        transaction.on_commit(lambda: schedule_audio_analysis(song_id, source))
+
+
+def connect_audio_signals():
+    from myapp.models import Song
+
+    models.signals.post_save.connect(_analyze_on_save, sender=Song, dispatch_uid="audio_analysis_post_save")
@@ -0,0 +1,189 @@
+# 二级缓存：进程内字典(L1) + Redis(L2)
+# 写操作删除 L2 并通过 Redis pub/sub 广播失效消息，所有 worker 进程收到后立即丢弃本地 L1 副本
+# 每个键在 Redis 中有一个版本号，失效时自增；回填 L2 时版本号与加载前读到的一致才写入，
+# 避免与失效并发执行的加载把失效前的旧值写回 L2
+
+import json
+import os
+import threading
+import time
+
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.models import Advertise, Classification, Language
+from myapp.serializers import AdSerializer, ClassificationSerializer, LanguageSerializer
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+# 缓存键
+CLASSIFICATION_LIST_KEY = "classification:list"
+LANGUAGE_LIST_KEY = "language:list"
+ADVERTISE_LIST_KEY = "advertise:list"
+
+# 版本号未变化时才写入
+_SET_IF_VERSION = """
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+_set_if_version = r.register_script(_SET_IF_VERSION) if r else None
+
+
+class TwoLevelCache:
+    """
+    两级缓存
+    - L1：进程内字典，命中时无网络开销
+    - L2：Redis，多个 worker 共享
+    只有在失效订阅处于连接状态时才使用 L1，订阅断开期间直接读 L2，避免读到过期数据
+    """
+
+    def __init__(self, prefix: str = "refcache:", l1_ttl: int = 300, l2_ttl: int = 3600):
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidate"
+        self.l1_ttl = l1_ttl
+        self.l2_ttl = l2_ttl
+        self._local = {}  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self._generation = 0  # 每次失效自增，防止并发读把旧值写回 L1
+        self._subscribed = threading.Event()
+        self._listener_pid = None
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _version_key(self, key: str) -> str:
+        return f"{self.prefix}version:{key}"
+
+    def get_or_set(self, key: str, loader):
+        """
+        依次查询 L1、L2，都未命中时调用 loader 加载并回填
+        loader 的返回值必须可以 JSON 序列化
+        """
+        if r is None:
+            return loader()
+
+        self._ensure_listener()
+        use_local = self._subscribed.is_set()
+
+        if use_local:
+            entry = self._local.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+        generation = self._generation
+        value = version = None
+        try:
+            raw, version = r.mget(self._redis_key(key), self._version_key(key))
+            if raw is not None:
+                value = json.loads(raw)
+        except RedisError as e:
+            logger.warning(f"二级缓存读取失败: {key}, {e}")
+
+        if value is None:
+            # 序列化一次再解析，保证 L1 和 L2 中存放的是同样的纯 JSON 结构
+            raw = json.dumps(loader(), ensure_ascii=False)
+            value = json.loads(raw)
+            try:
+                _set_if_version(
+                    keys=[self._redis_key(key), self._version_key(key)],
+                    args=[version or "0", raw, self.l2_ttl],
+                )
+            except RedisError as e:
+                logger.warning(f"二级缓存写入失败: {key}, {e}")
+
+        if use_local:
+            with self._lock:
+                if generation == self._generation:
+                    self._local[key] = (time.monotonic() + self.l1_ttl, value)
+
+        return value
+
+    def invalidate(self, *keys: str):
+        """删除缓存并广播失效消息（写操作完成后调用）"""
+        self._drop_local(keys)
+        if r is None:
+            return
+        try:
+            pipe = r.pipeline()
+            for key in keys:
+                pipe.incr(self._version_key(key))
+            pipe.delete(*[self._redis_key(key) for key in keys])
+            pipe.execute()
+            r.publish(self.channel, json.dumps(list(keys)))
+        except RedisError as e:
+            logger.warning(f"二级缓存失效广播失败: {keys}, {e}")
+
+    def _drop_local(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _clear_local(self):
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+
+    def _ensure_listener(self):
+        # 按进程启动订阅线程（gunicorn fork 之后线程不会被继承）
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            self._subscribed.clear()
+            self._local.clear()
+            threading.Thread(target=self._listen, name="cache-invalidate-listener", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # 断线期间可能漏掉失效消息，重新订阅后清空本地缓存
+                self._clear_local()
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._drop_local(json.loads(message["data"]))
+            except Exception as e:
+                logger.warning(f"缓存失效订阅中断，稍后重连: {e}")
+            finally:
+                self._subscribed.clear()
+                self._clear_local()
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(1)
+
+
+# 分类、语言、广告等很少变化的基础数据使用的缓存
+reference_cache = TwoLevelCache()
+
+
+def get_classification_list_data() -> list:
+    return reference_cache.get_or_set(
+        CLASSIFICATION_LIST_KEY,
+        lambda: ClassificationSerializer(Classification.objects.all().order_by("-id"), many=True).data,
+    )
+
+
+def get_language_list_data() -> list:
+    return reference_cache.get_or_set(
+        LANGUAGE_LIST_KEY,
+        lambda: LanguageSerializer(Language.objects.all().order_by("-id"), many=True).data,
+    )
+
+
+def get_advertise_list_data() -> list:
+    return reference_cache.get_or_set(
+        ADVERTISE_LIST_KEY,
+        lambda: AdSerializer(Advertise.objects.all().order_by("-create_time"), many=True).data,
+    )
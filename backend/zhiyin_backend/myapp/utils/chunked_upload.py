@@ -0,0 +1,248 @@
+# 分片上传（断点续传）
+# 1. 初始化：校验类型和大小，在目标目录中创建 .{upload_id}.part 文件，会话信息保存在 Redis 中
+# 2. 上传分片：offset 必须等于已上传的大小，请求体边读边追加写入 .part 文件并计算 SHA-256，
+#    与客户端提供的校验值不一致时截断回原来的位置；网络中断后查询会话拿到 offset 继续上传
+# 3. 完成：大小完整后把 .part 文件移入存储（按内容哈希命名，与普通上传一样自动去重）
+#
+# 会话 upload:session:{id} 超过 UPLOAD_SESSION_TTL 秒没有新分片即过期，
+# 有序集合 upload:sessions 记录各会话的过期时间，初始化新会话时顺带删除已过期会话遗留的 .part 文件
+
+import hashlib
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.utils.common import UPLOAD_TYPES, check_upload_size
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+SESSION_KEY_PREFIX = "upload:session:"
+SESSIONS_KEY = "upload:sessions"
+LOCK_KEY_PREFIX = "upload:lock:"
+# 会话空闲过期时间（秒）
+SESSION_TTL = getattr(settings, "UPLOAD_SESSION_TTL", 24 * 3600)
+# 单个分片的最大大小
+CHUNK_MAX_SIZE = getattr(settings, "UPLOAD_CHUNK_MAX_SIZE", 8 * 1024 * 1024)
+# 分片写入锁超时（秒），防止同一会话的分片并发写入
+LOCK_TIMEOUT = 120
+# 从请求体读取的块大小
+READ_BLOCK_SIZE = 64 * 1024
+
+# 只释放自己持有的锁
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = r.register_script(_RELEASE_LOCK) if r else None
+
+
+class UploadError(Exception):
+    def __init__(self, msg: str, data=None):
+        super().__init__(msg)
+        self.msg = msg
+        self.data = data
+
+
+def _part_path(file_type: str, upload_id: str) -> str:
+    return os.path.join(settings.MEDIA_ROOT, file_type, f".{upload_id}.part")
+
+
+def _session_info(upload_id: str, session: dict) -> dict:
+    return {
+        "uploadId": upload_id,
+        "offset": int(session["offset"]),
+        "size": int(session["size"]),
+        "chunkSize": CHUNK_MAX_SIZE,
+    }
+
+
+def get_session(upload_id: str) -> dict:
+    if r is None:
+        raise UploadError("上传服务暂不可用")
+    session = r.hgetall(f"{SESSION_KEY_PREFIX}{upload_id}")
+    if not session:
+        raise UploadError("上传会话不存在或已过期")
+    return session
+
+
+def _touch(upload_id: str, session: dict, pipe):
+    """刷新会话的过期时间"""
+    pipe.expire(f"{SESSION_KEY_PREFIX}{upload_id}", SESSION_TTL)
+    pipe.zadd(SESSIONS_KEY, {f"{session['type']}:{upload_id}": time.time() + SESSION_TTL})
+
+
+def _delete_session(upload_id: str, session: dict):
+    pipe = r.pipeline()
+    pipe.delete(f"{SESSION_KEY_PREFIX}{upload_id}")
+    pipe.zrem(SESSIONS_KEY, f"{session['type']}:{upload_id}")
+    pipe.execute()
+
+
+class _SessionLock:
+    def __init__(self, upload_id: str):
+        self.key = f"{LOCK_KEY_PREFIX}{upload_id}"
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self):
+        if not r.set(self.key, self.token, nx=True, ex=LOCK_TIMEOUT):
+            raise UploadError("该文件正在上传其他分片，请稍后重试")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _release_lock(keys=[self.key], args=[self.token])
+        except RedisError as e:
+            logger.warning(f"上传锁释放失败: {e}")
+        return False
+
+
+def create_session(file_type: str, filename: str, size: int) -> dict:
+    if r is None:
+        raise UploadError("上传服务暂不可用")
+    if file_type not in UPLOAD_TYPES:
+        raise UploadError("不支持的文件类型")
+    filename = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if not filename or filename.startswith("."):
+        raise UploadError("文件名不合法")
+    if size <= 0:
+        raise UploadError("文件大小不合法")
+    is_valid, error_msg = check_upload_size(file_type, size)
+    if not is_valid:
+        raise UploadError(error_msg)
+
+    cleanup_expired_sessions()
+
+    upload_id = uuid.uuid4().hex
+    part_path = _part_path(file_type, upload_id)
+    os.makedirs(os.path.dirname(part_path), exist_ok=True)
+    open(part_path, "xb").close()
+
+    session = {"type": file_type, "filename": filename, "size": size, "offset": 0}
+    pipe = r.pipeline()
+    pipe.hset(f"{SESSION_KEY_PREFIX}{upload_id}", mapping=session)
+    _touch(upload_id, session, pipe)
+    pipe.execute()
+    return _session_info(upload_id, session)
+
+
+def get_session_info(upload_id: str) -> dict:
+    return _session_info(upload_id, get_session(upload_id))
+
+
+def write_chunk(upload_id: str, offset: int, stream, length: int, checksum: str) -> dict:
+    """
+    把请求体中的一个分片写入 offset 处
+    length 为请求体长度，checksum 为分片的 SHA-256（十六进制）
+    """
+    if length <= 0 or length > CHUNK_MAX_SIZE:
+        raise UploadError(f"分片大小必须在 1 到 {CHUNK_MAX_SIZE} 字节之间")
+    if not checksum:
+        raise UploadError("缺少分片校验值")
+    get_session(upload_id)
+
+    with _SessionLock(upload_id):
+        # 加锁后重新读取会话，加锁前读到的 offset 可能已被刚完成的其他分片更新
+        session = get_session(upload_id)
+        current, size = int(session["offset"]), int(session["size"])
+        if offset != current:
+            raise UploadError("分片位置不正确", data=_session_info(upload_id, session))
+        if offset + length > size:
+            raise UploadError("分片超出文件大小")
+
+        part_path = _part_path(session["type"], upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(part_path, "r+b") as f:
+                # 丢弃上次中断时写入的不完整数据
+                f.seek(offset)
+                f.truncate()
+                while written < length:
+                    block = stream.read(min(READ_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    digest.update(block)
+                    written += len(block)
+                if written != length or digest.hexdigest() != checksum.lower():
+                    f.truncate(offset)
+                    raise UploadError(
+                        "分片数据不完整" if written != length else "分片校验失败",
+                        data=_session_info(upload_id, session),
+                    )
+        except FileNotFoundError:
+            raise UploadError("上传会话不存在或已过期")
+
+        session["offset"] = offset + length
+        pipe = r.pipeline()
+        pipe.hset(f"{SESSION_KEY_PREFIX}{upload_id}", "offset", session["offset"])
+        _touch(upload_id, session, pipe)
+        pipe.execute()
+    return _session_info(upload_id, session)
+
+
+def complete_session(upload_id: str) -> str:
+    """上传完成，返回文件的相对路径（如 source/xxx.mp3）"""
+    get_session(upload_id)
+    with _SessionLock(upload_id):
+        # 加锁后重新读取会话，同时提交的完成请求只有第一个能读到会话
+        session = get_session(upload_id)
+        if int(session["offset"]) != int(session["size"]):
+            raise UploadError("文件尚未上传完整", data=_session_info(upload_id, session))
+
+        part_path = _part_path(session["type"], upload_id)
+        try:
+            name = default_storage.import_file(part_path, os.path.join(session["type"], session["filename"]))
+        except FileNotFoundError:
+            # .part 文件已被清理，会话无法继续
+            _delete_session(upload_id, session)
+            raise UploadError("上传会话不存在或已过期")
+        except OSError as e:
+            logger.error(f"分片上传文件保存失败: {upload_id}, {e}")
+            raise UploadError("文件保存失败，请重新上传")
+        _delete_session(upload_id, session)
+    return name
+
+
+def is_session_active(upload_id: str) -> bool:
+    """会话是否仍然有效（Redis 不可用时按有效处理，不删除可能还在上传的文件）"""
+    if r is None:
+        return True
+    try:
+        return bool(r.exists(f"{SESSION_KEY_PREFIX}{upload_id}"))
+    except RedisError:
+        return True
+
+
+def cleanup_expired_sessions() -> int:
+    """删除已过期会话遗留的 .part 文件，返回删除的数量"""
+    if r is None:
+        return 0
+    try:
+        members = r.zrangebyscore(SESSIONS_KEY, 0, time.time())
+    except RedisError as e:
+        logger.warning(f"过期上传会话查询失败: {e}")
+        return 0
+
+    removed = 0
+    for member in members:
+        file_type, _, upload_id = member.partition(":")
+        if r.exists(f"{SESSION_KEY_PREFIX}{upload_id}"):
+            # 会话在查询之后刚被续期
+            continue
+        if file_type in UPLOAD_TYPES:
+            try:
+                os.unlink(_part_path(file_type, upload_id))
+                removed += 1
+            except FileNotFoundError:
+                pass
+        r.zrem(SESSIONS_KEY, member)
+    return removed
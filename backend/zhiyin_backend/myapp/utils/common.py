@@ -10,13 +10,17 @@ from django.conf import settings
 
 from myapp.cf.user_cf import UserCf
 from myapp.logging.logger import logger
-from myapp.models import Record, Song
+from myapp.logging.tracing import get_tracer, stage
+from myapp.models import LoginLog, Record, Song
 from myapp.serializers import LoginLogSerializer
+from myapp.utils.login_log_writer import login_log_writer
 from typing import List
 from collections import defaultdict
 import re
 from rest_framework.request import Request
 
+tracer = get_tracer("recommend")
+
 
 def md5value(key):
     """
@@ -25,7 +29,6 @@ def md5value(key):
     input_name = hashlib.md5()
     input_name.update(key.encode("utf-8"))
     md5str = (input_name.hexdigest()).lower()
-    print("计算md5:", md5str)
     return md5str
 
 
@@ -56,6 +59,31 @@ def validate_upload_size(request: Request, max_size: int = None) -> tuple[bool,
     return True, None
 
 
+# 上传文件类型（对应 MEDIA_ROOT 下的目录）
+IMAGE_UPLOAD_TYPES = ["advertise", "avatar", "cover", "feedback"]
+UPLOAD_TYPES = IMAGE_UPLOAD_TYPES + ["lyric", "source", "video"]
+
+
+def check_upload_size(file_type: str, size: int) -> tuple[bool, str | None]:
+    """
+    按上传类型检查文件大小：图片、音频和视频类型分别限制，其他类型不限制
+    Returns:
+        tuple: (验证结果, 错误信息)
+    """
+    if file_type in IMAGE_UPLOAD_TYPES:
+        max_size, label = settings.MAX_COVER_SIZE, "图片"
+    elif file_type == "source":
+        max_size, label = settings.MAX_AUDIO_SIZE, "音频"
+    elif file_type == "video":
+        max_size, label = settings.MAX_VIDEO_SIZE, "视频"
+    else:
+        return True, None
+
+    if size > max_size:
+        return False, f"{label}文件不能超过 {max_size // (1024 * 1024)}MB"
+    return True, None
+
+
 def is_valid_email(email: str) -> tuple[bool, str]:
     """
     验证邮箱格式
@@ -166,7 +194,7 @@ def get_monday():
 
 
 def make_login_log(request):
-    """记录用户登录日志"""
+    """记录用户登录日志（校验后交给后台线程批量写入）"""
     try:
         username = request.data.get("username", "").strip()
         if not username:
@@ -181,12 +209,12 @@ def make_login_log(request):
 
         serializer = LoginLogSerializer(data=log_data)
         if serializer.is_valid():
-            serializer.save()
+            login_log_writer.submit(LoginLog(**serializer.validated_data))
         else:
-            logger.error("[登录日志验证失败]", serializer.errors)
+            logger.error(f"[登录日志验证失败] {serializer.errors}")
 
     except Exception as e:
-        logger.error("[登录日志记录异常]", str(e))
+        logger.error(f"[登录日志记录异常] {str(e)}")
 
 
 def dict_fetchall(cursor):  # cursor是执行sql_str后的记录，作入参
@@ -210,52 +238,51 @@ def get_recommend(request) -> List[Song]:
     try:
         current_user_id = request.user.id
     except (ValueError, TypeError):
-        print("无效的user_id参数，使用热门推荐")
+        tracer.debug("无效的user_id参数，使用热门推荐")
         return get_fallback_recommendations()
 
-    print(f"当前用户ID: {current_user_id}")
-
-    # 2. 构建协同过滤数据（确保类型一致）
-    user_data = defaultdict(dict)
-    records = (
-        Record.objects.select_related("song")
-        .values("user_id", "song_id", "score")
-        .order_by("user_id")[:300]
-    )
-    print(f'所有用户-歌曲评分记录 ======> {records}')
-
-    for record in records:
-        try:
-            user_id = record["user_id"]
-            if len(user_data) > 30:
-                break
-            user_data[user_id][record["song_id"]] = record["score"]
-        except (KeyError, ValueError) as e:
-            print(f"跳过无效记录: {record}，错误: {e}")
-    print(f'协同过滤数据 ======> {user_data}')
-    print(f"协同过滤数据构建完成，共{len(user_data)}个用户")
-
-    # 3. 协同过滤推荐
-    recommendations = []
-    if current_user_id in user_data and len(user_data) > 1:
-        try:
-            user_cf = UserCf(data=user_data)
-            recommended_ids = user_cf.recommend(current_user_id, n_neighbors=2)
-            print(f"协同过滤推荐结果: {recommended_ids}")
-
-            if recommended_ids:
-                recommendations = Song.objects.filter(
-                    id__in=recommended_ids, status="0"
-                ).order_by("-plays")[
-                                  :20
-                                  ]  # 限制结果数量
-        except Exception as e:
-            print(f"协同过滤异常: {e}")
-
-    # 4. 回退到热门推荐
-    if not recommendations:
-        print("协同过滤推荐不足，使用热门推荐")
-        recommendations = get_fallback_recommendations()
+    with tracer.span("get_recommend", user_id=current_user_id) as span:
+        # 2. 构建协同过滤数据（确保类型一致）
+        with stage("load"):
+            user_data = defaultdict(dict)
+            records = (
+                Record.objects.select_related("song")
+                .values("user_id", "song_id", "score")
+                .order_by("user_id")[:300]
+            )
+
+            for record in records:
+                try:
+                    user_id = record["user_id"]
+                    if len(user_data) > 30:
+                        break
+                    user_data[user_id][record["song_id"]] = record["score"]
+                except (KeyError, ValueError) as e:
+                    tracer.debug("跳过无效记录: %s，错误: %s", record, e)
+        span.set(users=len(user_data))
+
+        # 3. 协同过滤推荐（相似度计算和物品选择的耗时在 UserCf 中记录）
+        recommendations = []
+        if current_user_id in user_data and len(user_data) > 1:
+            try:
+                user_cf = UserCf(data=user_data)
+                recommended_ids = user_cf.recommend(current_user_id, n_neighbors=2)
+                span.set(candidates=len(recommended_ids))
+
+                if recommended_ids:
+                    with stage("fetch"):
+                        recommendations = list(
+                            Song.objects.filter(id__in=recommended_ids, status="0").order_by("-plays")[:20]
+                        )  # 限制结果数量
+            except Exception as e:
+                logger.warning(f"协同过滤异常: {e}")
+
+        # 4. 回退到热门推荐
+        if not recommendations:
+            span.set(fallback=True)
+            with stage("fallback"):
+                recommendations = get_fallback_recommendations()
+        span.set(count=len(recommendations))
 
     return recommendations
 
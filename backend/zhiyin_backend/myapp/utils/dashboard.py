@@ -0,0 +1,242 @@
+# 仪表盘统计数据
+# 每日增长数据读取 daily_stats 汇总表（最多 7 行），分类统计读取 classification_stats 汇总表，其余总量类统计为全表聚合
+# 完整结果作为快照保存在 Redis 中（带生成时间），由后台线程或 refresh_dashboard 命令定期刷新，
+# 读请求总是直接返回最近一次成功生成的快照；刷新锁保证同一时间只有一个进程重新计算
+
+import datetime
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.models import ClassificationStats, DailyStats, LoginLog
+from myapp.utils.common import dict_fetchall
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+SNAPSHOT_KEY = "dashboard:snapshot"
+REFRESH_LOCK_KEY = "dashboard:refresh_lock"
+# 快照刷新间隔（秒）
+REFRESH_INTERVAL = getattr(settings, "DASHBOARD_REFRESH_INTERVAL", 60)
+# 刷新锁超时（秒），持有锁的进程崩溃后锁自动释放
+REFRESH_LOCK_TIMEOUT = getattr(settings, "DASHBOARD_REFRESH_LOCK_TIMEOUT", 120)
+
+# 只释放自己持有的锁
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = r.register_script(_RELEASE_LOCK) if r else None
+
+
+def get_recent_days(days: int = 7) -> list:
+    """近 days 天的日期（升序，包含今天）"""
+    today = datetime.date.today()
+    return [today - datetime.timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+
+def get_daily_growth(days: int = 7) -> dict:
+    """
+    近 days 天的每日新增用户、歌曲等数据
+    汇总表中缺少的日期按 0 处理
+    """
+    dates = get_recent_days(days)
+    rows = {
+        row.date: row
+        for row in DailyStats.objects.filter(date__gte=dates[0], date__lte=dates[-1])
+    }
+
+    growth = {"user_growth": [], "song_growth": [], "play_growth": [], "comment_growth": [], "login_growth": []}
+    for date in dates:
+        row = rows.get(date)
+        day = date.strftime("%Y-%m-%d")
+        growth["user_growth"].append({"date": day, "count": row.new_users if row else 0})
+        growth["song_growth"].append({"date": day, "count": row.new_songs if row else 0})
+        growth["play_growth"].append({"date": day, "count": row.plays if row else 0})
+        growth["comment_growth"].append({"date": day, "count": row.comments if row else 0})
+        growth["login_growth"].append({"date": day, "count": row.logins if row else 0})
+    return growth
+
+
+def compute_totals() -> dict:
+    """总量统计（全表聚合），只在缓存过期时执行"""
+    with connection.cursor() as cursor:
+        # 音乐总数、总播放次数
+        cursor.execute("SELECT COUNT(*), SUM(plays) FROM song")
+        song_count, total_plays = cursor.fetchone()
+
+        # 用户总数
+        cursor.execute("SELECT COUNT(*) FROM user")
+        user_count = cursor.fetchone()[0]
+
+        # 总评论数
+        cursor.execute("SELECT COUNT(*) FROM comment")
+        comment_count = cursor.fetchone()[0]
+
+        # 热门歌曲排名（前10）
+        cursor.execute("""
+            SELECT title, plays AS count
+            FROM song
+            ORDER BY plays DESC
+            LIMIT 10
+        """)
+        order_rank_data = dict_fetchall(cursor)
+
+    # 分类数量统计（由歌曲写操作维护的汇总表，每个分类一行）
+    classification_rank_data = [
+        {"name": name, "count": count}
+        for name, count in ClassificationStats.objects.filter(song_count__gt=0)
+        .order_by("-song_count")
+        .values_list("classification__name", "song_count")
+    ]
+
+    return {
+        "song_count": song_count,
+        "user_count": user_count,
+        "total_plays": int(total_plays or 0),
+        "comment_count": comment_count,
+        "order_rank_data": order_rank_data,
+        "classification_rank_data": classification_rank_data,
+    }
+
+
+def get_login_region_stats(days: int = 7, top: int = 10) -> list:
+    """近 days 天登录次数最多的地区（登录日志的 location 由 IP 归属地解析得到）"""
+    start = datetime.datetime.combine(get_recent_days(days)[0], datetime.time.min)
+    rows = (
+        LoginLog.objects.filter(log_time__gte=start)
+        .exclude(location__isnull=True)
+        .exclude(location="")
+        .values("location")
+        .annotate(count=Count("id"))
+        .order_by("-count")[:top]
+    )
+    return [{"name": row["location"], "count": row["count"]} for row in rows]
+
+
+def compute_dashboard_data() -> dict:
+    return {
+        **compute_totals(),
+        **get_daily_growth(),
+        "login_region_data": get_login_region_stats(),
+    }
+
+
+def _build_snapshot() -> dict:
+    data = compute_dashboard_data()
+    data["generated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return {"generated_at": time.time(), "data": data}
+
+
+def _read_snapshot():
+    try:
+        raw = r.get(SNAPSHOT_KEY)
+        return json.loads(raw) if raw else None
+    except RedisError as e:
+        logger.warning(f"仪表盘快照读取失败: {e}")
+        return None
+
+
+def _save_snapshot(snapshot: dict):
+    try:
+        # 不设置过期时间，刷新失败时仍可返回上一次的快照
+        r.set(SNAPSHOT_KEY, json.dumps(snapshot, ensure_ascii=False, default=str))
+    except RedisError as e:
+        logger.warning(f"仪表盘快照写入失败: {e}")
+
+
+def refresh_snapshot(force: bool = False):
+    """
+    重新计算并保存快照，返回新快照
+    未获得刷新锁（其他进程正在刷新）时返回 None；force=True 时不检查锁，直接同步计算
+    """
+    if r is None:
+        return _build_snapshot()
+
+    token = uuid.uuid4().hex
+    locked = False
+    if not force:
+        try:
+            locked = bool(r.set(REFRESH_LOCK_KEY, token, nx=True, ex=REFRESH_LOCK_TIMEOUT))
+        except RedisError as e:
+            logger.warning(f"仪表盘刷新锁获取失败: {e}")
+        if not locked:
+            return None
+
+    try:
+        snapshot = _build_snapshot()
+        _save_snapshot(snapshot)
+        return snapshot
+    finally:
+        if locked:
+            try:
+                _release_lock(keys=[REFRESH_LOCK_KEY], args=[token])
+            except RedisError as e:
+                logger.warning(f"仪表盘刷新锁释放失败: {e}")
+
+
+def _is_stale(snapshot) -> bool:
+    return not snapshot or time.time() - snapshot.get("generated_at", 0) >= REFRESH_INTERVAL
+
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+def _ensure_refresher():
+    # 按进程启动刷新线程（gunicorn fork 之后线程不会被继承）
+    global _refresher_pid
+    pid = os.getpid()
+    if _refresher_pid == pid:
+        return
+    with _refresher_lock:
+        if _refresher_pid == pid:
+            return
+        _refresher_pid = pid
+        threading.Thread(target=_refresh_loop, name="dashboard-refresher", daemon=True).start()
+
+
+def _refresh_loop():
+    while True:
+        try:
+            if _is_stale(_read_snapshot()):
+                refresh_snapshot()
+        except Exception as e:
+            logger.error(f"仪表盘快照刷新失败: {str(e)}")
+        finally:
+            close_old_connections()
+        time.sleep(REFRESH_INTERVAL)
+
+
+def get_dashboard_data(fresh: bool = False) -> dict:
+    """
+    读取仪表盘数据
+    - fresh=True：同步重新计算（调试用）
+    - 否则返回最近一次的快照；还没有快照时同步生成一次
+    """
+    if fresh or r is None:
+        return refresh_snapshot(force=True)["data"]
+
+    _ensure_refresher()
+    snapshot = _read_snapshot()
+    if snapshot is None:
+        # 首次访问：由一个进程生成，其他进程短暂等待后读取
+        snapshot = refresh_snapshot()
+        for _ in range(50):
+            if snapshot is not None:
+                break
+            time.sleep(0.1)
+            snapshot = _read_snapshot()
+        if snapshot is None:
+            snapshot = _build_snapshot()
+    return snapshot["data"]
@@ -6,6 +6,8 @@ from django.utils.html import strip_tags
 import smtplib
 from django.conf import settings
 
+from myapp.logging.logger import logger
+
 def send_email(receiver: str, subject: str, content: str, html: bool = False) -> None:
     """
     发送支持 HTML 的邮件（兼容纯文本客户端）
@@ -40,7 +42,7 @@ def send_email(receiver: str, subject: str, content: str, html: bool = False) ->
             smtp.login(settings.EMAIL_USER, settings.EMAIL_AUTH)
             smtp.send_message(msg)
 
-        print("邮件发送成功！")
+        logger.info(f"邮件发送成功: {receiver}")
 
     except smtplib.SMTPAuthenticationError as e:
         raise ValueError(f"邮箱登录失败，请检查用户名/授权码: {e}")
@@ -0,0 +1,331 @@
+# 图片衍生图（封面、头像、广告图）
+# 上传后在进程池中生成固定尺寸的 WebP / JPEG 衍生图（去掉 EXIF 等元数据），并预先计算主色调和 blurhash 占位图，
+# 保存在 MEDIA_ROOT/derived/{原图路径去掉扩展名}/ 下：
+#   thumb.webp thumb.jpg list.webp list.jpg detail.webp detail.jpg meta.json
+# 本功能上线前上传的图片在第一次被访问时生成：列表接口发现没有衍生图时提交到进程池，
+# 直接请求衍生图时同步生成，之后都从磁盘读取
+# 原图损坏或无法识别时在同一目录写入 failed 标记，原图变化之前不再重试
+#
+# 子进程中执行的 render_derivatives 只依赖参数和 Pillow
+
+import json
+import math
+import os
+import threading
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils._os import safe_join
+
+from myapp.utils.process_pool import BackgroundProcessPool
+
+DERIVED_DIR = "derived"
+META_FILE = "meta.json"
+FAILED_FILE = "failed"
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+# 衍生图尺寸：名称 -> 宽度（高度按各类型的宽高比计算）
+VARIANTS = getattr(settings, "IMAGE_VARIANTS", {"thumb": 96, "list": 300, "detail": 800})
+# 生成衍生图的上传类型及其宽高比（衍生图按比例居中裁剪）
+ASPECT_RATIOS = getattr(settings, "IMAGE_ASPECT_RATIOS", {"avatar": 1.0, "cover": 1.0, "advertise": 16 / 9})
+WEBP_QUALITY = getattr(settings, "IMAGE_WEBP_QUALITY", 80)
+JPEG_QUALITY = getattr(settings, "IMAGE_JPEG_QUALITY", 82)
+PROCESS_WORKERS = getattr(settings, "IMAGE_PROCESS_WORKERS", 2)
+
+_BLURHASH_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+# ================ 子进程中执行的部分 ================
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BLURHASH_CHARS[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def blurhash_encode(image, x_components: int = 4, y_components: int = 3) -> str:
+    """blurhash 编码（https://github.com/woltapp/blurhash），image 为缩小后的 RGB 图片"""
+    width, height = image.size
+    linear = [tuple(_srgb_to_linear(c) for c in pixel) for pixel in image.getdata()]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                cy = cos_y[j][y]
+                for x in range(width):
+                    basis = cos_x[i][x] * cy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = norm / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(v) for factor in ac for v in factor)
+        quantised_max = max(0, min(82, int(math.floor(actual_max * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1
+    result += _base83(quantised_max, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+
+    def quantise(v):
+        return max(0, min(18, int(math.floor(_sign_pow(v / max_value, 0.5) * 9 + 9.5))))
+
+    for r, g, b in ac:
+        result += _base83(quantise(r) * 19 * 19 + quantise(g) * 19 + quantise(b), 2)
+    return result
+
+
+def dominant_color(image) -> str:
+    """缩小后做中位切分量化，取像素最多的颜色"""
+    from PIL import Image
+
+    small = image.convert("RGB").resize((64, 64))
+    quantized = small.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    r, g, b = palette[index * 3:index * 3 + 3]
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _tmp_path(path: str) -> str:
+    # 访问衍生图时在请求线程中同步生成，同一进程的多个线程可能同时生成同一张图，临时文件名包含线程 ID
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_atomic(path: str, write):
+    """write(临时文件路径) 写入完成后替换目标文件，失败时删除临时文件"""
+    tmp_path = _tmp_path(path)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _save_atomic(image, path: str, fmt: str, **params):
+    _write_atomic(path, lambda tmp_path: image.save(tmp_path, fmt, **params))
+
+
+def _write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def render_derivatives(source: str, target_dir: str, sizes: dict, webp_quality: int, jpeg_quality: int) -> dict:
+    """
+    生成衍生图和 meta.json，返回 meta
+    sizes: 名称 -> (宽, 高)；原图小于目标尺寸时按比例缩小目标尺寸，不放大
+    原图存在但无法生成时写入失败标记后抛出异常
+    """
+    try:
+        meta = _render_derivatives(source, target_dir, sizes, webp_quality, jpeg_quality)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        _mark_failed(target_dir, e)
+        raise
+    try:
+        os.unlink(os.path.join(target_dir, FAILED_FILE))
+    except OSError:
+        pass
+    return meta
+
+
+def _mark_failed(target_dir: str, error: Exception):
+    try:
+        os.makedirs(target_dir, exist_ok=True)
+        _write_atomic(
+            os.path.join(target_dir, FAILED_FILE),
+            lambda tmp_path: _write_text(tmp_path, f"{type(error).__name__}: {error}"),
+        )
+    except OSError:
+        pass
+
+
+def _write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _render_derivatives(source: str, target_dir: str, sizes: dict, webp_quality: int, jpeg_quality: int) -> dict:
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as opened:
+        # 原图尺寸（draft 会缩小解码尺寸，需要在之前读取；EXIF 方向为旋转 90 度时宽高互换）
+        original_size = opened.size
+        if opened.getexif().get(0x0112) in (5, 6, 7, 8):
+            original_size = original_size[::-1]
+        largest = max(sizes.values())
+        if opened.format == "JPEG":
+            # JPEG 解码时直接缩小，大图的解码时间和内存都大幅减少
+            opened.draft("RGB", (largest[0] * 2, largest[1] * 2))
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    os.makedirs(target_dir, exist_ok=True)
+
+    variants = {}
+    for name, (width, height) in sizes.items():
+        scale = min(1.0, image.width / width, image.height / height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        resized = ImageOps.fit(image, size, method=Image.Resampling.LANCZOS)
+        # 新建的图片不带 EXIF / ICC 等元数据
+        _save_atomic(resized, os.path.join(target_dir, f"{name}.webp"), "WEBP", quality=webp_quality, method=4)
+        if has_alpha:
+            background = Image.new("RGB", resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel("A"))
+            resized = background
+        _save_atomic(resized, os.path.join(target_dir, f"{name}.jpg"), "JPEG", quality=jpeg_quality,
+                     optimize=True, progressive=True)
+        variants[name] = list(size)
+
+    rgb = image.convert("RGB")
+    meta = {
+        "width": original_size[0],
+        "height": original_size[1],
+        "color": dominant_color(rgb),
+        "blurhash": blurhash_encode(rgb.resize((32, 32))),
+        "variants": variants,
+    }
+    _write_atomic(os.path.join(target_dir, META_FILE), lambda tmp_path: _write_json(tmp_path, meta))
+    return meta
+
+
+# ================ Web 进程中的部分 ================
+
+class DerivativeFailedError(Exception):
+    """原图此前生成衍生图失败，原图变化之前不再重试"""
+
+
+def supports_derivatives(path: str) -> bool:
+    if not path:
+        return False
+    file_type = path.replace("\\", "/").split("/", 1)[0]
+    return file_type in ASPECT_RATIOS and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def get_sizes(path: str) -> dict:
+    ratio = ASPECT_RATIOS[path.replace("\\", "/").split("/", 1)[0]]
+    return {name: (width, max(1, round(width / ratio))) for name, width in VARIANTS.items()}
+
+
+def get_derived_dir(path: str) -> str:
+    """衍生图目录（绝对路径），路径越出 MEDIA_ROOT 时抛出 SuspiciousFileOperation"""
+    return safe_join(settings.MEDIA_ROOT, DERIVED_DIR, os.path.splitext(path)[0])
+
+
+def get_variant_relpath(path: str, variant: str, fmt: str) -> str:
+    return f"{DERIVED_DIR}/{os.path.splitext(path)[0]}/{variant}.{fmt}".replace("\\", "/")
+
+
+def _read_meta(path: str):
+    try:
+        with open(os.path.join(get_derived_dir(path), META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_stale(path: str) -> bool:
+    """衍生图不存在或原图在衍生图生成之后被修改"""
+    try:
+        source_mtime = os.path.getmtime(safe_join(settings.MEDIA_ROOT, path))
+        meta_mtime = os.path.getmtime(os.path.join(get_derived_dir(path), META_FILE))
+    except OSError:
+        return True
+    return source_mtime > meta_mtime
+
+
+def has_failed(path: str) -> bool:
+    """上次生成失败，且原图在那之后没有变化"""
+    try:
+        failed_mtime = os.path.getmtime(os.path.join(get_derived_dir(path), FAILED_FILE))
+        source_mtime = os.path.getmtime(safe_join(settings.MEDIA_ROOT, path))
+    except OSError:
+        return False
+    return failed_mtime >= source_mtime
+
+
+def ensure_derivatives(path: str) -> dict:
+    """同步生成（已存在且未过期时直接返回 meta），原图不存在或无法识别时抛出异常"""
+    if not is_stale(path):
+        meta = _read_meta(path)
+        if meta:
+            return meta
+    if has_failed(path):
+        raise DerivativeFailedError(path)
+    return render_derivatives(
+        safe_join(settings.MEDIA_ROOT, path), get_derived_dir(path), get_sizes(path), WEBP_QUALITY, JPEG_QUALITY
+    )
+
+
+derivative_pool = BackgroundProcessPool("衍生图生成", PROCESS_WORKERS)
+
+
+def schedule_derivatives(path: str):
+    """上传后提交到进程池生成衍生图（不等待结果），原图不存在或此前生成失败时跳过"""
+    if not supports_derivatives(path):
+        return
+    try:
+        source, target_dir = safe_join(settings.MEDIA_ROOT, path), get_derived_dir(path)
+    except Exception:
+        return
+    if not os.path.isfile(source) or has_failed(path):
+        return
+    derivative_pool.submit(path, render_derivatives, source, target_dir, get_sizes(path), WEBP_QUALITY, JPEG_QUALITY)
+
+
+def get_image_variants(path: str):
+    """
+    序列化器使用：各尺寸衍生图的地址、主色调和 blurhash
+    衍生图尚未生成时提交后台生成，地址照常返回（请求时同步生成）；原图无法生成衍生图时返回 None
+    """
+    if not supports_derivatives(path):
+        return None
+    meta = _read_meta(path)
+    if meta is None:
+        if has_failed(path):
+            return None
+        schedule_derivatives(path)
+
+    variants = {
+        variant: {fmt: f"/image/{variant}/{fmt}/{quote(path)}" for fmt in FORMATS}
+        for variant in VARIANTS
+    }
+    return {
+        **variants,
+        "color": meta["color"] if meta else None,
+        "blurhash": meta["blurhash"] if meta else None,
+    }
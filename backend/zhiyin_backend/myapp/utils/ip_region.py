@@ -0,0 +1,113 @@
+# 离线 IP 归属地查询
+# 使用 ip2region 的 xdb 数据文件（https://github.com/lionsoul2014/ip2region），
+# 文件通过 mmap 映射到内存，先用前两个字节定位向量索引，再在对应的区段索引内二分查找，不需要网络请求
+#
+# xdb 文件结构：
+# - 256 字节文件头
+# - 256 * 256 个向量索引，每个 8 字节：该前缀对应区段索引的起始位置和结束位置（最后一个区段之后）
+# - 区段索引，每个 14 字节：起始 IP(4) 结束 IP(4) 数据长度(2) 数据位置(4)，均为小端
+# - 地区数据：国家|区域|省份|城市|ISP，未知字段为 0
+
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+from myapp.logging.logger import logger
+
+HEADER_LENGTH = 256
+VECTOR_INDEX_COLS = 256
+VECTOR_INDEX_SIZE = 8
+SEGMENT_INDEX_SIZE = 14
+
+DB_PATH = getattr(settings, "IP_REGION_DB_PATH", os.path.join(settings.BASE_DIR, "data", "ip2region.xdb"))
+CACHE_SIZE = getattr(settings, "IP_REGION_CACHE_SIZE", 10000)
+
+_u32 = struct.Struct("<I")
+_u16 = struct.Struct("<H")
+
+
+class IpRegionSearcher:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def search(self, ip: int):
+        """查询 IPv4（整数形式）对应的地区字符串，找不到时返回 None"""
+        buffer = self._buffer
+        offset = HEADER_LENGTH + ((ip >> 24) & 0xFF) * VECTOR_INDEX_COLS * VECTOR_INDEX_SIZE \
+            + ((ip >> 16) & 0xFF) * VECTOR_INDEX_SIZE
+        start_ptr = _u32.unpack_from(buffer, offset)[0]
+        end_ptr = _u32.unpack_from(buffer, offset + 4)[0]
+        if not start_ptr:
+            return None
+
+        # 跨越 /16 边界的区段在生成数据文件时已被拆分，只需在该前缀自己的区段内查找
+        low, high = 0, (end_ptr - start_ptr) // SEGMENT_INDEX_SIZE - 1
+        while low <= high:
+            middle = (low + high) >> 1
+            pos = start_ptr + middle * SEGMENT_INDEX_SIZE
+            if ip < _u32.unpack_from(buffer, pos)[0]:
+                high = middle - 1
+            elif ip > _u32.unpack_from(buffer, pos + 4)[0]:
+                low = middle + 1
+            else:
+                data_len = _u16.unpack_from(buffer, pos + 8)[0]
+                data_ptr = _u32.unpack_from(buffer, pos + 10)[0]
+                return buffer[data_ptr:data_ptr + data_len].decode("utf-8")
+        return None
+
+    def close(self):
+        self._buffer.close()
+
+
+_searcher = None
+_searcher_lock = threading.Lock()
+_searcher_missing = False
+
+
+def get_searcher():
+    """懒加载数据文件，文件不存在时只提示一次"""
+    global _searcher, _searcher_missing
+    if _searcher is not None or _searcher_missing:
+        return _searcher
+    with _searcher_lock:
+        if _searcher is None and not _searcher_missing:
+            try:
+                _searcher = IpRegionSearcher(DB_PATH)
+            except (OSError, ValueError) as e:
+                _searcher_missing = True
+                logger.warning(f"IP 归属地数据文件不可用，登录地点将不会记录: {DB_PATH}, {e}")
+    return _searcher
+
+
+def format_region(region: str) -> str:
+    """中国|0|广东省|深圳市|电信 -> 中国 广东省 深圳市（去掉未知字段、重复字段和运营商）"""
+    parts = []
+    for part in region.split("|")[:4]:
+        if part and part != "0" and part not in parts:
+            parts.append(part)
+    return " ".join(parts)[:100]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def lookup_location(ip: str):
+    """查询 IP 归属地，无法识别（IPv6、格式错误、数据文件缺失）时返回 None"""
+    if not ip:
+        return None
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    if address.version != 4:
+        return None
+
+    searcher = get_searcher()
+    if searcher is None:
+        return None
+    region = searcher.search(int(address))
+    return format_region(region) if region else None
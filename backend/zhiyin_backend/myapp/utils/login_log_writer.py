@@ -0,0 +1,105 @@
+# 登录日志异步批量写入
+# 登录请求只把日志放入进程内队列，后台线程每攒够 BATCH_SIZE 条或每隔 FLUSH_INTERVAL 毫秒 bulk_create 一次；
+# 队列已满时退回为同步写入，进程退出时写完队列中剩余的日志
+# 登录地点（IP 归属地）在写入线程中解析，不占用登录请求的时间
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from myapp.logging.logger import logger
+from myapp.models import DailyStats, LoginLog
+from myapp.utils.ip_region import lookup_location
+
+QUEUE_SIZE = getattr(settings, "LOGIN_LOG_QUEUE_SIZE", 10000)
+BATCH_SIZE = getattr(settings, "LOGIN_LOG_BATCH_SIZE", 200)
+FLUSH_INTERVAL_MS = getattr(settings, "LOGIN_LOG_FLUSH_INTERVAL_MS", 500)
+
+
+class LoginLogWriter:
+    def __init__(self, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval_ms: int = FLUSH_INTERVAL_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def submit(self, log: LoginLog):
+        """提交一条登录日志（未保存的 LoginLog 实例）"""
+        self._ensure_flusher()
+        try:
+            self._queue.put_nowait(log)
+        except queue.Full:
+            # 队列已满：同步写入，对登录请求形成背压
+            logger.warning("登录日志队列已满，改为同步写入", rate_key="login_log:full")
+            self._write([log])
+
+    def _ensure_flusher(self):
+        # 按进程启动写入线程（gunicorn fork 之后线程不会被继承）
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            threading.Thread(target=self._run, name="login-log-writer", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _next_batch(self) -> list:
+        """阻塞等待第一条日志，之后在 flush_interval 内最多再取 batch_size - 1 条"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(batch)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """同步写入队列中剩余的日志"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    @staticmethod
+    def _write(batch: list):
+        try:
+            for log in batch:
+                if not log.location:
+                    log.location = lookup_location(log.ip)
+            LoginLog.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            for day, count in Counter(log.log_time.date() for log in batch).items():
+                DailyStats.incr(day=day, logins=count)
+        except Exception as e:
+            logger.error(f"[登录日志写入失败] {len(batch)} 条: {str(e)}")
+
+
+login_log_writer = LoginLogWriter()
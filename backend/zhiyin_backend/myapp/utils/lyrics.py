@@ -0,0 +1,194 @@
+# LRC 歌词解析与缓存
+# 歌词文件只解析一次：按毫秒排序的时间轴 times 与对应的歌词 lines（一行多个时间标签时展开为多行），
+# 连同序列化好的 JSON 响应体（原始和 gzip 两份）一起放在进程内的 LRU 缓存中，
+# 缓存键包含文件的修改时间和大小，文件被替换后自动重新解析
+# 歌词的纯文本保存在 Song.lyric_text 中用于搜索，歌曲保存时歌词文件有变化则重新生成
+# MySQL 上 lyric_text 有 ngram 解析器的 FULLTEXT 索引（迁移 0035），按短语 MATCH ... AGAINST 查询，
+# 其他数据库（开发用的 sqlite）退回 LIKE 查询；ngram 会跳过含停用词的词元，MySQL 需关闭 innodb_ft_enable_stopword
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from django.utils._os import safe_join
+
+from myapp.logging.logger import logger
+
+# 进程内缓存的歌词数量
+CACHE_SIZE = getattr(settings, "LYRIC_CACHE_SIZE", 256)
+# 与 MySQL 的 ngram_token_size 一致，更短的关键字无法使用全文索引
+NGRAM_TOKEN_SIZE = getattr(settings, "LYRIC_NGRAM_TOKEN_SIZE", 2)
+
+# [mm:ss] [mm:ss.xx] [mm:ss.xxx] [mm:ss:xx]
+_TIME_TAG = re.compile(r"\[(\d{1,3}):(\d{1,2})(?:[.:](\d{1,3}))?\]")
+# [ti:标题] [ar:歌手] [offset:+500] 等标识标签
+_ID_TAG = re.compile(r"^\[([a-zA-Z]+):([^\]]*)\]$")
+# 逐字歌词（增强格式）中的 <mm:ss.xx> 时间标签
+_WORD_TAG = re.compile(r"<\d{1,3}:\d{1,2}(?:[.:]\d{1,3})?>")
+
+
+def _decode(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return data.decode("utf-8", errors="replace")
+
+
+def parse_lrc(text: str) -> dict:
+    """
+    解析 LRC 文本，返回 {"times": [毫秒, ...], "lines": [歌词, ...], "meta": {"ti": ..., "ar": ...}}
+    times 升序，时间相同的行保持文件中的顺序；[offset:毫秒] 为正时歌词提前显示
+    """
+    entries = []
+    meta = {}
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        pos, stamps = 0, []
+        while True:
+            match = _TIME_TAG.match(line, pos)
+            if not match:
+                break
+            minutes, seconds, fraction = match.groups()
+            fraction = int(fraction.ljust(3, "0")) if fraction else 0
+            stamps.append((int(minutes) * 60 + int(seconds)) * 1000 + fraction)
+            pos = match.end()
+        if stamps:
+            content = _WORD_TAG.sub("", line[pos:]).strip()
+            entries.extend((stamp, content) for stamp in stamps)
+            continue
+        match = _ID_TAG.match(line)
+        if match:
+            meta[match.group(1).lower()] = match.group(2).strip()
+
+    try:
+        offset = int(meta.get("offset", 0))
+    except ValueError:
+        offset = 0
+    entries.sort(key=lambda entry: entry[0])
+    return {
+        "times": [max(0, stamp - offset) for stamp, _ in entries],
+        "lines": [content for _, content in entries],
+        "meta": meta,
+    }
+
+
+def find_line(times: list, at: int) -> int:
+    """at 毫秒时正在显示的行号，第一行之前返回 -1"""
+    return bisect_right(times, at) - 1
+
+
+def lyric_search_text(timeline: dict) -> str:
+    """用于搜索的纯文本：去掉空行和重复行（副歌等多个时间标签展开的行）"""
+    return "\n".join(dict.fromkeys(line for line in timeline["lines"] if line))
+
+
+def filter_lyric_text(queryset, keyword: str):
+    """筛选歌词包含 keyword 的歌曲，MySQL 上使用全文索引，其他数据库用 LIKE 全表扫描"""
+    # 短语查询要求 keyword 切出的 ngram 词元在歌词中依次相邻
+    phrase = keyword.replace('"', " ").strip()
+    if connection.vendor != "mysql" or len(phrase) < NGRAM_TOKEN_SIZE:
+        return queryset.filter(lyric_text__icontains=keyword)
+    column = f"{connection.ops.quote_name(queryset.model._meta.db_table)}.{connection.ops.quote_name('lyric_text')}"
+    return queryset.filter(
+        RawSQL(f"MATCH ({column}) AGAINST (%s IN BOOLEAN MODE)", [f'"{phrase}"'], output_field=models.BooleanField())
+    )
+
+
+class LyricTimeline:
+    """解析好的歌词及其响应体"""
+
+    __slots__ = ("timeline", "etag", "body", "gzip_body")
+
+    def __init__(self, timeline: dict, body: bytes):
+        self.timeline = timeline
+        self.body = body
+        # mtime=0 保证相同内容压缩结果相同
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+
+    @property
+    def times(self):
+        return self.timeline["times"]
+
+    @property
+    def lines(self):
+        return self.timeline["lines"]
+
+
+class _LyricCache:
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+_cache = _LyricCache(CACHE_SIZE)
+
+
+def load_timeline(path: str) -> LyricTimeline:
+    """
+    读取歌词文件的时间轴（带缓存），path 为相对 MEDIA_ROOT 的路径
+    文件不存在时抛出 FileNotFoundError，路径越出 MEDIA_ROOT 时抛出 SuspiciousFileOperation
+    """
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    stat_result = os.stat(full_path)
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    entry = _cache.get(key)
+    if entry is None:
+        with open(full_path, "rb") as f:
+            timeline = parse_lrc(_decode(f.read()))
+        body = json.dumps({"code": 0, "msg": "获取成功", "data": timeline}, ensure_ascii=False,
+                          separators=(",", ":")).encode()
+        entry = LyricTimeline(timeline, body)
+        _cache.set(key, entry)
+    return entry
+
+
+def _index_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and "lyric" not in update_fields):
+        return
+    # 保存前的字段值由 myapp.utils.storage 的 pre_save 信号读取
+    old_lyric = getattr(instance, "_old_media_values", {}).get("lyric")
+    if not created and old_lyric == instance.lyric:
+        return
+    text = None
+    if instance.lyric:
+        try:
+            text = lyric_search_text(load_timeline(instance.lyric).timeline)
+        except Exception as e:
+            logger.warning(f"歌词解析失败: {instance.lyric}, {e}")
+    # update() 不会再次触发保存信号
+    sender.objects.filter(pk=instance.pk).update(lyric_text=text)
+    instance.lyric_text = text
+
+
+def connect_lyric_signals():
+    from myapp.models import Song
+
+    models.signals.post_save.connect(_index_on_save, sender=Song, dispatch_uid="lyric_index_post_save")
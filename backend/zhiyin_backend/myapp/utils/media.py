@@ -0,0 +1,115 @@
+# 上传文件（音频、视频、图片）的读取辅助
+# 支持单个区间的 Range / If-Range 请求、ETag 和 Last-Modified 校验，
+# 可以配置为由前端代理（nginx 的 X-Accel-Redirect、Apache/lighttpd 的 X-Sendfile）直接发送文件
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils._os import safe_join
+from django.utils.http import parse_http_date_safe
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    """
+    只读取文件中 [start, start + length) 区间的包装
+    read() 限制在区间内，逐块读取时不会越界；fileno() 和当前位置保持不变，
+    gunicorn 等服务器可以据此配合 Content-Length 用 os.sendfile 零拷贝发送
+    """
+
+    def __init__(self, file, start: int, length: int):
+        file.seek(start)
+        self._file = file
+        self._remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def resolve_media_path(path: str) -> str:
+    """相对路径转为 MEDIA_ROOT 下的绝对路径，越出 MEDIA_ROOT 时抛出 SuspiciousFileOperation"""
+    return safe_join(settings.MEDIA_ROOT, path)
+
+
+def guess_content_type(path: str) -> str:
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or "application/octet-stream"
+
+
+def make_etag(stat_result) -> str:
+    """强 ETag：修改时间 + 文件大小（文件内容改变时两者至少有一个改变）"""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range(header: str, size: int):
+    """
+    解析 Range 请求头，返回 (start, end)（包含 end）
+    不支持的格式或多个区间返回 None（按完整文件响应），区间无法满足时抛出 RangeNotSatisfiable
+    """
+    match = _RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # bytes=-500：最后 500 字节
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or (last and end < start):
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def if_range_matches(header: str, etag: str, mtime: int) -> bool:
+    """If-Range 为 ETag 时必须完全相同（强比较），为日期时必须与 Last-Modified 一致"""
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith(('"', "W/")):
+        return header == etag
+    return parse_http_date_safe(header) == mtime
+
+
+def sendfile_headers(path: str, full_path: str) -> dict:
+    """
+    代理发送模式下的响应头，未开启时返回空字典
+    x-accel-redirect 需要在 nginx 中把 MEDIA_ACCEL_REDIRECT_PREFIX 配置为指向 MEDIA_ROOT 的 internal location
+    """
+    mode = getattr(settings, "MEDIA_SENDFILE_MODE", None)
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-upload/")
+        return {"X-Accel-Redirect": prefix + quote(path.replace(os.sep, "/").lstrip("/"))}
+    if mode == "x-sendfile":
+        return {"X-Sendfile": full_path}
+    return {}
+
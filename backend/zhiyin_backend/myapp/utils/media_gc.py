@@ -0,0 +1,163 @@
+# 孤立上传文件回收
+# 业务数据（MEDIA_FIELDS 中的字段，以及 HTML_MEDIA_FIELDS 富文本中的 /upload/ 地址）中所有引用的路径读入集合，
+# 用 os.scandir 并行遍历 MEDIA_ROOT 下的各类型目录，
+# 没有被引用且超过保留期的文件即为孤立文件：被替换的封面、头像，被删除歌曲的音频、歌词，没有提交表单的上传等
+#   - 衍生图（derived/<原图路径去掉扩展名>/…）和波形文件（<音频路径去掉扩展名>.waveform-<点数>.dat）跟随原文件
+#   - 分片上传的 .part 文件在会话有效期间保留
+#   - 临时文件（.tmp）不会被引用，超过保留期即回收
+#   - 有 MediaBlob 记录的文件按记录的更新时间计算保留期（重复上传已有内容时文件本身的修改时间不变）
+# 删除前再按候选路径查询一次业务数据（富文本字段无法按路径查询，重新读取一遍），遍历期间被重新引用的文件不会被删除
+
+import datetime
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import Q
+
+from myapp.models import MediaBlob
+from myapp.utils.chunked_upload import is_session_active
+from myapp.utils.common import UPLOAD_TYPES
+from myapp.utils.images import DERIVED_DIR
+from myapp.utils.storage import HTML_MEDIA_FIELDS, MEDIA_FIELDS, TMP_DIR, iter_referenced_paths
+
+# 不被业务数据引用但需要保留的文件（模型和代码中的默认值）
+KEEP_PATHS = getattr(settings, "MEDIA_GC_KEEP_PATHS", ["avatar/default.png", "cover/default.png"])
+BATCH_SIZE = 500
+
+_WAVEFORM_RE = re.compile(r"\.waveform-\d+\.dat$")
+_PART_RE = re.compile(r"^\.([0-9a-f]{32})\.part$")
+
+
+def _normalize(path: str) -> str:
+    return path.replace("\\", "/").lstrip("/")
+
+
+def referenced_paths() -> set:
+    """所有被业务数据引用的路径（逐批读取，不创建模型实例）"""
+    paths = {_normalize(path) for path in KEEP_PATHS}
+    paths.update(_normalize(path) for path in iter_referenced_paths())
+    return paths
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(path)[0]
+
+
+def _is_referenced(path: str, referenced: set, referenced_stems: set) -> bool:
+    if path.endswith(".tmp"):
+        # 包括衍生图、波形写入中断遗留的临时文件
+        return False
+    if path.startswith(f"{DERIVED_DIR}/"):
+        return os.path.dirname(path)[len(DERIVED_DIR) + 1:] in referenced_stems
+    match = _WAVEFORM_RE.search(path)
+    if match:
+        return path[:match.start()] in referenced_stems
+    match = _PART_RE.match(os.path.basename(path))
+    if match:
+        return is_session_active(match.group(1))
+    return path in referenced
+
+
+def _scan(directory: str, prefix: str):
+    """递归遍历目录，返回 (相对路径, stat) 的列表"""
+    entries = []
+    stack = [(directory, prefix)]
+    while stack:
+        current, current_prefix = stack.pop()
+        try:
+            with os.scandir(current) as iterator:
+                for entry in iterator:
+                    relpath = f"{current_prefix}/{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, relpath))
+                    elif entry.is_file(follow_symlinks=False):
+                        entries.append((relpath, entry.stat(follow_symlinks=False)))
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def _exclude_recent_blobs(candidates: dict, cutoff: datetime.datetime):
+    paths = list(candidates)
+    for i in range(0, len(paths), BATCH_SIZE):
+        recent = MediaBlob.objects.filter(path__in=paths[i:i + BATCH_SIZE], update_time__gte=cutoff)
+        for path in recent.values_list("path", flat=True):
+            candidates.pop(path, None)
+
+
+def _exclude_rereferenced(candidates: dict):
+    """遍历期间被重新引用的文件（包括其衍生图、波形文件）"""
+    rereferenced = {_normalize(path) for path in iter_referenced_paths(HTML_MEDIA_FIELDS)}
+    paths = [path for path in candidates if not path.startswith(f"{DERIVED_DIR}/")]
+    for i in range(0, len(paths), BATCH_SIZE):
+        batch = paths[i:i + BATCH_SIZE]
+        for model, fields in MEDIA_FIELDS.items():
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f"{field}__in": batch})
+            for row in model.objects.filter(condition).values_list(*fields):
+                rereferenced.update(_normalize(path) for path in row if path)
+
+    stems = {_stem(path) for path in rereferenced}
+    for path in list(candidates):
+        if _is_referenced(path, rereferenced, stems):
+            candidates.pop(path)
+
+
+def _remove(path: str):
+    try:
+        os.unlink(os.path.join(settings.MEDIA_ROOT, path))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _prune_empty_dirs(paths):
+    """删除文件后清理空目录（不删除各类型的顶层目录）"""
+    dirs = set()
+    for path in paths:
+        parent = os.path.dirname(path)
+        while parent.count("/") >= 1:
+            dirs.add(parent)
+            parent = os.path.dirname(parent)
+    for directory in sorted(dirs, key=lambda d: d.count("/"), reverse=True):
+        try:
+            os.rmdir(os.path.join(settings.MEDIA_ROOT, directory))
+        except OSError:
+            pass
+
+
+def collect_orphaned_media(grace_seconds: int, dry_run: bool = False, workers: int = 4) -> list:
+    """
+    删除没有被引用且超过 grace_seconds 没有修改的文件，返回 [(路径, 大小)]（dry_run 时为将要删除的文件）
+    """
+    cutoff_ts = time.time() - grace_seconds
+    cutoff = datetime.datetime.fromtimestamp(cutoff_ts)
+    referenced = referenced_paths()
+    referenced_stems = {_stem(path) for path in referenced}
+
+    top_dirs = [name for name in UPLOAD_TYPES + [DERIVED_DIR, TMP_DIR]
+                if os.path.isdir(os.path.join(settings.MEDIA_ROOT, name))]
+    candidates = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        scanned = executor.map(lambda name: _scan(os.path.join(settings.MEDIA_ROOT, name), name), top_dirs)
+        for entries in scanned:
+            for path, stat_result in entries:
+                if stat_result.st_mtime < cutoff_ts and not _is_referenced(path, referenced, referenced_stems):
+                    candidates[path] = stat_result.st_size
+
+    _exclude_recent_blobs(candidates, cutoff)
+    _exclude_rereferenced(candidates)
+    if dry_run or not candidates:
+        return sorted(candidates.items())
+
+    paths = sorted(candidates)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        removed = [path for path, ok in zip(paths, executor.map(_remove, paths)) if ok]
+    for i in range(0, len(removed), BATCH_SIZE):
+        MediaBlob.objects.filter(path__in=removed[i:i + BATCH_SIZE]).delete()
+    _prune_empty_dirs(removed)
+    return [(path, candidates[path]) for path in removed]
@@ -0,0 +1,167 @@
+# 请求指标统计（Prometheus 文本格式）
+# 每个进程先在内存中累加，由后台线程定期合并到 Redis 的一个 hash 中，所有 worker 共享；
+# hash 的字段名就是带标签的指标名，例如
+# http_requests_total{view="get_song_list",route="admin/song/getSongList/",method="GET",status="200"}
+
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+METRICS_KEY = "metrics:requests"
+# 合并到 Redis 的间隔（秒）
+FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+# 请求耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 指标说明：名称 -> (类型, 说明)
+METRICS_HELP = {
+    "http_requests_total": ("counter", "请求总数"),
+    "http_request_duration_seconds": ("histogram", "请求耗时"),
+    "http_request_db_queries_total": ("counter", "数据库查询次数"),
+    "http_request_db_seconds_total": ("counter", "数据库查询耗时"),
+    "http_request_redis_commands_total": ("counter", "Redis 命令数"),
+    "http_response_size_bytes_total": ("counter", "响应体大小"),
+}
+
+
+def _escape(value) -> str:
+    """标签值中的反斜杠、双引号和换行需要转义"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def observe_request(self, view: str, route: str, method: str, status: int, duration: float,
+                        db_queries: int = 0, db_seconds: float = 0.0, redis_commands: int = 0,
+                        response_size: int = 0):
+        labels = _labels(view=view, route=route, method=method)
+        updates = [
+            (f"http_requests_total{{{_labels(view=view, route=route, method=method, status=status)}}}", 1),
+            (f"http_request_duration_seconds_sum{{{labels}}}", duration),
+            (f"http_request_duration_seconds_count{{{labels}}}", 1),
+            (f"http_request_db_queries_total{{{labels}}}", db_queries),
+            (f"http_request_db_seconds_total{{{labels}}}", db_seconds),
+            (f"http_request_redis_commands_total{{{labels}}}", redis_commands),
+            (f"http_response_size_bytes_total{{{labels}}}", response_size),
+        ]
+        for bucket in LATENCY_BUCKETS:
+            if duration <= bucket:
+                updates.append((f'http_request_duration_seconds_bucket{{{labels},le="{bucket}"}}', 1))
+        updates.append((f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}', 1))
+
+        self._ensure_flusher()
+        with self._lock:
+            for field, value in updates:
+                self._values[field] += value
+
+    def _drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, defaultdict(float)
+        return values
+
+    def flush(self):
+        """把本进程累加的数据合并到 Redis"""
+        if r is None:
+            return
+        values = self._drain()
+        if not values:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            for field, value in values.items():
+                if value:
+                    pipe.hincrbyfloat(METRICS_KEY, field, value)
+            pipe.execute()
+        except RedisError as e:
+            # 写入失败时放回内存，下次再合并
+            logger.warning(f"请求指标写入失败: {e}")
+            with self._lock:
+                for field, value in values.items():
+                    self._values[field] += value
+
+    def _ensure_flusher(self):
+        # 按进程启动合并线程（gunicorn fork 之后线程不会被继承）
+        pid = os.getpid()
+        if self._flusher_pid == pid or r is None:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            self._values.clear()
+            threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"请求指标合并失败: {e}")
+
+    def collect(self) -> dict:
+        """读取所有进程的汇总数据（包含本进程尚未合并的部分）"""
+        self.flush()
+        if r is None:
+            with self._lock:
+                return dict(self._values)
+        try:
+            return {field: float(value) for field, value in r.hgetall(METRICS_KEY).items()}
+        except RedisError as e:
+            logger.warning(f"请求指标读取失败: {e}")
+            with self._lock:
+                return dict(self._values)
+
+
+registry = MetricsRegistry()
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _sort_key(field: str):
+    # 直方图的桶按 le 数值排序，+Inf 排在最后
+    if ',le="' not in field:
+        return field, 0.0
+    prefix, le = field.rsplit(',le="', 1)
+    le = le.rstrip('"}')
+    return prefix, float("inf") if le == "+Inf" else float(le)
+
+
+def render_prometheus(values: dict) -> str:
+    """按 Prometheus 文本格式输出"""
+    grouped = defaultdict(list)
+    for field, value in values.items():
+        name = field.split("{", 1)[0]
+        for base in METRICS_HELP:
+            if name == base or name.startswith(f"{base}_"):
+                grouped[base].append((field, value))
+                break
+
+    lines = []
+    for base, (metric_type, help_text) in METRICS_HELP.items():
+        if base not in grouped:
+            continue
+        lines.append(f"# HELP {base} {help_text}")
+        lines.append(f"# TYPE {base} {metric_type}")
+        for field, value in sorted(grouped[base], key=lambda item: _sort_key(item[0])):
+            lines.append(f"{field} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,117 @@
+# 用户未读通知计数（Redis 缓存）
+# 每个用户一个 hash：notification / announcement / version
+# - 定向通知投递时递增，标记已读时递减
+# - 管理员新建公告、修改或删除通知时只递增全局版本号，各用户计数在下次读取时从数据库重新计算
+# - 计数设置过期时间，过期后从数据库重新计算，修正累积误差
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.models import SystemNotice, UserNotice
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+COUNTER_KEY_PREFIX = "notice_unread:"
+VERSION_KEY = "notice_unread_version"
+COUNTER_TTL = getattr(settings, "NOTICE_UNREAD_COUNTER_TTL", 600)
+
+# 只在计数已存在时增减，避免凭空创建不完整的计数；结果不小于 0
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+    if value < 0 then
+        redis.call('HSET', KEYS[1], ARGV[1], 0)
+        value = 0
+    end
+    return value
+end
+return nil
+"""
+_incr_if_exists = r.register_script(_INCR_IF_EXISTS) if r else None
+
+
+def _counter_key(user_id) -> str:
+    return f"{COUNTER_KEY_PREFIX}{user_id}"
+
+
+def count_unread_from_db(user) -> dict:
+    return {
+        "notification": UserNotice.objects.filter(
+            user=user,
+            is_read=False,
+            notice__status="0",
+            notice__type="notification",
+        ).count(),
+        "announcement": SystemNotice.unread_announcements(user).count(),
+    }
+
+
+def get_unread_counts(user) -> dict:
+    """获取用户未读计数，缓存失效或版本不一致时从数据库重新计算"""
+    if r is None:
+        return count_unread_from_db(user)
+
+    key = _counter_key(user.id)
+    try:
+        version = r.get(VERSION_KEY) or "0"
+        cached = r.hgetall(key)
+        if cached.get("version") == version:
+            return {
+                "notification": int(cached.get("notification", 0)),
+                "announcement": int(cached.get("announcement", 0)),
+            }
+
+        counts = count_unread_from_db(user)
+        _store_counts(key, counts, version)
+        return counts
+    except RedisError as e:
+        logger.warning(f"未读计数读取失败: {e}")
+        return count_unread_from_db(user)
+
+
+def _store_counts(key: str, counts: dict, version: str):
+    pipe = r.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={**counts, "version": version})
+    pipe.expire(key, COUNTER_TTL)
+    pipe.execute()
+
+
+def incr_unread(user_ids, field: str = "notification", amount: int = 1):
+    """批量增减未读计数（只更新已缓存的用户）"""
+    if r is None or not user_ids:
+        return
+    try:
+        pipe = r.pipeline(transaction=False)
+        for user_id in user_ids:
+            _incr_if_exists(keys=[_counter_key(user_id)], args=[field, amount], client=pipe)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"未读计数更新失败: {e}")
+
+
+def decr_unread(user_id, field: str):
+    incr_unread([user_id], field, -1)
+
+
+def reset_unread(user):
+    """全部已读后计数清零"""
+    if r is None:
+        return
+    try:
+        version = r.get(VERSION_KEY) or "0"
+        _store_counts(_counter_key(user.id), {"notification": 0, "announcement": 0}, version)
+    except RedisError as e:
+        logger.warning(f"未读计数清零失败: {e}")
+
+
+def bump_unread_version():
+    """使所有用户的未读计数在下次读取时重新计算"""
+    if r is None:
+        return
+    try:
+        r.incr(VERSION_KEY)
+    except RedisError as e:
+        logger.warning(f"未读计数版本更新失败: {e}")
@@ -0,0 +1,75 @@
+# 定向通知的后台投递
+# 接收用户按批写入 UserNotice，进度记录在 SystemNotice 上，进程崩溃后可由 deliver_notices 命令恢复
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from myapp.logging.logger import logger
+from myapp.models import SystemNotice
+from myapp.utils.notice_counter import incr_unread
+from myapp.utils.notice_push import publish_notice
+
+CHUNK_SIZE = getattr(settings, "NOTICE_DELIVERY_CHUNK_SIZE", 1000)
+STALE_SECONDS = getattr(settings, "NOTICE_DELIVERY_STALE_SECONDS", 300)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="notice-delivery")
+
+
+def start_notice_delivery(notice: SystemNotice, user_ids: list):
+    """
+    保存接收用户并提交后台投递任务，立即返回
+    任务 ID 即通知 ID
+    """
+    notice.set_recipients(user_ids)
+    # 事务提交后再投递，避免后台线程读不到通知
+    transaction.on_commit(lambda: _executor.submit(run_notice_delivery, notice.pk))
+    return str(notice.pk)
+
+
+def run_notice_delivery(notice_id) -> bool:
+    """执行（或继续执行）一条通知的投递，返回是否抢占到任务"""
+    close_old_connections()
+    try:
+        notice = SystemNotice.objects.filter(pk=notice_id).first()
+        if not notice or not notice.claim_delivery(STALE_SECONDS):
+            return False
+
+        def on_chunk(user_ids):
+            incr_unread(user_ids)
+            publish_notice(notice, user_ids)
+
+        notice.deliver(CHUNK_SIZE, on_chunk=on_chunk)
+        logger.info(f"通知投递完成: {notice_id}, 共 {notice.recipient_count} 个接收用户")
+        return True
+    except Exception as e:
+        logger.error(f"通知投递失败: {notice_id}, {str(e)}")
+        SystemNotice.objects.filter(pk=notice_id).update(delivery_status="failed")
+        return True
+    finally:
+        close_old_connections()
+
+
+def get_unfinished_deliveries():
+    """待投递、失败或执行进程已崩溃（心跳超时）的投递任务"""
+    stale_before = timezone.now() - timedelta(seconds=STALE_SECONDS)
+    return SystemNotice.objects.filter(
+        Q(delivery_status__in=["pending", "failed"])
+        | Q(delivery_status="running", delivery_heartbeat__lt=stale_before)
+        | Q(delivery_status="running", delivery_heartbeat__isnull=True)
+    ).values_list("id", flat=True)
+
+
+def get_delivery_progress(notice: SystemNotice) -> dict:
+    total = notice.recipient_count
+    return {
+        "job_id": str(notice.pk),
+        "status": notice.delivery_status,
+        "delivered": notice.delivered_count,
+        "total": total,
+        "percent": round(notice.delivered_count * 100 / total, 2) if total else 100.0,
+    }
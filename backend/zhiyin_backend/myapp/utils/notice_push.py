@@ -0,0 +1,124 @@
+# 通知实时推送（Redis pub/sub + Server-Sent Events）
+# 发布端（同步）：通知投递或公告发布时向用户频道 / 广播频道发布消息
+# 订阅端（异步）：每个 ASGI worker 进程只持有一个 pub/sub 连接，按需订阅当前在线用户的频道，
+#               再分发给本进程内的各个 SSE 连接
+
+import asyncio
+import json
+import weakref
+from collections import defaultdict
+
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.serializers import SystemNoticeSerializer
+from myapp.utils.redis import get_redis_client, get_async_redis_client
+
+r = get_redis_client()
+
+CHANNEL_PREFIX = "notice_push:"
+BROADCAST_CHANNEL = f"{CHANNEL_PREFIX}broadcast"
+
+
+def user_channel(user_id) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def publish_notice(notice, user_ids=None):
+    """
+    发布通知消息
+    全局公告发布到广播频道，定向通知发布到各接收用户的频道
+    """
+    if r is None:
+        return
+
+    payload = json.dumps(
+        {"type": notice.type, "notice": SystemNoticeSerializer(notice).data},
+        ensure_ascii=False,
+    )
+    try:
+        if notice.is_global:
+            r.publish(BROADCAST_CHANNEL, payload)
+            return
+
+        pipe = r.pipeline(transaction=False)
+        for user_id in user_ids or []:
+            pipe.publish(user_channel(user_id), payload)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"通知推送发布失败: {notice.pk}, {e}")
+
+
+class NoticeHub:
+    """
+    单个事件循环内的订阅中心
+    同一用户的多个连接共享一个频道订阅，最后一个连接断开时取消订阅
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(self):
+        self.redis = get_async_redis_client()
+        self._pubsub = self.redis.pubsub()
+        self._queues = defaultdict(set)  # channel -> {asyncio.Queue}
+        self._lock = asyncio.Lock()
+        self._reader = None
+
+    async def subscribe(self, user_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        async with self._lock:
+            if self._reader is None:
+                # 先订阅广播频道建立连接，再启动读取任务
+                await self._pubsub.subscribe(BROADCAST_CHANNEL)
+                self._reader = asyncio.create_task(self._read_loop())
+            channel = user_channel(user_id)
+            if not self._queues[channel]:
+                await self._pubsub.subscribe(channel)
+            self._queues[channel].add(queue)
+            self._queues[BROADCAST_CHANNEL].add(queue)
+        return queue
+
+    async def unsubscribe(self, user_id, queue: asyncio.Queue):
+        async with self._lock:
+            channel = user_channel(user_id)
+            self._queues[channel].discard(queue)
+            self._queues[BROADCAST_CHANNEL].discard(queue)
+            if not self._queues[channel]:
+                del self._queues[channel]
+                try:
+                    await self._pubsub.unsubscribe(channel)
+                except RedisError as e:
+                    logger.warning(f"取消订阅失败: {channel}, {e}")
+
+    async def _read_loop(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=5.0
+                )
+                if message is None:
+                    continue
+                for queue in list(self._queues.get(message["channel"], ())):
+                    try:
+                        queue.put_nowait(message["data"])
+                    except asyncio.QueueFull:
+                        # 客户端消费过慢时丢弃消息，客户端可通过未读接口补齐
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 连接断开后 redis-py 会在重连时自动恢复已有订阅
+                logger.warning(f"通知推送订阅中断，稍后重试: {e}")
+                await asyncio.sleep(1)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_notice_hub() -> NoticeHub:
+    """每个事件循环一个订阅中心（异步 Redis 连接不能跨事件循环使用）"""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = NoticeHub()
+    return hub
@@ -40,3 +40,33 @@ def paginate_and_respond(queryset, request, serializer_class, context=None, msg=
 
     except Exception as e:
         return error(msg=f"分页异常：{str(e)}")
+
+
+def paginate_data_and_respond(data: list, request, msg="获取成功"):
+    """对已经序列化好的列表（如缓存数据）分页，返回结构与 paginate_and_respond 一致"""
+    try:
+        page = request.query_params.get("page")
+        page_size = request.query_params.get("pageSize")
+
+        if page or page_size:
+            paginator = CustomPagination()
+            page_data = paginator.paginate_queryset(data, request)
+            if page_data is None:
+                return error(msg="分页失败")
+
+            return success(data={
+                "list": page_data,
+                "total": paginator.page.paginator.count,
+                "page": paginator.page.number,
+                "pageSize": paginator.get_page_size(request)
+            }, msg=msg)
+        else:
+            return success(data={
+                "list": data,
+                "total": len(data),
+                "page": None,
+                "pageSize": None,
+            }, msg=msg)
+
+    except Exception as e:
+        return error(msg=f"分页异常：{str(e)}")
@@ -0,0 +1,65 @@
+# 后台进程池（图片衍生图、音频分析等 CPU 密集的上传后处理）
+# 每个 Web 进程一个进程池，fork 出的新 Web 进程第一次提交时重新创建；
+# 子进程使用 spawn 方式启动，不复制 Web 进程中的线程和连接，提交的函数只能依赖参数（不能访问数据库）
+# 同一个 key 同时只提交一次；子进程异常退出导致进程池不可用时丢弃，下次提交时重建
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from myapp.logging.logger import logger
+
+
+class BackgroundProcessPool:
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            self._pending = set()
+            self._pid = pid
+        return self._executor
+
+    def submit(self, key: str, fn, *args, callback=None) -> bool:
+        """
+        提交任务（不等待结果），已在执行中或提交失败时返回 False
+        callback(result) 在任务成功后于 Web 进程的后台线程中调用
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except Exception as e:
+                self._pid = None
+                logger.warning(f"{self.name}任务提交失败: {key}, {e}", rate_key=f"pool:{self.name}")
+                return False
+            self._pending.add(key)
+        future.add_done_callback(lambda f: self._done(key, f, callback))
+        return True
+
+    def _done(self, key: str, future, callback):
+        error = future.exception()
+        with self._lock:
+            self._pending.discard(key)
+            if isinstance(error, BrokenProcessPool):
+                self._pid = None
+        if error is not None:
+            logger.warning(f"{self.name}失败: {key}, {error}", exc_info=False, rate_key=f"pool:{self.name}:failed")
+            return
+        if callback is not None:
+            try:
+                callback(future.result())
+            except Exception as e:
+                logger.error(f"{self.name}结果处理失败: {key}, {e}")
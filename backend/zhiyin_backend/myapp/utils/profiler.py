@@ -0,0 +1,228 @@
+# 按需请求性能分析
+# 管理员请求时带上 X-Profile: 1 请求头或 ?__profile=1 参数，该请求会在采样分析器下执行：
+# 后台线程定时抓取请求线程的调用栈，同时记录执行的 SQL，结果保存在 Redis 中，可导出为 speedscope JSON 或 HTML 火焰图
+
+import html
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+PROFILE_LIST_KEY = "profile:list"
+PROFILE_KEY_PREFIX = "profile:"
+# 采样间隔（秒）
+SAMPLE_INTERVAL = getattr(settings, "PROFILER_SAMPLE_INTERVAL", 0.005)
+# 最多保留的分析结果数量
+MAX_PROFILES = getattr(settings, "PROFILER_MAX_PROFILES", 50)
+# 分析结果保存时间（秒）
+PROFILE_TTL = getattr(settings, "PROFILER_TTL", 7 * 24 * 3600)
+# 每个请求最多记录的 SQL 条数
+MAX_QUERIES = 500
+
+
+def is_profile_requested(request) -> bool:
+    return request.headers.get("X-Profile") == "1" or request.GET.get("__profile") == "1"
+
+
+class StackSampler:
+    """
+    纯 Python 采样分析器
+    在独立线程中按固定间隔读取目标线程的调用栈，统计每条调用栈出现的次数
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = defaultdict(int)  # (frame, ...) -> 次数，frame 为 (函数名, 文件, 行号)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()  # 根调用在前
+                self.stacks[tuple(stack)] += 1
+
+
+class QueryLogger:
+    """通过 connection.execute_wrapper 记录 SQL 及耗时"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    "sql": sql,
+                    "params": repr(params)[:500],
+                    "ms": round((time.perf_counter() - start) * 1000, 3),
+                })
+
+
+def save_profile(request, user, response, duration: float, sampler: StackSampler, queries: list) -> str:
+    """保存分析结果，返回 ID"""
+    profile_id = uuid.uuid4().hex
+    match = getattr(request, "resolver_match", None)
+    meta = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.get_full_path(),
+        "view": match.url_name if match else None,
+        "status": response.status_code,
+        "user": user.username if user else None,
+        "durationMs": round(duration * 1000, 2),
+        "queryCount": len(queries),
+        "queryMs": round(sum(query["ms"] for query in queries), 2),
+        "sampleCount": sum(sampler.stacks.values()),
+        "createTime": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    body = {
+        "meta": meta,
+        "interval": sampler.interval,
+        "stacks": [{"frames": list(stack), "count": count} for stack, count in sampler.stacks.items()],
+        "queries": queries,
+    }
+
+    if r is None:
+        logger.warning("Redis 不可用，性能分析结果未保存")
+        return profile_id
+    try:
+        pipe = r.pipeline()
+        pipe.set(f"{PROFILE_KEY_PREFIX}{profile_id}", json.dumps(body, ensure_ascii=False), ex=PROFILE_TTL)
+        pipe.lpush(PROFILE_LIST_KEY, json.dumps(meta, ensure_ascii=False))
+        pipe.ltrim(PROFILE_LIST_KEY, 0, MAX_PROFILES - 1)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"性能分析结果保存失败: {e}")
+    return profile_id
+
+
+def get_profile_list() -> list:
+    if r is None:
+        return []
+    return [json.loads(item) for item in r.lrange(PROFILE_LIST_KEY, 0, -1)]
+
+
+def get_profile(profile_id: str):
+    if r is None:
+        return None
+    raw = r.get(f"{PROFILE_KEY_PREFIX}{profile_id}")
+    return json.loads(raw) if raw else None
+
+
+def to_speedscope(profile: dict) -> dict:
+    """转换为 speedscope 文件格式（sampled 类型）"""
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    interval_ms = profile["interval"] * 1000
+
+    for stack in profile["stacks"]:
+        indexes = []
+        for name, file, line in stack["frames"]:
+            key = (name, file, line)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({"name": name, "file": file, "line": line})
+            indexes.append(frame_index[key])
+        samples.append(indexes)
+        weights.append(stack["count"] * interval_ms)
+
+    meta = profile["meta"]
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{meta['method']} {meta['path']}",
+        "exporter": "zhiyin-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{meta['method']} {meta['path']} ({meta['durationMs']} ms)",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def _build_tree(stacks: list) -> dict:
+    root = {"name": "all", "count": 0, "children": {}}
+    for stack in stacks:
+        node = root
+        node["count"] += stack["count"]
+        for name, file, line in stack["frames"]:
+            key = f"{name} ({file}:{line})"
+            node = node["children"].setdefault(key, {"name": key, "count": 0, "children": {}})
+            node["count"] += stack["count"]
+    return root
+
+
+def _render_node(node: dict, total: int) -> str:
+    percent = node["count"] * 100 / total if total else 0
+    label = html.escape(node["name"])
+    children = "".join(
+        _render_node(child, node["count"])
+        for child in sorted(node["children"].values(), key=lambda item: -item["count"])
+    )
+    return (
+        f'<div class="node" style="width:{percent:.3f}%">'
+        f'<div class="frame" title="{label} {node["count"]} samples">{label}</div>'
+        f'<div class="children">{children}</div></div>'
+    )
+
+
+def to_flamegraph_html(profile: dict) -> str:
+    """生成自包含的 HTML 火焰图（冰柱图，根调用在上）及 SQL 列表"""
+    meta = profile["meta"]
+    root = _build_tree(profile["stacks"])
+    rows = "".join(
+        f"<tr><td>{query['ms']}</td><td><code>{html.escape(query['sql'])}</code></td></tr>"
+        for query in profile["queries"]
+    )
+    title = html.escape(f"{meta['method']} {meta['path']}")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font: 12px monospace; margin: 16px; }}
+.node {{ display: inline-block; vertical-align: top; box-sizing: border-box; }}
+.frame {{ background: #f4a460; border: 1px solid #fff; overflow: hidden; white-space: nowrap; height: 18px; }}
+.frame:hover {{ background: #ff7f50; }}
+.children {{ display: flex; }}
+table {{ border-collapse: collapse; margin-top: 24px; }}
+td {{ border: 1px solid #ddd; padding: 2px 6px; vertical-align: top; }}
+</style></head><body>
+<h3>{title}</h3>
+<p>耗时 {meta['durationMs']} ms，采样 {meta['sampleCount']} 次，SQL {meta['queryCount']} 条（{meta['queryMs']} ms）</p>
+<div style="width:100%">{_render_node(root, root["count"])}</div>
+<table><tr><th>ms</th><th>SQL</th></tr>{rows}</table>
+</body></html>
+"""
@@ -1,7 +1,49 @@
+import contextvars
+
 import redis
+import redis.asyncio as aioredis
 from django.conf import settings
+from redis.client import Pipeline
 from redis.exceptions import ConnectionError, TimeoutError
 
+# 当前请求的 Redis 命令计数（由请求指标中间件开启），值为单元素列表以便在线程间共享
+_command_counter = contextvars.ContextVar("redis_command_counter", default=None)
+
+
+def start_command_count():
+    """开始统计当前上下文中执行的 Redis 命令数，返回用于结束统计的 token"""
+    return _command_counter.set([0])
+
+
+def stop_command_count(token) -> int:
+    counter = _command_counter.get()
+    _command_counter.reset(token)
+    return counter[0] if counter else 0
+
+
+def _count_commands(n: int = 1):
+    counter = _command_counter.get()
+    if counter is not None:
+        counter[0] += n
+
+
+class CountingPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        _count_commands(len(self.command_stack))
+        return super().execute(raise_on_error)
+
+
+class CountingRedis(redis.Redis):
+    """记录命令数的 Redis 客户端，未开启统计时没有额外开销"""
+
+    def execute_command(self, *args, **options):
+        _count_commands()
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return CountingPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
 class RedisClient:
     _instance = None  # 单例实例
     _pool = None      # 连接池
@@ -20,7 +62,7 @@ class RedisClient:
                 )
 
                 # 使用连接池创建 Redis 实例
-                cls._instance = redis.Redis(connection_pool=cls._pool)
+                cls._instance = CountingRedis(connection_pool=cls._pool)
 
                 # 测试连接
                 cls._instance.ping()
@@ -39,3 +81,16 @@ class RedisClient:
 def get_redis_client():
     return RedisClient()
 
+
+def get_async_redis_client():
+    """
+    异步 Redis 客户端（用于 ASGI 下的异步视图）
+    异步连接池与事件循环绑定，调用方需按事件循环分别创建
+    """
+    return aioredis.Redis(
+        host=getattr(settings, 'REDIS_HOST', 'localhost'),
+        port=getattr(settings, 'REDIS_PORT', 6379),
+        password=getattr(settings, 'REDIS_PASSWORD', None),
+        db=getattr(settings, 'REDIS_DB', 0),
+        decode_responses=True,
+    )
@@ -0,0 +1,141 @@
+# 过期数据清理
+# 按表配置保留天数（settings.DATA_RETENTION_DAYS），超期数据分批直接 DELETE：
+# - 每批按时间列索引取出一批主键，再用 _raw_delete 删除，不加载模型、不触发信号，每批一个短事务
+# - 这几张表没有被其他表外键引用，不需要级联处理
+# - 全局公告的已读记录（水位线之后单独标记的公告）不按时间清理，否则公告会重新变为未读（见 SystemNotice.unread_announcements）
+#   有条件（RETENTION_FILTERS）的表也不会 DROP PARTITION
+# - MySQL 中如果表已按月做了 RANGE 分区，先 DROP PARTITION 整块删除，再分批删除边界分区中的剩余数据
+#
+# 分区需要由 DBA 预先建立，分区列必须包含在主键中，例如：
+#   ALTER TABLE login_log DROP PRIMARY KEY, ADD PRIMARY KEY (id, log_time);
+#   ALTER TABLE login_log PARTITION BY RANGE COLUMNS(log_time) (
+#       PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+#       ...
+#       PARTITION pmax VALUES LESS THAN (MAXVALUE));
+
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+
+from myapp.logging.logger import logger
+from myapp.models import BrowseHistory, LoginLog, UserNotice
+
+# 表名 -> (模型, 时间列)
+RETENTION_TABLES = {
+    "login_log": (LoginLog, "log_time"),
+    "browse_history": (BrowseHistory, "browse_time"),
+    "user_notice": (UserNotice, "receive_time"),
+}
+# 表名 -> 可以清理的数据的条件
+RETENTION_FILTERS = {
+    "user_notice": Q(notice__is_global=False),
+}
+
+RETENTION_DAYS = getattr(settings, "DATA_RETENTION_DAYS", {})
+CHUNK_SIZE = getattr(settings, "RETENTION_CHUNK_SIZE", 5000)
+SLEEP_MS = getattr(settings, "RETENTION_SLEEP_MS", 100)
+
+
+def get_cutoff(table: str):
+    days = RETENTION_DAYS.get(table)
+    if not days:
+        return None
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+    return today - datetime.timedelta(days=days)
+
+
+def raw_delete(queryset) -> int:
+    """不加载数据、不触发信号直接删除，返回删除条数（只用于没有被外键引用的表）"""
+    return queryset._raw_delete(queryset.db)
+
+
+def truncate_table(model):
+    """清空整张表（MySQL 下为 TRUNCATE）"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sql_flush(no_style(), [table], reset_sequences=True):
+            cursor.execute(sql)
+
+
+def purge_in_chunks(model, time_field: str, cutoff, chunk_size: int = CHUNK_SIZE,
+                    sleep_ms: int = SLEEP_MS, max_seconds: float = None, dry_run: bool = False,
+                    condition: Q = None) -> int:
+    """
+    分批删除 time_field 早于 cutoff 的数据，每批之间休眠 sleep_ms 毫秒，降低对线上的影响
+    max_seconds 限制总执行时间，超时后停止（下次继续）；condition 为额外的清理条件
+    """
+    queryset = model.objects.filter(**{f"{time_field}__lt": cutoff})
+    if condition is not None:
+        queryset = queryset.filter(condition)
+    if dry_run:
+        return queryset.count()
+
+    deleted = 0
+    started = time.monotonic()
+    while True:
+        ids = list(queryset.order_by(time_field).values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            deleted += raw_delete(model.objects.filter(pk__in=ids))
+
+        if len(ids) < chunk_size:
+            break
+        if max_seconds and time.monotonic() - started >= max_seconds:
+            logger.info(f"{model._meta.db_table} 清理达到时间上限，已删除 {deleted} 条，剩余数据下次继续")
+            break
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000)
+    return deleted
+
+
+def _partition_upper_bound(description: str, expression: str):
+    """分区上界转为 datetime，不支持的分区方式返回 None"""
+    if not description or description == "MAXVALUE":
+        return None
+    value = description.strip("'")
+    try:
+        if "to_days" in (expression or "").lower():
+            # TO_DAYS('0001-01-01') = 366
+            return datetime.datetime.fromordinal(int(value) - 365)
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def get_expired_partitions(table: str, cutoff) -> list:
+    """MySQL 中上界不晚于 cutoff 的 RANGE 分区（整个分区的数据都已过期）"""
+    if connection.vendor != "mysql":
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME, PARTITION_METHOD, PARTITION_EXPRESSION, PARTITION_DESCRIPTION
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """,
+            [table],
+        )
+        rows = cursor.fetchall()
+
+    expired = []
+    for name, method, expression, description in rows:
+        if not method or not method.startswith("RANGE"):
+            return []
+        upper = _partition_upper_bound(description, expression)
+        if upper is not None and upper <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def drop_partitions(table: str, partitions: list):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} DROP PARTITION {', '.join(quote(name) for name in partitions)}"
+        )
@@ -0,0 +1,175 @@
+# 慢查询记录
+# 每个数据库连接创建时挂上 execute wrapper，耗时超过阈值的 SQL 按规范化后的指纹聚合到 Redis：
+# - slowquery:index        有序集合，指纹 -> 累计耗时（毫秒）
+# - slowquery:fp:{指纹}    hash，次数、累计 / 最大耗时、示例 SQL 和参数、发起的视图、EXPLAIN 结果
+# 按比例抽样对 SELECT 执行 EXPLAIN，用于发现缺失的索引
+
+import contextvars
+import hashlib
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from myapp.logging.logger import logger
+from myapp.utils.redis import get_redis_client
+
+r = get_redis_client()
+
+INDEX_KEY = "slowquery:index"
+FINGERPRINT_KEY_PREFIX = "slowquery:fp:"
+# 慢查询阈值（毫秒）
+THRESHOLD_MS = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 200)
+# 执行 EXPLAIN 的抽样比例（指纹第一次出现时总会执行）
+EXPLAIN_RATE = getattr(settings, "SLOW_QUERY_EXPLAIN_RATE", 0.1)
+
+# 当前请求的视图名称，由请求指标中间件设置
+current_view = contextvars.ContextVar("slow_query_view", default=None)
+
+_local = threading.local()  # 防止 EXPLAIN 本身再次进入 wrapper
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """去掉字面量和 IN 列表长度差异，得到同一类查询的统一形式"""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.md5(normalize_sql(sql).encode()).hexdigest()[:16]
+
+
+def _explain(connection, sql, params) -> str:
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(" | ".join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN 失败: {e}"
+    finally:
+        _local.explaining = False
+
+
+def record_slow_query(sql: str, params, duration_ms: float, explain: str = None):
+    if r is None:
+        return
+    fp = fingerprint(sql)
+    key = f"{FINGERPRINT_KEY_PREFIX}{fp}"
+    try:
+        pipe = r.pipeline(transaction=False)
+        pipe.zincrby(INDEX_KEY, duration_ms, fp)
+        pipe.hincrby(key, "count", 1)
+        pipe.hincrbyfloat(key, "total_ms", duration_ms)
+        pipe.hsetnx(key, "sql", normalize_sql(sql))
+        pipe.hset(key, mapping={
+            "last_sql": sql[:2000],
+            "last_params": repr(params)[:1000],
+            "last_view": current_view.get() or "",
+            "last_ms": round(duration_ms, 2),
+            "last_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        if explain is not None:
+            pipe.hset(key, "explain", explain)
+        pipe.execute()
+        # 最大耗时单独比较更新
+        if float(r.hget(key, "max_ms") or 0) < duration_ms:
+            r.hset(key, "max_ms", round(duration_ms, 2))
+    except RedisError as e:
+        logger.warning(f"慢查询记录失败: {e}", rate_key="slow_query:record")
+
+
+def _should_explain(sql: str) -> bool:
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return False
+    if random.random() < EXPLAIN_RATE:
+        return True
+    try:
+        return not r.hexists(f"{FINGERPRINT_KEY_PREFIX}{fingerprint(sql)}", "explain")
+    except RedisError:
+        return False
+
+
+class SlowQueryWrapper:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "explaining", False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= THRESHOLD_MS:
+            try:
+                explain = None
+                if not many and r is not None and _should_explain(sql):
+                    explain = _explain(self.connection, sql, params)
+                logger.warning(f"慢查询 {duration_ms:.1f} ms [{current_view.get()}]: {sql[:500]}", rate_key="slow_query")
+                record_slow_query(sql, params, duration_ms, explain)
+            except Exception as e:
+                logger.warning(f"慢查询处理失败: {e}", rate_key="slow_query:record")
+        return result
+
+
+def install_slow_query_wrapper(sender, connection, **kwargs):
+    """connection_created 信号处理：给新建的数据库连接挂上慢查询 wrapper"""
+    if not any(isinstance(wrapper, SlowQueryWrapper) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, SlowQueryWrapper(connection))
+
+
+def get_slow_query_report(top: int = 20, order: str = "total") -> list:
+    """
+    慢查询报告
+    order: total（累计耗时）、count（次数）、max（最大耗时）
+    """
+    if r is None:
+        return []
+    fingerprints = r.zrevrange(INDEX_KEY, 0, -1 if order != "total" else top - 1)
+    pipe = r.pipeline(transaction=False)
+    for fp in fingerprints:
+        pipe.hgetall(f"{FINGERPRINT_KEY_PREFIX}{fp}")
+
+    report = []
+    for fp, data in zip(fingerprints, pipe.execute()):
+        if not data:
+            continue
+        count = int(data.get("count", 0))
+        total_ms = float(data.get("total_ms", 0))
+        report.append({
+            "fingerprint": fp,
+            "sql": data.get("sql"),
+            "count": count,
+            "totalMs": round(total_ms, 2),
+            "avgMs": round(total_ms / count, 2) if count else 0,
+            "maxMs": float(data.get("max_ms", 0)),
+            "lastSql": data.get("last_sql"),
+            "lastParams": data.get("last_params"),
+            "lastView": data.get("last_view"),
+            "lastTime": data.get("last_time"),
+            "explain": data.get("explain"),
+        })
+
+    sort_key = {"count": "count", "max": "maxMs"}.get(order, "totalMs")
+    report.sort(key=lambda item: item[sort_key], reverse=True)
+    return report[:top]
+
+
+def reset_slow_queries():
+    if r is None:
+        return
+    fingerprints = r.zrange(INDEX_KEY, 0, -1)
+    r.delete(INDEX_KEY, *[f"{FINGERPRINT_KEY_PREFIX}{fp}" for fp in fingerprints])
+
@@ -0,0 +1,266 @@
+# 内容寻址的上传文件存储
+# 上传文件边写入临时文件边计算 SHA-256，保存为 {类型目录}/{哈希前两位}/{哈希}{扩展名}：
+# 相同内容的文件只保存一份，重复上传直接返回已有路径，不再产生 xxx_vS1kTw3.jpg 这样的副本
+#
+# 每个文件对应一条 MediaBlob 记录，MEDIA_FIELDS 中的字段保存 / 删除时通过信号维护引用次数；
+# 富文本编辑器上传的图片、视频只以 {MEDIA_URL}路径 的地址出现在 HTML_MEDIA_FIELDS 的 HTML 中，
+# 从 HTML 中提取地址同样计入引用（同一字段中重复出现的地址只计一次）；
+# 引用数为 0 且超过保留期（刚上传、还没有被表单提交引用的文件）的文件由 collect_unreferenced_blobs 回收，
+# 回收与上传相同内容在 MediaBlob 记录行上互斥：上传等待回收提交后重新创建记录并写入文件
+# 旧的按原文件名保存的文件没有 MediaBlob 记录，引用计数不涉及这些文件
+# 注意：QuerySet.update() 修改这些字段不会触发信号，需要用 save() 或手动调用 add_refs / release_refs
+
+import datetime
+import hashlib
+import html
+import os
+import re
+import tempfile
+from collections import Counter
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+
+from myapp.logging.logger import logger
+from myapp.models import Advertise, Comment, Feedback, MediaBlob, Playlist, Song, SystemNotice, User
+
+# 临时文件目录（在 MEDIA_ROOT 下，保证与目标文件在同一文件系统，可以原子改名）
+TMP_DIR = ".tmp"
+READ_BLOCK_SIZE = 1024 * 1024
+
+# 保存上传文件路径的字段
+MEDIA_FIELDS = {
+    User: ["avatar"],
+    Song: ["cover", "source", "lyric"],
+    Playlist: ["cover"],
+    Advertise: ["cover"],
+    Feedback: ["feedback_screenshot"],
+}
+# 富文本（HTML）字段，其中的上传文件地址计入引用
+HTML_MEDIA_FIELDS = {
+    User: ["description"],
+    Song: ["description"],
+    Playlist: ["description"],
+    Comment: ["content"],
+    SystemNotice: ["content"],
+    Feedback: ["content", "reply"],
+}
+# 模型 -> 所有引用上传文件的字段
+REFERENCE_FIELDS = {
+    model: MEDIA_FIELDS.get(model, []) + HTML_MEDIA_FIELDS.get(model, [])
+    for model in {**MEDIA_FIELDS, **HTML_MEDIA_FIELDS}
+}
+
+# 富文本中的上传文件地址：http://host/upload/cover/ab/abcd.jpg、/upload/video/xx.mp4 等
+_MEDIA_URL_RE = re.compile(re.escape(settings.MEDIA_URL) + r"([^\"'\s<>?#()]+)")
+
+
+def extract_media_paths(text: str) -> list:
+    """HTML 中引用的上传文件路径（去重，相对 MEDIA_ROOT）"""
+    if not text or settings.MEDIA_URL not in text:
+        return []
+    paths = dict.fromkeys(unquote(html.unescape(match.group(1))) for match in _MEDIA_URL_RE.finditer(text))
+    return [path for path in paths if path and ".." not in path.split("/")]
+
+
+def media_paths(model, values: dict) -> list:
+    """一行数据（字段 -> 值）引用的上传文件路径，可能重复（多个字段引用同一文件）"""
+    html_fields = HTML_MEDIA_FIELDS.get(model, ())
+    paths = []
+    for field, value in values.items():
+        if not value:
+            continue
+        if field in html_fields:
+            paths.extend(extract_media_paths(value))
+        else:
+            paths.append(value)
+    return paths
+
+
+def iter_referenced_paths(models_fields: dict = None, chunk_size: int = 2000):
+    """逐批读取业务数据中引用的所有路径（不创建模型实例）"""
+    for model, fields in (models_fields or REFERENCE_FIELDS).items():
+        for row in model.objects.values(*fields).iterator(chunk_size=chunk_size):
+            yield from media_paths(model, row)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """按内容哈希保存文件的存储后端（settings.STORAGES["default"]）"""
+
+    def get_available_name(self, name, max_length=None):
+        # 文件名由内容决定，路径相同即内容相同，不需要改名
+        return name
+
+    def _save(self, name, content):
+        tmp_path = self._tmp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            return self._store(tmp_path, name, digest.hexdigest(), size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def import_file(self, path: str, name: str) -> str:
+        """把本地文件（如分片上传拼好的文件）移入存储，name 只用于确定类型目录和扩展名"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+                digest.update(chunk)
+        try:
+            return self._store(path, name, digest.hexdigest(), os.path.getsize(path))
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _tmp_path(self) -> str:
+        tmp_dir = os.path.join(self.location, TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        os.close(fd)
+        return tmp_path
+
+    def _store(self, tmp_path: str, name: str, sha256: str, size: int) -> str:
+        directory = os.path.dirname(name).replace("\\", "/")
+        ext = os.path.splitext(name)[1].lower()
+        name = f"{directory}/{sha256[:2]}/{sha256}{ext}".lstrip("/")
+        full_path = self.path(name)
+
+        with transaction.atomic():
+            # 先锁定记录再检查文件：记录正在被回收时 UPDATE 等待回收事务提交，之后记录已不存在，重新创建并写入文件
+            self._lock_blob(name, sha256, size)
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                # 并发上传相同内容时后写入的覆盖先写入的，内容相同
+                os.replace(tmp_path, full_path)
+        return name
+
+    @staticmethod
+    def _lock_blob(name: str, sha256: str, size: int):
+        """更新（没有时创建）文件记录，持有行锁直到事务提交"""
+        # 重新开始计算保留期，避免刚上传的文件被回收
+        now = datetime.datetime.now()
+        if MediaBlob.objects.filter(path=name).update(update_time=now):
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(path=name, sha256=sha256, size=size)
+        except IntegrityError:
+            # 并发上传相同内容，记录已由另一个请求创建
+            MediaBlob.objects.filter(path=name).update(update_time=now)
+
+
+def _paths(instance, fields) -> list:
+    return media_paths(type(instance), {field: getattr(instance, field) for field in fields})
+
+
+def _change_refs(paths, delta: int):
+    counts = Counter(paths)
+    for count in set(counts.values()):
+        group = [path for path, n in counts.items() if n == count]
+        MediaBlob.objects.filter(path__in=group).update(
+            ref_count=F("ref_count") + delta * count, update_time=datetime.datetime.now()
+        )
+
+
+def add_refs(paths):
+    if paths:
+        _change_refs(paths, 1)
+
+
+def release_refs(paths):
+    if paths:
+        _change_refs(paths, -1)
+
+
+def _remember_old_paths(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields = REFERENCE_FIELDS[sender]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    instance._media_fields = fields
+    instance._old_media_paths = []
+    # 保存前的字段值，其他 post_save 信号（如音频分析）据此判断文件是否变化
+    instance._old_media_values = {}
+    if raw or not fields or instance._state.adding:
+        return
+    old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    if old:
+        instance._old_media_values = old
+        instance._old_media_paths = media_paths(sender, old)
+
+
+def _update_refs_on_save(sender, instance, raw=False, **kwargs):
+    fields = getattr(instance, "_media_fields", None)
+    if raw or not fields:
+        return
+    old = Counter(instance._old_media_paths)
+    new = Counter(_paths(instance, fields))
+    try:
+        add_refs(list((new - old).elements()))
+        release_refs(list((old - new).elements()))
+    except Exception as e:
+        logger.error(f"媒体文件引用计数更新失败: {sender.__name__} {instance.pk}, {str(e)}")
+
+
+def _release_refs_on_delete(sender, instance, **kwargs):
+    try:
+        release_refs(_paths(instance, REFERENCE_FIELDS[sender]))
+    except Exception as e:
+        logger.error(f"媒体文件引用计数更新失败: {sender.__name__} {instance.pk}, {str(e)}")
+
+
+def connect_media_ref_signals():
+    for model in REFERENCE_FIELDS:
+        uid = f"media_refs_{model.__name__}"
+        models.signals.pre_save.connect(_remember_old_paths, sender=model, dispatch_uid=f"{uid}_pre_save")
+        models.signals.post_save.connect(_update_refs_on_save, sender=model, dispatch_uid=f"{uid}_post_save")
+        models.signals.post_delete.connect(_release_refs_on_delete, sender=model, dispatch_uid=f"{uid}_delete")
+
+
+def recount_refs() -> int:
+    """按业务数据重新统计所有文件的引用次数（信号之外的批量修改之后使用），返回有变化的文件数"""
+    counts = Counter(iter_referenced_paths())
+
+    changed = 0
+    for blob in MediaBlob.objects.only("pk", "path", "ref_count").iterator():
+        ref_count = counts.get(blob.path, 0)
+        if blob.ref_count != ref_count:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=ref_count)
+            changed += 1
+    return changed
+
+
+def collect_unreferenced_blobs(grace_seconds: int, dry_run: bool = False) -> list:
+    """
+    删除引用数为 0 且超过 grace_seconds 没有变化的文件，返回删除（dry_run 时为将要删除）的路径
+    逐条带条件删除记录，记录删除成功后在同一事务中删除文件，回收期间被重新引用的文件不会被删除；
+    删除的记录行锁持有到文件删除之后，同时上传相同内容的请求等待提交后重新写入文件
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=grace_seconds)
+    candidates = MediaBlob.objects.filter(ref_count__lte=0, update_time__lt=cutoff).values_list("pk", "path")
+    if dry_run:
+        return [path for _, path in candidates]
+
+    storage = ContentAddressedStorage()
+    removed = []
+    for pk, path in list(candidates):
+        with transaction.atomic():
+            deleted, _ = MediaBlob.objects.filter(pk=pk, ref_count__lte=0, update_time__lt=cutoff).delete()
+            if not deleted:
+                continue
+            try:
+                storage.delete(path)
+            except OSError as e:
+                logger.warning(f"媒体文件删除失败: {path}, {e}")
+        removed.append(path)
+    return removed
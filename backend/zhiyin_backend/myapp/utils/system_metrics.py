@@ -0,0 +1,105 @@
+# 系统指标采样
+# 每个进程一个后台线程定期采样 CPU、内存、负载、进程内存占用以及数据库 / Redis 连接数，
+# 结果保存在环形缓冲区中，sys_info 接口直接读取最新采样，不会阻塞请求线程
+
+import os
+import threading
+import time
+from collections import deque
+
+import psutil
+from django.conf import settings
+
+from myapp.logging.logger import logger
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = getattr(settings, "SYS_METRICS_INTERVAL", 5)
+# 保留的历史采样数量
+HISTORY_SIZE = getattr(settings, "SYS_METRICS_HISTORY_SIZE", 60)
+
+
+def _service_ports() -> tuple:
+    """数据库和 Redis 的端口，用于按远端端口统计本进程的连接数"""
+    db_port = str(settings.DATABASES["default"].get("PORT") or "3306")
+    redis_port = str(getattr(settings, "REDIS_PORT", 6379))
+    return int(db_port), int(redis_port)
+
+
+class SystemSampler:
+    """
+    系统指标采样器
+    cpu_percent 使用非阻塞模式（interval=None），返回值为距上次采样期间的平均使用率
+    """
+
+    def __init__(self, interval: int = SAMPLE_INTERVAL, history_size: int = HISTORY_SIZE):
+        self.interval = interval
+        self._history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._process = None
+
+    def _sample(self) -> dict:
+        memory = psutil.virtual_memory()
+        db_port, redis_port = _service_ports()
+        db_connections = redis_connections = 0
+        try:
+            for conn in self._process.net_connections(kind="tcp"):
+                if not conn.raddr or conn.status != psutil.CONN_ESTABLISHED:
+                    continue
+                if conn.raddr.port == db_port:
+                    db_connections += 1
+                elif conn.raddr.port == redis_port:
+                    redis_connections += 1
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            pass
+
+        load = os.getloadavg() if hasattr(os, "getloadavg") else (0.0, 0.0, 0.0)
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "cpuLoad": round(psutil.cpu_percent(interval=None), 2),
+            "memoryUsedGB": round(memory.used / 1024 ** 3, 2),
+            "memoryPercent": round(memory.percent, 2),
+            "loadAvg": [round(value, 2) for value in load],
+            "processRssMB": round(self._process.memory_info().rss / 1024 ** 2, 2),
+            "dbConnections": db_connections,
+            "redisConnections": redis_connections,
+        }
+
+    def _run(self):
+        time.sleep(1)  # 首次采样前留出 CPU 使用率的统计区间
+        while True:
+            try:
+                sample = self._sample()
+                with self._lock:
+                    self._history.append(sample)
+            except Exception as e:
+                logger.warning(f"系统指标采样失败: {e}")
+            time.sleep(self.interval)
+
+    def ensure_started(self):
+        # 按进程启动采样线程（gunicorn fork 之后线程不会被继承）
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._process = psutil.Process(pid)
+            self._history.clear()
+            # 第一次调用只建立基准，返回值无意义
+            psutil.cpu_percent(interval=None)
+            threading.Thread(target=self._run, name="sys-metrics-sampler", daemon=True).start()
+
+    def latest(self):
+        self.ensure_started()
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+    def history(self) -> list:
+        self.ensure_started()
+        with self._lock:
+            return list(self._history)
+
+
+sampler = SystemSampler()
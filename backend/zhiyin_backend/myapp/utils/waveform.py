@@ -0,0 +1,266 @@
+# 波形峰值预计算（播放器的波形图 / 进度条预览）
+# 每首歌的音频只解码一次：先按固定间隔（每秒 FINE_PEAKS_PER_SECOND 个）计算最小 / 最大值，
+# 再合并为 WAVEFORM_RESOLUTIONS 中每种点数的峰值数组，保存在音频文件旁边：
+#   source/ab/abcd....mp3 -> source/ab/abcd....waveform-800.dat
+# 文件为 audiowaveform 的 .dat 格式（版本 1，8 位），peaks.js 等可以直接使用：
+#   int32 版本号 1 | uint32 标志 1（8 位）| int32 采样率 | int32 每个点的采样数 | uint32 点数 | int8 (min, max) * 点数
+#
+# WAV（PCM）文件直接读取，其他格式需要本地的 ffmpeg（WAVEFORM_FFMPEG）解码为单声道 16 位 PCM；
+# 安装了 NumPy 时用 NumPy 计算，没有时用 array 模块逐段计算（较慢，结果相同）
+# compute_waveforms 在进程池的子进程中执行，只依赖参数
+
+import os
+import shutil
+import struct
+import subprocess
+import wave
+from array import array
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils._os import safe_join
+
+from myapp.utils.process_pool import BackgroundProcessPool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 生成的点数（分辨率）
+RESOLUTIONS = getattr(settings, "WAVEFORM_RESOLUTIONS", [200, 800, 3200])
+# 解码器，非 WAV 文件需要
+FFMPEG = getattr(settings, "WAVEFORM_FFMPEG", "ffmpeg")
+PROCESS_WORKERS = getattr(settings, "WAVEFORM_PROCESS_WORKERS", 1)
+# ffmpeg 解码时的采样率（画波形不需要高采样率）
+DECODE_SAMPLE_RATE = 8000
+# 第一遍计算的峰值密度
+FINE_PEAKS_PER_SECOND = 100
+READ_FRAMES = 64 * 1024
+AUDIO_EXTENSIONS = {".mp3", ".flac", ".wav", ".ogg", ".opus", ".m4a", ".aac"}
+
+
+class WaveformError(Exception):
+    pass
+
+
+# ================ 子进程中执行的部分 ================
+
+def _to_int16(data: bytes, sample_width: int):
+    """PCM 字节转为 16 位有符号采样"""
+    if np is not None:
+        if sample_width == 1:
+            return (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+        if sample_width == 2:
+            return np.frombuffer(data, dtype="<i2")
+        if sample_width == 3:
+            raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            return raw[:, 2].view(np.int8).astype(np.int16) << 8 | raw[:, 1]
+        return (np.frombuffer(data, dtype="<i4") >> 16).astype(np.int16)
+    if sample_width == 2:
+        samples = array("h", data)
+        if array("h", [1]).tobytes()[0] != 1:
+            samples.byteswap()
+        return samples
+    if sample_width == 1:
+        return array("h", ((b - 128) << 8 for b in data))
+    # 24 / 32 位取最高的两个字节
+    return array("h", (int.from_bytes(data[i + sample_width - 2:i + sample_width], "little", signed=True)
+                       for i in range(0, len(data), sample_width)))
+
+
+class _PeakAccumulator:
+    """按每 step 个采样一组计算最小 / 最大值，跨数据块保留不足一组的部分"""
+
+    def __init__(self, step: int):
+        self.step = step
+        self.mins = []
+        self.maxs = []
+        self._rest = None
+        self.samples = 0
+
+    def add(self, samples):
+        self.samples += len(samples)
+        if self._rest is not None and len(self._rest):
+            samples = np.concatenate((self._rest, samples)) if np is not None else self._rest + samples
+        full = len(samples) // self.step * self.step
+        if np is not None:
+            groups = samples[:full].reshape(-1, self.step)
+            if len(groups):
+                self.mins.extend(groups.min(axis=1).tolist())
+                self.maxs.extend(groups.max(axis=1).tolist())
+        else:
+            for i in range(0, full, self.step):
+                group = samples[i:i + self.step]
+                self.mins.append(min(group))
+                self.maxs.append(max(group))
+        self._rest = samples[full:]
+
+    def finish(self):
+        if self._rest is not None and len(self._rest):
+            self.mins.append(int(min(self._rest)))
+            self.maxs.append(int(max(self._rest)))
+            self._rest = None
+        return self.mins, self.maxs
+
+
+def _decode_wav(path: str):
+    """返回 (采样率, 声道数, 16 位采样块的迭代器)，不是 PCM WAV 时返回 None"""
+    try:
+        reader = wave.open(path, "rb")
+    except (wave.Error, EOFError):
+        return None
+    sample_rate, channels, width = reader.getframerate(), reader.getnchannels(), reader.getsampwidth()
+
+    def blocks():
+        with reader:
+            while True:
+                data = reader.readframes(READ_FRAMES)
+                if not data:
+                    break
+                yield _to_int16(data, width)
+
+    return sample_rate, channels, blocks()
+
+
+def _decode_ffmpeg(path: str):
+    binary = shutil.which(FFMPEG)
+    if binary is None:
+        raise WaveformError("没有可用的解码器（需要 ffmpeg）")
+    process = subprocess.Popen(
+        [binary, "-v", "error", "-nostdin", "-i", path, "-vn", "-ac", "1", "-ar", str(DECODE_SAMPLE_RATE),
+         "-f", "s16le", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+
+    def blocks():
+        try:
+            while True:
+                data = process.stdout.read(READ_FRAMES * 2)
+                if not data:
+                    break
+                if len(data) % 2:
+                    data += process.stdout.read(1)
+                yield _to_int16(data, 2)
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors="replace")
+            process.stderr.close()
+            if process.wait() != 0:
+                raise WaveformError(f"ffmpeg 解码失败: {stderr.strip()[:200]}")
+
+    return DECODE_SAMPLE_RATE, 1, blocks()
+
+
+def _downsample(mins: list, maxs: list, points: int):
+    """把细粒度峰值合并为 points 个点（不足时原样返回）"""
+    count = len(mins)
+    if count <= points:
+        return mins, maxs
+    out_mins, out_maxs = [], []
+    for i in range(points):
+        start, end = i * count // points, (i + 1) * count // points
+        out_mins.append(min(mins[start:end]))
+        out_maxs.append(max(maxs[start:end]))
+    return out_mins, out_maxs
+
+
+def _encode_dat(mins: list, maxs: list, sample_rate: int, samples_per_point: int) -> bytes:
+    data = array("b")
+    for low, high in zip(mins, maxs):
+        data.append(low >> 8)
+        data.append(high >> 8)
+    header = struct.pack("<iIiiI", 1, 1, sample_rate, max(1, samples_per_point), len(mins))
+    return header + data.tobytes()
+
+
+def compute_waveforms(source: str, targets: dict) -> dict:
+    """
+    解码 source，生成各分辨率的 .dat 文件
+    targets: 点数 -> 目标文件路径；返回 点数 -> 实际点数
+    """
+    decoded = _decode_wav(source) or _decode_ffmpeg(source)
+    sample_rate, channels, blocks = decoded
+    # 多声道的采样交错排列，整组一起取最值即各声道的最值
+    step = max(1, sample_rate // FINE_PEAKS_PER_SECOND) * channels
+    accumulator = _PeakAccumulator(step)
+    for block in blocks:
+        accumulator.add(block)
+    mins, maxs = accumulator.finish()
+    if not mins:
+        raise WaveformError("音频没有采样数据")
+
+    frames = accumulator.samples // channels
+    result = {}
+    for points, target in targets.items():
+        point_mins, point_maxs = _downsample(mins, maxs, points)
+        content = _encode_dat(point_mins, point_maxs, sample_rate, frames // len(point_mins))
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, target)
+        result[points] = len(point_mins)
+    return result
+
+
+# ================ Web 进程中的部分 ================
+
+waveform_pool = BackgroundProcessPool("波形生成", PROCESS_WORKERS)
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG) is not None
+
+
+def supports_waveform(path: str) -> bool:
+    if not path or not path.replace("\\", "/").startswith("source/"):
+        return False
+    ext = os.path.splitext(path)[1].lower()
+    # 没有 ffmpeg 时只能处理 WAV，不提交注定失败的任务
+    return ext == ".wav" or (ext in AUDIO_EXTENSIONS and ffmpeg_available())
+
+
+def get_waveform_relpath(path: str, points: int) -> str:
+    return f"{os.path.splitext(path)[0]}.waveform-{points}.dat".replace("\\", "/")
+
+
+def get_targets(path: str) -> dict:
+    """点数 -> 绝对路径，路径越出 MEDIA_ROOT 时抛出 SuspiciousFileOperation"""
+    return {points: safe_join(settings.MEDIA_ROOT, get_waveform_relpath(path, points)) for points in RESOLUTIONS}
+
+
+def is_generated(path: str) -> bool:
+    """最后写入的分辨率存在且不早于音频文件"""
+    try:
+        source_mtime = os.path.getmtime(safe_join(settings.MEDIA_ROOT, path))
+        return os.path.getmtime(get_targets(path)[RESOLUTIONS[-1]]) >= source_mtime
+    except OSError:
+        return False
+
+
+def schedule_waveform(path: str):
+    """提交到进程池生成波形（不等待结果）"""
+    if not supports_waveform(path):
+        return
+    try:
+        source, targets = safe_join(settings.MEDIA_ROOT, path), get_targets(path)
+    except Exception:
+        return
+    if not os.path.isfile(source):
+        return
+    waveform_pool.submit(path, compute_waveforms, source, targets)
+
+
+def get_waveform_urls(path: str):
+    """
+    序列化器使用：各分辨率波形文件的地址
+    还没有生成时提交后台生成并返回 None，播放器按原来的方式处理
+    """
+    if not supports_waveform(path):
+        return None
+    if not is_generated(path):
+        schedule_waveform(path)
+        return None
+    return {str(points): f"/waveform/{points}/{quote(path)}" for points in RESOLUTIONS}
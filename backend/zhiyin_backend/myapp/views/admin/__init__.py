@@ -8,4 +8,6 @@ from myapp.views.admin.notice import *
 from myapp.views.admin.song import *
 from myapp.views.admin.language import *
 from myapp.views.admin.comment import *
-from myapp.views.admin.playList import *
\ No newline at end of file
+from myapp.views.admin.playList import *
+from myapp.views.admin.profile import *
+from myapp.views.admin.slow_query import *
@@ -4,20 +4,28 @@ from rest_framework.request import Request
 from django.shortcuts import get_object_or_404
 from myapp.auth.authentication import AdminAuthentication
 from myapp.logging.logger import logger
+from myapp.logging.tracing import get_tracer
 from myapp.models import Advertise
 
 from myapp.serializers import AdSerializer
+from myapp.utils.cache import reference_cache, ADVERTISE_LIST_KEY, get_advertise_list_data
 from myapp.utils.common import validate_upload_size
-from myapp.utils.pagination import paginate_and_respond
+from myapp.utils.pagination import paginate_and_respond, paginate_data_and_respond
 from myapp.utils.response import success, error
 
 from django.db.models import Q
 
+tracer = get_tracer("admin.advertise")
+
 
 @api_view(["GET"])
 def get_advertise_list(request):
     keyword = request.query_params.get("keyword", "").strip()
 
+    # 无搜索条件时直接使用缓存中的完整列表
+    if not keyword:
+        return paginate_data_and_respond(get_advertise_list_data(), request, msg="查询成功")
+
     filters = Q()
     if keyword:
         filters |= Q(title__icontains=keyword)
@@ -52,6 +60,7 @@ def create_advertise(request: Request):
     serializer = AdSerializer(data=data, context={"request": request})
     if serializer.is_valid():
         serializer.save()
+        reference_cache.invalidate(ADVERTISE_LIST_KEY)
         return success(msg="创建成功", data=serializer.data)
     else:
         logger.error(serializer.errors)
@@ -67,11 +76,11 @@ def update_advertise(request: Request, pk: str):
     # 清除空字段，避免误更新为空
     data = request.data
     data = {k: v for k, v in data.items() if v not in [None, "", [], {}]}
-    print(data)
+    tracer.debug("更新广告 %s: %s", pk, data)
     serializer = AdSerializer(ad, data=data, partial=True, context={"request": request})
     if serializer.is_valid():
         serializer.save()
-        print(serializer.data)
+        reference_cache.invalidate(ADVERTISE_LIST_KEY)
         return success(msg="更新成功", data=serializer.data)
     else:
         logger.error(serializer.errors)
@@ -88,6 +97,7 @@ def delete_advertise(request: Request):
         return error(msg="请提供有效的 ID 列表")
 
     deleted_count, _ = Advertise.objects.filter(id__in=ids_arr).delete()
+    reference_cache.invalidate(ADVERTISE_LIST_KEY)
     if deleted_count == 0:
         return error(msg="没有找到要删除的广告")
     return success(msg=f"成功删除 {deleted_count} 个广告")
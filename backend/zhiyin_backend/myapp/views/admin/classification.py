@@ -6,9 +6,9 @@ from myapp.auth.authentication import AdminAuthentication
 from myapp.logging.logger import logger
 from myapp.models import Classification
 from myapp.serializers import ClassificationSerializer
-from myapp.utils.pagination import paginate_and_respond
+from myapp.utils.cache import reference_cache, CLASSIFICATION_LIST_KEY, get_classification_list_data
+from myapp.utils.pagination import paginate_and_respond, paginate_data_and_respond
 from myapp.utils.response import error, success
-from django.db.models import Q
 
 
 @api_view(['GET'])
@@ -16,11 +16,11 @@ from django.db.models import Q
 def get_classification_list(request: Request):
     keyword = request.query_params.get("keyword", "").strip()
 
-    filters = Q()
-    if keyword:
-        filters &= Q(name__icontains=keyword)
+    # 无搜索条件时直接使用缓存中的完整列表
+    if not keyword:
+        return paginate_data_and_respond(get_classification_list_data(), request, msg="查询成功")
 
-    queryset = Classification.objects.filter(filters).order_by("-id")
+    queryset = Classification.objects.filter(name__icontains=keyword).order_by("-id")
 
     return paginate_and_respond(queryset, request, ClassificationSerializer, context={"request": request},
                                 msg="查询成功")
@@ -40,6 +40,7 @@ def create_classification(request: Request):
     serializer = ClassificationSerializer(data={"name": name})
     if serializer.is_valid():
         serializer.save()
+        reference_cache.invalidate(CLASSIFICATION_LIST_KEY)
         return success(msg='创建成功', data=serializer.data)
 
     logger.error(f"分类创建失败: {serializer.errors}")
@@ -68,6 +69,7 @@ def update_classification(request: Request, pk: str):
     serializer = ClassificationSerializer(classification, data=data)
     if serializer.is_valid():
         serializer.save()
+        reference_cache.invalidate(CLASSIFICATION_LIST_KEY)
         return success(msg="更新成功", data=serializer.data)
 
     logger.warning(f"分类更新失败：{serializer.errors}")
@@ -85,6 +87,7 @@ def delete_classification(request: Request):
 
     try:
         deleted_count, _ = Classification.objects.filter(id__in=ids).delete()
+        reference_cache.invalidate(CLASSIFICATION_LIST_KEY)
         return success(msg=f"删除成功，共删除 {deleted_count} 条分类记录")
     except Exception as e:
         logger.error(f"批量删除分类失败：{str(e)}")
@@ -6,9 +6,9 @@ from myapp.auth.authentication import AdminAuthentication
 from myapp.logging.logger import logger
 from myapp.models import Language
 from myapp.serializers import LanguageSerializer
-from myapp.utils.pagination import paginate_and_respond
+from myapp.utils.cache import reference_cache, LANGUAGE_LIST_KEY, get_language_list_data
+from myapp.utils.pagination import paginate_and_respond, paginate_data_and_respond
 from myapp.utils.response import error, success
-from django.db.models import Q
 
 
 @api_view(['GET'])
@@ -16,11 +16,11 @@ from django.db.models import Q
 def get_language_list(request: Request):
     keyword = request.query_params.get("keyword", "").strip()
 
-    filters = Q()
-    if keyword:
-        filters &= Q(name__icontains=keyword)
+    # 无搜索条件时直接使用缓存中的完整列表
+    if not keyword:
+        return paginate_data_and_respond(get_language_list_data(), request, msg="查询成功")
 
-    queryset = Language.objects.filter(filters).order_by("-id")
+    queryset = Language.objects.filter(name__icontains=keyword).order_by("-id")
 
     return paginate_and_respond(queryset, request, LanguageSerializer, context={"request": request},
                                 msg="查询成功")
@@ -40,6 +40,7 @@ def create_language(request: Request):
     serializer = LanguageSerializer(data={"name": name})
     if serializer.is_valid():
         serializer.save()
+        reference_cache.invalidate(LANGUAGE_LIST_KEY)
         return success(msg='创建成功', data=serializer.data)
 
     logger.error(f"语言创建失败: {serializer.errors}")
@@ -68,6 +69,7 @@ def update_language(request: Request, pk: str):
     serializer = LanguageSerializer(language, data=data)
     if serializer.is_valid():
         serializer.save()
+        reference_cache.invalidate(LANGUAGE_LIST_KEY)
         return success(msg="更新成功", data=serializer.data)
 
     logger.warning(f"语言更新失败：{serializer.errors}")
@@ -85,6 +87,7 @@ def delete_language(request: Request):
 
     try:
         deleted_count, _ = Language.objects.filter(id__in=ids).delete()
+        reference_cache.invalidate(LANGUAGE_LIST_KEY)
         return success(msg=f"删除成功，共删除 {deleted_count} 条语言记录")
     except Exception as e:
         logger.error(f"批量删除语言失败：{str(e)}")
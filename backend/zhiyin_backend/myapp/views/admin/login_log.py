@@ -10,6 +10,7 @@ from myapp.utils.pagination import paginate_and_respond
 from myapp.models import LoginLog
 from myapp.serializers import LoginLogSerializer
 from myapp.utils.response import error, success
+from myapp.utils.retention import raw_delete, truncate_table
 
 
 @api_view(['GET'])
@@ -49,16 +50,13 @@ def delete_login_logs(request:Request):
     ids = request.data
 
     if not ids or not isinstance(ids, list):
-        print(type(ids))
         return error(msg="请提供待删除的 ID 列表")
-    
 
-    queryset = LoginLog.objects.filter(id__in=ids)
-    deleted_count = queryset.count()
+    # 登录日志没有关联数据，直接删除，不加载记录
+    deleted_count = raw_delete(LoginLog.objects.filter(id__in=ids))
     if deleted_count == 0:
         return error(msg="未找到指定的日志记录")
 
-    queryset.delete()
     return success(msg=f"删除成功，共删除 {deleted_count} 条记录")
 
 
@@ -73,12 +71,12 @@ def clear_login_logs(request: Request):
     if confirm != "true":
         return error(msg="请确认是否清空日志：传入参数 ?confirm=true")
 
-    count = LoginLog.objects.count()
-    if count == 0:
+    if not LoginLog.objects.exists():
         return success(msg="日志已为空，无需清除")
 
-    LoginLog.objects.all().delete()
+    # 整表清空（MySQL 下为 TRUNCATE），不逐行删除
+    truncate_table(LoginLog)
 
-    logger.info(f"管理员 {request.user.username} 清空了所有登录日志（共 {count} 条）")
+    logger.info(f"管理员 {request.user.username} 清空了所有登录日志")
 
-    return success(msg=f"删除成功，共清除 {count} 条登录日志")
\ No newline at end of file
+    return success(msg="删除成功，已清空登录日志")
\ No newline at end of file
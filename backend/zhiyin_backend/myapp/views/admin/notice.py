@@ -6,6 +6,9 @@ from rest_framework.request import Request
 from myapp.auth.authentication import AdminAuthentication
 from myapp.models import UserNotice, SystemNotice
 from myapp.serializers import SystemNoticeSerializer
+from myapp.utils.notice_counter import bump_unread_version
+from myapp.utils.notice_delivery import start_notice_delivery, get_delivery_progress
+from myapp.utils.notice_push import publish_notice
 from myapp.utils.pagination import paginate_and_respond
 from myapp.utils.response import success, error
 
@@ -41,7 +44,8 @@ def list_all_notices(request: Request):
 @authentication_classes([AdminAuthentication])
 def create_notice_all(request: Request):
     """
-    创建并发送系统公告给所有用户
+    创建系统公告（面向所有用户）
+    公告只保存一条记录，用户读取时合并，不再为每个用户写入通知记录
     """
     data = request.data.copy()
     data["is_global"] = True
@@ -50,7 +54,8 @@ def create_notice_all(request: Request):
     serializer = SystemNoticeSerializer(data=data)
     if serializer.is_valid():
         notice = serializer.save()
-        notice.send_to_users()  # 会自动发送给所有用户
+        bump_unread_version()
+        publish_notice(notice)
         return success(msg="发送成功", data=serializer.data)
 
     return error(msg="验证失败", data=serializer.errors)
@@ -60,7 +65,8 @@ def create_notice_all(request: Request):
 @authentication_classes([AdminAuthentication])
 def create_notice_some(request: Request):
     """
-    创建并发送通知给指定用户
+    创建通知并提交后台投递任务，立即返回任务 ID（即通知 ID）
+    投递进度通过 get_notice_delivery_progress 查询
     """
     user_ids = request.POST.getlist("receivers")  # ['2', '5', '9']
 
@@ -73,13 +79,27 @@ def create_notice_some(request: Request):
 
     serializer = SystemNoticeSerializer(data=data)
     if serializer.is_valid():
-        notice = serializer.save()
-        notice.send_to_users(user_ids)
-        return success(msg="发送成功", data=serializer.data)
+        with transaction.atomic():
+            notice = serializer.save()
+            job_id = start_notice_delivery(notice, user_ids)
+        return success(
+            msg="已提交发送任务",
+            data={**serializer.data, "job_id": job_id, "progress": get_delivery_progress(notice)},
+        )
 
     return error(msg="验证失败", data=serializer.errors)
 
 
+@api_view(["GET"])
+@authentication_classes([AdminAuthentication])
+def get_notice_delivery_progress(request: Request, pk: str):
+    """
+    查询定向通知的投递进度
+    """
+    notice = get_object_or_404(SystemNotice, pk=pk)
+    return success(msg="查询成功", data=get_delivery_progress(notice))
+
+
 @api_view(["DELETE"])
 @authentication_classes([AdminAuthentication])
 def delete_notices(request: Request):
@@ -96,6 +116,7 @@ def delete_notices(request: Request):
     with transaction.atomic():
         UserNotice.objects.filter(notice_id__in=ids).delete()
         notices.delete()
+    bump_unread_version()
 
     return success(msg=f"成功删除 {count} 条通知")
 
@@ -116,6 +137,7 @@ def update_notice(request, pk: str):
     )
     if serializer.is_valid():
         serializer.save()
+        bump_unread_version()
         return success(msg="通知更新成功", data=serializer.data)
 
     return error(msg="更新失败", data=serializer.errors)
@@ -0,0 +1,52 @@
+# 请求性能分析结果
+import json
+
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, authentication_classes
+from rest_framework.request import Request
+
+from myapp.auth.authentication import AdminAuthentication
+from myapp.logging.logger import logger
+from myapp.utils.pagination import paginate_data_and_respond
+from myapp.utils.profiler import get_profile, get_profile_list, to_flamegraph_html, to_speedscope
+from myapp.utils.response import error
+
+
+@api_view(["GET"])
+@authentication_classes([AdminAuthentication])
+def get_request_profile_list(request: Request):
+    """
+    已保存的请求性能分析列表（最新的在前）
+    """
+    try:
+        return paginate_data_and_respond(get_profile_list(), request, msg="查询成功")
+    except Exception as e:
+        logger.error(f"性能分析列表获取失败：{str(e)}")
+        return error(msg="查询失败，请稍后再试")
+
+
+@api_view(["GET"])
+@authentication_classes([AdminAuthentication])
+def download_request_profile(request: Request, pk):
+    """
+    下载性能分析结果
+    GET 参数：
+        - type: speedscope（默认，可导入 https://www.speedscope.app）或 html（火焰图）
+    """
+    try:
+        profile = get_profile(pk)
+        if not profile:
+            return error(msg="分析结果不存在或已过期")
+
+        if request.query_params.get("type") == "html":
+            return HttpResponse(to_flamegraph_html(profile), content_type="text/html; charset=utf-8")
+
+        response = HttpResponse(
+            json.dumps(to_speedscope(profile), ensure_ascii=False),
+            content_type="application/json; charset=utf-8",
+        )
+        response["Content-Disposition"] = f'attachment; filename="profile-{pk}.speedscope.json"'
+        return response
+    except Exception as e:
+        logger.error(f"性能分析结果下载失败：{str(e)}")
+        return error(msg="下载失败，请稍后再试")
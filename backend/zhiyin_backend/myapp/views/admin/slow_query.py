@@ -0,0 +1,46 @@
+# 慢查询报告
+from rest_framework.decorators import api_view, authentication_classes
+from rest_framework.request import Request
+
+from myapp.auth.authentication import AdminAuthentication
+from myapp.logging.logger import logger
+from myapp.utils.response import error, success
+from myapp.utils.slow_query import THRESHOLD_MS, get_slow_query_report, reset_slow_queries
+
+
+@api_view(["GET"])
+@authentication_classes([AdminAuthentication])
+def get_slow_query_list(request: Request):
+    """
+    按 SQL 指纹汇总的慢查询
+    GET 参数：
+        - top: 返回前 N 条（默认 20）
+        - order: total 累计耗时（默认）、count 次数、max 最大耗时
+    """
+    try:
+        top = int(request.query_params.get("top", 20))
+        order = request.query_params.get("order", "total")
+        data = {
+            "thresholdMs": THRESHOLD_MS,
+            "list": get_slow_query_report(top, order),
+        }
+        return success(msg="查询成功", data=data)
+    except ValueError:
+        return error(msg="参数错误")
+    except Exception as e:
+        logger.error(f"慢查询报告获取失败：{str(e)}")
+        return error(msg="查询失败，请稍后再试")
+
+
+@api_view(["POST"])
+@authentication_classes([AdminAuthentication])
+def reset_slow_query(request: Request):
+    """
+    清空慢查询记录
+    """
+    try:
+        reset_slow_queries()
+        return success(msg="清空成功")
+    except Exception as e:
+        logger.error(f"慢查询记录清空失败：{str(e)}")
+        return error(msg="清空失败，请稍后再试")
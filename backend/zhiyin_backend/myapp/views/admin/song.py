@@ -1,14 +1,18 @@
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
 from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.request import Request
 
 from myapp.auth.authentication import AdminAuthentication
 from myapp.logging.logger import logger
-from myapp.models import Song
+from myapp.logging.tracing import get_tracer
+from myapp.models import ClassificationStats, Song, DailyStats
 from myapp.serializers import SongSerializer
 from myapp.utils.pagination import paginate_and_respond
 from myapp.utils.response import error, success
 
+tracer = get_tracer("admin.song")
+
 
 @api_view(['GET'])
 @authentication_classes([AdminAuthentication])
@@ -52,7 +56,9 @@ def create_song(request: Request):
     # 4. 组合数据并验证
     serializer = SongSerializer(data=data, context={'request': request})
     if serializer.is_valid():
-        serializer.save()
+        song = serializer.save()
+        DailyStats.incr(new_songs=1)
+        ClassificationStats.incr(song.classification_id, song_count=1)
         return success(msg='创建成功', data=serializer.data)
     else:
         logger.error(serializer.errors)
@@ -69,10 +75,14 @@ def update_song(request: Request, pk: str):
 
     # 只保留非空字段（包括 cover 和 source 字符串路径）
     data = {k: v for k, v in request.data.items() if v not in [None, ""]}
-    print(data)
+    tracer.debug("更新歌曲 %s: %s", pk, data)
     serializer = SongSerializer(instance=song, data=data, context={'request': request}, partial=True)
     if serializer.is_valid():
-        serializer.save()
+        old_classification_id = song.classification_id
+        song = serializer.save()
+        if song.classification_id != old_classification_id:
+            ClassificationStats.incr(old_classification_id, song_count=-1)
+            ClassificationStats.incr(song.classification_id, song_count=1)
         return success(msg='更新成功', data=serializer.data)
     else:
         logger.error(serializer.errors)
@@ -93,7 +103,15 @@ def delete_songs(request: Request):
         return error(msg='未找到任何匹配的歌曲')
 
     try:
-        songs.delete()
+        with transaction.atomic():
+            classification_counts = list(
+                songs.exclude(classification__isnull=True)
+                .values_list("classification_id")
+                .annotate(count=Count("id"))
+            )
+            songs.delete()
+            for classification_id, count in classification_counts:
+                ClassificationStats.incr(classification_id, song_count=-count)
         return success(msg=f'成功删除 {deleted_count} 首歌曲')
     except Exception as e:
         logger.error(f"批量删除出错: {e}")
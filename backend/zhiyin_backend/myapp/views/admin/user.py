@@ -8,7 +8,7 @@ from rest_framework.request import Request
 from myapp.auth.authentication import AdminAuthentication
 from myapp.auth.rate_throttle import UserRateThrottle
 from myapp.logging.logger import logger
-from myapp.models import User
+from myapp.models import User, DailyStats
 from myapp.serializers import CreateUserSerializer, AdminUserInfoSerializer
 from myapp.utils.common import is_valid_password, md5value, validate_upload_size, get_file_hash
 from myapp.utils.pagination import paginate_and_respond
@@ -39,6 +39,7 @@ def create_user(request: Request):
     serializer = CreateUserSerializer(data=data, context={"request": request})
     if serializer.is_valid():
         serializer.save()
+        DailyStats.incr(new_users=1)
         return success(data=serializer.data, msg="创建成功")
 
     logger.error("用户创建失败")
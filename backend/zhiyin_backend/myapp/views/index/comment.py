@@ -4,7 +4,7 @@ from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.request import Request
 
 from myapp.auth.authentication import UserAuthentication
-from myapp.models import Song, Comment, User, CommentLike
+from myapp.models import Song, Comment, User, CommentLike, DailyStats
 from myapp.serializers import CommentSerializer
 from myapp.utils.pagination import CustomPagination, paginate_and_respond
 from myapp.utils.response import success, error
@@ -91,6 +91,7 @@ def create_comment(request: Request):
     serializer = CommentSerializer(data=data)
     if serializer.is_valid():
         serializer.save(user=user, song=song)
+        DailyStats.incr(comments=1)
         return success(msg="评论成功", data=serializer.data)
     return error(msg="评论失败", data=serializer.errors)
 
@@ -128,6 +129,7 @@ def reply_comment(request: Request):
     serializer = CommentSerializer(data=data)
     if serializer.is_valid():
         serializer.save(user=request.user, song=song, parent=parent_comment)
+        DailyStats.incr(comments=1)
         return success(msg="回复成功", data=serializer.data)
 
     return error(msg="回复失败", data=serializer.errors)
@@ -1,13 +1,20 @@
+from rest_framework.decorators import api_view
+from rest_framework.request import Request
 from rest_framework.views import APIView
 from django.core.files.storage import default_storage
-from django.conf import settings
 import os
 
+from myapp.utils.chunked_upload import (
+    UploadError,
+    complete_session,
+    create_session,
+    get_session_info,
+    write_chunk,
+)
+from myapp.utils.common import UPLOAD_TYPES, check_upload_size
+from myapp.utils.images import schedule_derivatives
 from myapp.utils.response import error, success
-
-MAX_COVER_SIZE = settings.MAX_COVER_SIZE  # 10MB
-MAX_AUDIO_SIZE = settings.MAX_AUDIO_SIZE  # 50MB
-MAX_VIDEO_SIZE = settings.MAX_VIDEO_SIZE  # 100MB
+from myapp.utils.waveform import schedule_waveform
 
 
 class FileUploadView(APIView):
@@ -15,34 +22,73 @@ class FileUploadView(APIView):
         file = request.FILES.get("file")
         file_type = request.query_params.get("type")  # 例如 ?type=avatar
 
-        allowed_types = ["advertise", "avatar", "cover", "feedback","lyric", "source", "video"]
-
         if not file or not file_type:
             return error(msg="缺少文件或类型参数")
 
-        if file_type not in allowed_types:
+        if file_type not in UPLOAD_TYPES:
             return error(msg="不支持的文件类型")
 
         # 大小限制：图片、音频和视频类型
-        if file_type in ["advertise", "avatar", "cover", "feedback"]:
-            if file.size > MAX_COVER_SIZE:
-                return error(
-                    msg=f"图片文件不能超过 {MAX_COVER_SIZE // (1024 * 1024)}MB"
-                )
-        elif file_type == "source":
-            if file.size > MAX_AUDIO_SIZE:
-                return error(
-                    msg=f"音频文件不能超过 {MAX_AUDIO_SIZE // (1024 * 1024)}MB"
-                )
-        elif file_type == "video":
-            if file.size > MAX_VIDEO_SIZE:
-                return error(
-                    msg=f"视频文件不能超过 {MAX_VIDEO_SIZE // (1024 * 1024)}MB"
-                )
+        is_valid, error_msg = check_upload_size(file_type, file.size)
+        if not is_valid:
+            return error(msg=error_msg)
 
         # 保存文件
         path = default_storage.save(os.path.join(file_type, file.name), file)
+        # 封面、头像、广告图在后台生成衍生图，音频在后台生成波形
+        schedule_derivatives(path)
+        schedule_waveform(path)
 
         return success(
             {"message": "上传成功", "path": path}  # 只返回相对路径，例如 avatar/xxx.jpg
         )
+
+
+# 分片上传：初始化
+# 请求体：{"type": "source", "filename": "xxx.mp3", "size": 12345678}
+@api_view(["POST"])
+def init_chunk_upload(request: Request):
+    file_type = request.data.get("type")
+    filename = request.data.get("filename")
+    try:
+        size = int(request.data.get("size"))
+    except (TypeError, ValueError):
+        return error(msg="缺少文件大小参数")
+    if not file_type or not filename:
+        return error(msg="缺少文件名或类型参数")
+
+    try:
+        return success(create_session(file_type, filename, size))
+    except UploadError as e:
+        return error(msg=e.msg, data=e.data)
+
+
+# 分片上传：GET 查询进度（断点续传时取 offset），PUT 上传分片
+# PUT 请求体为分片的原始数据，参数 ?offset=已上传大小&checksum=分片的SHA-256
+@api_view(["GET", "PUT"])
+def chunk_upload(request: Request, upload_id: str):
+    try:
+        if request.method == "GET":
+            return success(get_session_info(upload_id))
+
+        try:
+            offset = int(request.query_params.get("offset"))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (TypeError, ValueError):
+            return error(msg="缺少分片位置参数")
+        info = write_chunk(upload_id, offset, request.stream, length, request.query_params.get("checksum"))
+        return success(info)
+    except UploadError as e:
+        return error(msg=e.msg, data=e.data)
+
+
+# 分片上传：完成，返回与普通上传相同的相对路径
+@api_view(["POST"])
+def complete_chunk_upload(request: Request, upload_id: str):
+    try:
+        path = complete_session(upload_id)
+    except UploadError as e:
+        return error(msg=e.msg, data=e.data)
+    schedule_derivatives(path)
+    schedule_waveform(path)
+    return success({"message": "上传成功", "path": path})
@@ -0,0 +1,137 @@
+# 上传文件访问（/upload/<path>）
+# 播放器拖动进度时只请求需要的区间（206 Partial Content），不再重新下载整个文件；
+# 文件内容交给 FileResponse，由服务器用 os.sendfile 发送，或者交给前端代理发送（MEDIA_SENDFILE_MODE）
+# 图片衍生图（/image/<variant>/<fmt>/<path>）不存在时同步生成，之后与上传文件一样从磁盘发送
+# 波形峰值文件（/waveform/<points>/<path>）由后台生成，还没有生成时返回 404
+
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods
+
+from myapp.logging.logger import logger
+from myapp.utils.images import (
+    FORMATS,
+    VARIANTS,
+    DerivativeFailedError,
+    ensure_derivatives,
+    get_variant_relpath,
+    supports_derivatives,
+)
+from myapp.utils.media import (
+    RangeFile,
+    RangeNotSatisfiable,
+    guess_content_type,
+    if_range_matches,
+    make_etag,
+    parse_range,
+    resolve_media_path,
+    sendfile_headers,
+)
+from myapp.utils.waveform import RESOLUTIONS, get_waveform_relpath, is_generated, schedule_waveform, supports_waveform
+
+# 衍生图按原图路径生成，原图路径不变内容就不变，可以长期缓存
+IMAGE_CACHE_MAX_AGE = 30 * 24 * 3600
+# 波形只由音频内容决定，音频文件按内容哈希命名，可以缓存一年
+WAVEFORM_CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media(request, path: str):
+    return _serve_file(request, path)
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_image_variant(request, variant: str, fmt: str, path: str):
+    if variant not in VARIANTS or fmt not in FORMATS or not supports_derivatives(path):
+        raise Http404("文件不存在")
+    try:
+        ensure_derivatives(path)
+    except (SuspiciousFileOperation, FileNotFoundError, DerivativeFailedError):
+        raise Http404("文件不存在")
+    except Exception as e:
+        logger.warning(f"衍生图生成失败: {path}, {e}", exc_info=False)
+        raise Http404("文件不存在")
+    return _serve_file(request, get_variant_relpath(path, variant, fmt), cache_max_age=IMAGE_CACHE_MAX_AGE)
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_waveform(request, points: int, path: str):
+    if points not in RESOLUTIONS or not supports_waveform(path):
+        raise Http404("文件不存在")
+    try:
+        generated = is_generated(path)
+    except SuspiciousFileOperation:
+        raise Http404("文件不存在")
+    if not generated:
+        schedule_waveform(path)
+        raise Http404("波形尚未生成")
+    return _serve_file(request, get_waveform_relpath(path, points), cache_max_age=WAVEFORM_CACHE_MAX_AGE)
+
+
+def _serve_file(request, path: str, cache_max_age: int = None):
+    try:
+        full_path = resolve_media_path(path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("文件不存在")
+    if not os.path.isfile(full_path):
+        raise Http404("文件不存在")
+
+    content_type = guess_content_type(full_path)
+
+    # 代理发送：Range、条件请求都由代理处理
+    proxy_headers = sendfile_headers(path, full_path)
+    if proxy_headers:
+        response = HttpResponse(content_type=content_type)
+        for key, value in proxy_headers.items():
+            response[key] = value
+        return response
+
+    size = stat_result.st_size
+    mtime = int(stat_result.st_mtime)
+    etag = make_etag(stat_result)
+
+    # If-None-Match / If-Modified-Since 等条件请求，命中时返回 304 或 412
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is not None:
+        return response
+
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and if_range_matches(request.headers.get("If-Range"), etag, mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        status, length = 206, end - start + 1
+    else:
+        start, status, length = 0, 200, size
+
+    if request.method == "HEAD":
+        response = HttpResponse(status=status, content_type=content_type)
+    elif byte_range:
+        response = FileResponse(RangeFile(open(full_path, "rb"), start, length), status=status,
+                                content_type=content_type)
+    else:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+
+    response["Content-Length"] = length
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(mtime)
+    if cache_max_age is None:
+        cache_max_age = getattr(settings, "MEDIA_CACHE_MAX_AGE", 86400)
+    response["Cache-Control"] = f"public, max-age={cache_max_age}"
+    return response
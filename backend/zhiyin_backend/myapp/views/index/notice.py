@@ -2,9 +2,11 @@ from myapp.auth.authentication import UserAuthentication
 
 from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.request import Request
+from django.db import transaction
 from django.utils.timezone import now
 from myapp.models import UserNotice, SystemNotice
 from myapp.serializers import UserNoticeSerializer, SystemNoticeSerializer
+from myapp.utils.notice_counter import get_unread_counts, decr_unread, reset_unread
 from myapp.utils.response import success, error
 
 
@@ -42,22 +44,7 @@ def get_announcement_list(request: Request):
     """
     获取系统公告列表（全体用户可见的发布状态公告），只返回未读公告
     """
-    user = request.user
-
-    # 全局公告，未读过滤逻辑：UserNotice 关联了公告和用户的已读状态
-    read_announcement_ids = UserNotice.objects.filter(
-        user=user, is_read=True, notice__type="announcement"
-    ).values_list("notice_id", flat=True)
-
-    announcements = (
-        SystemNotice.objects.filter(
-            status="0",
-            type="announcement",
-            is_global=True,
-        )
-        .exclude(id__in=read_announcement_ids)
-        .order_by("-create_time")
-    )
+    announcements = SystemNotice.unread_announcements(request.user).order_by("-create_time")
 
     serializer = SystemNoticeSerializer(announcements, many=True)
     return success(msg="查询成功", data=serializer.data)
@@ -68,17 +55,62 @@ def get_announcement_list(request: Request):
 def mark_notice_read(request: Request, pk: str):
     """
     标记用户通知为已读
+    全局公告没有预先写入的 UserNotice 记录，已读状态按需稀疏记录
     """
     user = request.user
+    notice = SystemNotice.objects.filter(pk=pk).first()
+    if notice and notice.is_global:
+        # 下线的公告不计入未读数，标记已读时不减少计数
+        if notice.mark_announcement_read(user) and notice.status == "0" and notice.type == "announcement":
+            decr_unread(user.id, "announcement")
+        return success(msg="标记成功")
+
     try:
-        user_notice = UserNotice.objects.get(user=user, notice_id=pk)
+        user_notice = UserNotice.objects.select_related("notice").get(user=user, notice_id=pk)
 
         if not user_notice.is_read:
             user_notice.is_read = True
             user_notice.read_time = now()
             user_notice.save(update_fields=["is_read", "read_time"])
+            if user_notice.notice.status == "0" and user_notice.notice.type == "notification":
+                decr_unread(user.id, "notification")
 
         return success(msg="标记成功")
 
     except UserNotice.DoesNotExist:
         return error(msg="通知不存在")
+
+
+@api_view(["GET"])
+@authentication_classes([UserAuthentication])
+def get_unread_count(request: Request):
+    """
+    获取当前用户的未读通知和公告数量（用于前端角标）
+    """
+    user = request.user
+    counts = get_unread_counts(user)
+
+    # 关闭推送的用户不展示个人通知
+    if not getattr(user, "push_switch", False):
+        counts["notification"] = 0
+
+    counts["total"] = counts["notification"] + counts["announcement"]
+    return success(msg="查询成功", data=counts)
+
+
+@api_view(["POST"])
+@authentication_classes([UserAuthentication])
+def mark_all_notice_read(request: Request):
+    """
+    将当前用户的所有通知和公告标记为已读
+    个人通知用一条 UPDATE 批量更新，公告只推进已读水位线
+    """
+    user = request.user
+    with transaction.atomic():
+        updated = UserNotice.objects.filter(user=user, is_read=False).update(
+            is_read=True, read_time=now()
+        )
+        SystemNotice.mark_all_announcements_read(user)
+    reset_unread(user)
+
+    return success(msg="全部标记成功", data={"updated": updated})
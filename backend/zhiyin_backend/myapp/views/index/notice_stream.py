@@ -0,0 +1,88 @@
+# 通知实时推送（Server-Sent Events）
+# 需要以 ASGI 方式部署（如 uvicorn zhiyin_backend.asgi:application），
+# 空闲连接只占用事件循环中的一个协程，不占用 worker 线程
+
+import asyncio
+import json
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from myapp.logging.logger import logger
+from myapp.models import User
+from myapp.utils.common import get_redis_token_key
+from myapp.utils.jwt_token import decode_jwt
+from myapp.utils.notice_push import get_notice_hub
+
+# 心跳间隔（秒），保持代理连接并及时发现客户端断开
+HEARTBEAT_SECONDS = 15
+
+
+async def _authenticate(request):
+    """
+    连接建立时校验一次 JWT（EventSource 无法设置请求头，也支持 ?token= 传参）
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    else:
+        token = request.GET.get("token")
+    if not token:
+        return None
+
+    payload = decode_jwt(token)
+    if not payload or not payload.get("user_id"):
+        return None
+
+    hub = get_notice_hub()
+    if not await hub.redis.exists(get_redis_token_key(token)):
+        return None
+
+    return await User.objects.filter(id=payload["user_id"]).afirst()
+
+
+async def _event_stream(hub, user, queue):
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+
+            # 关闭推送的用户只接收公告
+            if not user.push_switch and json.loads(data).get("type") == "notification":
+                continue
+            yield f"event: notice\ndata: {data}\n\n"
+    finally:
+        await hub.unsubscribe(user.id, queue)
+
+
+@require_GET
+async def notice_stream(request):
+    """
+    通知推送长连接，推送新的个人通知和系统公告
+    """
+    try:
+        user = await _authenticate(request)
+    except Exception as e:
+        logger.error(f"推送连接认证失败: {str(e)}")
+        return JsonResponse({"code": 1, "msg": "身份认证异常，请稍后再试", "data": None}, status=503)
+
+    if not user:
+        return JsonResponse({"code": 1, "msg": "Token 无效或已过期", "data": None}, status=401)
+
+    hub = get_notice_hub()
+    try:
+        queue = await hub.subscribe(user.id)
+    except Exception as e:
+        logger.error(f"推送订阅失败: {str(e)}")
+        return JsonResponse({"code": 1, "msg": "推送服务暂不可用", "data": None}, status=503)
+
+    response = StreamingHttpResponse(
+        _event_stream(hub, user, queue), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # 关闭 nginx 缓冲
+    return response
@@ -1,14 +1,20 @@
+import re
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
 from django.db.models import Q
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.request import Request
 
 from myapp.auth.authentication import UserAuthentication
 from myapp.logging.logger import logger
-from myapp.models import Song, Record, User
+from myapp.models import Song, Record, User, DailyStats
 from myapp.serializers import SongSerializer
 from myapp.utils.pagination import paginate_and_respond
 from myapp.utils.response import success, error
 from myapp.utils.common import get_recommend
+from myapp.utils.lyrics import filter_lyric_text, find_line, load_timeline
 from django.db import transaction
 
 
@@ -21,10 +27,12 @@ def get_song_list(request: Request):
     keyword = request.query_params.get('keyword', '').strip()
     classification_id = request.query_params.get("classification")  # 分类 ID
     language_id = request.query_params.get("language")  # 语言 ID
-    sort = request.query_params.get("sort", 'recent')  # 排序方式: recent / hot
+    sort = request.query_params.get("sort", 'recent')  # 排序方式: recent / hot / shortest / longest
+    min_duration = request.query_params.get("min_duration")  # 最短时长（秒）
+    max_duration = request.query_params.get("max_duration")  # 最长时长（秒）
 
     # 排序字段
-    order_by = '-plays' if sort == 'hot' else '-create_time'
+    order_by = {'hot': '-plays', 'shortest': 'duration', 'longest': '-duration'}.get(sort, '-create_time')
 
     # 构建基础过滤条件
     filters = Q(status='0')
@@ -35,6 +43,16 @@ def get_song_list(request: Request):
         filters &= Q(classification_id=classification_id)
     if language_id:
         filters &= Q(language_id=language_id)
+    try:
+        if min_duration:
+            filters &= Q(duration__gte=float(min_duration))
+        if max_duration:
+            filters &= Q(duration__lte=float(max_duration))
+    except ValueError:
+        return error(msg='时长参数不正确')
+    if sort in ('shortest', 'longest'):
+        # 还没有分析过的歌曲不参与时长排序
+        filters &= Q(duration__isnull=False)
 
     # 查询集
     queryset = Song.objects.filter(filters).order_by(order_by)
@@ -83,7 +101,7 @@ def add_plays(request: Request):
         with transaction.atomic():
             song = Song.objects.select_for_update().get(pk=song_id)
             song.plays = song.plays + 1
-            song.save()
+            song.save(update_fields=['plays'])
 
             # 记录用户浏览行为（协同过滤）
             if user_id is not None:
@@ -96,9 +114,96 @@ def add_plays(request: Request):
                     record.score += 1
                     record.save()
 
+            # 当日统计行是所有播放共用的热点行，在事务提交后更新，不在歌曲行锁内等待
+            transaction.on_commit(lambda: DailyStats.incr(plays=1))
+
         return success(msg='操作成功')
 
     except Song.DoesNotExist:
         return error(msg='对象不存在')
     except Exception as e:
         return error(msg=f'服务异常：{str(e)}')
+
+
+_GZIP_RE = re.compile(r"\bgzip\b")
+# 歌词搜索返回的最大歌曲数
+LYRIC_SEARCH_LIMIT = 20
+
+
+# 歌词时间轴
+@api_view(['GET'])
+def get_lyrics(request: Request, pk: str):
+    """
+    返回解析好的歌词时间轴 {"times": [毫秒], "lines": [歌词], "meta": {}}，支持 gzip 和 ETag 条件请求
+    ?at=毫秒 时只返回该时刻正在显示的行
+    """
+    try:
+        song = Song.objects.only('lyric').get(pk=pk)
+    except (Song.DoesNotExist, ValidationError):
+        return error(msg='歌曲不存在')
+    if not song.lyric:
+        return error(msg='该歌曲没有歌词')
+    try:
+        lyric = load_timeline(song.lyric)
+    except (OSError, SuspiciousFileOperation):
+        logger.warning(f"歌词文件不存在: {song.lyric}")
+        return error(msg='歌词文件不存在')
+
+    at = request.query_params.get('at')
+    if at is not None:
+        try:
+            at = int(at)
+        except ValueError:
+            return error(msg='at 参数必须是毫秒数')
+        index = find_line(lyric.times, at)
+        return success(msg='获取成功', data={
+            'index': index,
+            'time': lyric.times[index] if index >= 0 else None,
+            'line': lyric.lines[index] if index >= 0 else None,
+            'nextTime': lyric.times[index + 1] if index + 1 < len(lyric.times) else None,
+        })
+
+    # gzip 和原始内容是不同的表示，使用不同的强 ETag
+    use_gzip = bool(_GZIP_RE.search(request.headers.get('Accept-Encoding', '')))
+    etag = f'"{lyric.etag}-gzip"' if use_gzip else f'"{lyric.etag}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(lyric.gzip_body if use_gzip else lyric.body, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    # 管理员可能替换歌词文件，每次都要用 ETag 验证
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+# 按歌词搜索歌曲
+@api_view(['GET'])
+def search_lyrics(request: Request):
+    """返回歌词包含关键字的歌曲，以及第一处匹配的歌词和时间"""
+    keyword = request.query_params.get('keyword', '').strip()
+    if not keyword:
+        return error(msg='请输入关键字')
+    if len(keyword) > 50:
+        return error(msg='关键字过长')
+
+    songs = filter_lyric_text(Song.objects.filter(status='0'), keyword).only(
+        'id', 'title', 'singer', 'cover', 'lyric'
+    ).order_by('-plays')[:LYRIC_SEARCH_LIMIT]
+    lowered = keyword.lower()
+    results = []
+    for song in songs:
+        item = {'id': song.id, 'title': song.title, 'singer': song.singer, 'cover': song.cover,
+                'line': None, 'time': None}
+        try:
+            lyric = load_timeline(song.lyric)
+        except (OSError, SuspiciousFileOperation):
+            lyric = None
+        if lyric is not None:
+            for time, line in zip(lyric.times, lyric.lines):
+                if lowered in line.lower():
+                    item['line'], item['time'] = line, time
+                    break
+        results.append(item)
+    return success(msg='查询成功', data=results)
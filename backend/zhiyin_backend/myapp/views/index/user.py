@@ -7,7 +7,7 @@ from rest_framework.request import Request
 from django.core.cache import cache
 from myapp.auth.authentication import UserAuthentication
 from myapp.logging.logger import logger
-from myapp.models import User
+from myapp.models import User, DailyStats
 from myapp.serializers import CreateUserSerializer, UserInfoSerializer, LoginSerializer
 from myapp.utils.common import (
     md5value,
@@ -56,6 +56,7 @@ def user_register(request: Request):
     )
     if serializer.is_valid():
         serializer.save()
+        DailyStats.incr(new_users=1)
         return success(msg="创建成功")
     logger.error("用户注册失败")
     return error(msg="创建失败", data=serializer.errors)
@@ -248,7 +249,6 @@ def send_email_code(request: Request):
         send_email(email, subject, content)
         return success(msg="验证码已发送，请查收邮箱")
     except Exception as e:
-        print(f"[验证码发送失败] {e}")
         logger.error(
             f"验证码发送失败: {str(e)}",
         )
@@ -316,7 +316,6 @@ def send_reset_code(request: Request):
         send_email(email, subject, message)
         return success(msg="验证码已发送，请查收邮箱")
     except Exception as e:
-        print(f"[发送验证码失败] 邮箱: {email}, 错误: {e}")
         logger.error(
             f"发送验证码失败: {str(e)}",
         )
@@ -358,7 +357,6 @@ def reset_password(request: Request):
     except User.DoesNotExist:
         return error(msg="用户不存在")
     except Exception as e:
-        print(f"[重置密码失败] 邮箱: {email}, 错误: {e}")
         logger.error(
             f"重置密码失败: {str(e)}",
         )
@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+通知实时推送（notice/stream/）是异步视图，需要通过 ASGI 服务器运行，例如：
+    uvicorn zhiyin_backend.asgi:application --host 0.0.0.0 --port 8000
 """
 
 import os
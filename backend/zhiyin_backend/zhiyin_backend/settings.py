@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "myapp.middleware.RequestContextMiddleware",  # 请求日志上下文（请求 ID）
     "corsheaders.middleware.CorsMiddleware",  # 跨域中间件
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -54,6 +55,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "myapp.middleware.RequestMetricsMiddleware",  # 请求指标统计
+    "myapp.middleware.RequestProfilerMiddleware",  # 按需性能分析
 ]
 
 # 跨域配置
@@ -135,12 +138,89 @@ DATETIME_FORMAT = "Y-m-d H:i:s"
 
 MEDIA_ROOT = os.path.join(BASE_DIR, "upload/")  # 上传文件的根目录
 MEDIA_URL = "/upload/"  # 访问上传文件的URL前缀
+# 上传文件按内容哈希保存，相同内容只保存一份（myapp.utils.storage）
+STORAGES = {
+    "default": {"BACKEND": "myapp.utils.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+# 引用数为 0 的媒体文件至少保留的小时数（上传后到表单提交之间不会被回收）
+MEDIA_BLOB_GRACE_HOURS = 24
+# 孤立文件回收（collect_orphaned_media）时保留的文件：没有被业务数据引用的默认头像、默认封面
+MEDIA_GC_KEEP_PATHS = ["avatar/default.png", "cover/default.png"]
+# 图片衍生图（myapp.utils.images）：尺寸名称 -> 宽度，高度按类型的宽高比计算
+IMAGE_VARIANTS = {"thumb": 96, "list": 300, "detail": 800}
+# 生成衍生图的上传类型及宽高比
+IMAGE_ASPECT_RATIOS = {"avatar": 1.0, "cover": 1.0, "advertise": 16 / 9}
+IMAGE_WEBP_QUALITY = 80
+IMAGE_JPEG_QUALITY = 82
+# 生成衍生图的进程数（每个 Web 进程）
+IMAGE_PROCESS_WORKERS = 2
+# 分析音频文件（时长、码率、内嵌封面等）的进程数（每个 Web 进程）
+AUDIO_PROCESS_WORKERS = 2
+# 每个进程缓存的已解析歌词数量
+LYRIC_CACHE_SIZE = 256
+# 波形峰值（myapp.utils.waveform）：生成的点数，非 WAV 音频的解码器，生成波形的进程数（每个 Web 进程）
+WAVEFORM_RESOLUTIONS = [200, 800, 3200]
+WAVEFORM_FFMPEG = "ffmpeg"
+WAVEFORM_PROCESS_WORKERS = 1
+# 上传文件的发送方式：None 由应用发送（FileResponse），"x-accel-redirect"（nginx）或 "x-sendfile"（Apache / lighttpd）交给前端代理发送
+MEDIA_SENDFILE_MODE = None
+# X-Accel-Redirect 模式下 nginx 中指向 MEDIA_ROOT 的 internal location
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-upload/"
+# 上传文件的浏览器缓存时间（秒）
+MEDIA_CACHE_MAX_AGE = 86400
 # 图片大小限制
 MAX_COVER_SIZE = 2 * 1024 * 1024  # 2MB
 # 音频大小限制
 MAX_AUDIO_SIZE = 30 * 1024 * 1024  # 30M
 # 视频大小限制
 MAX_VIDEO_SIZE = 100 * 1024 * 1024  # 100M
+# 分片上传：单个分片的最大大小
+UPLOAD_CHUNK_MAX_SIZE = 8 * 1024 * 1024  # 8M
+# 分片上传会话的空闲过期时间（秒），过期后未完成的上传需要重新开始
+UPLOAD_SESSION_TTL = 24 * 3600
+
+# 定向通知后台投递：每批写入的用户数
+NOTICE_DELIVERY_CHUNK_SIZE = 1000
+# 投递任务心跳超时（秒），超时后认为执行进程已崩溃，任务可被重新抢占
+NOTICE_DELIVERY_STALE_SECONDS = 300
+# 用户未读通知计数缓存时间（秒），过期后从数据库重新计算
+NOTICE_UNREAD_COUNTER_TTL = 600
+# 仪表盘快照刷新间隔（秒），读请求总是直接返回最近一次生成的快照
+DASHBOARD_REFRESH_INTERVAL = 60
+# 仪表盘刷新锁超时（秒）
+DASHBOARD_REFRESH_LOCK_TIMEOUT = 120
+# 系统指标采样间隔（秒）和保留的历史采样数量
+SYS_METRICS_INTERVAL = 5
+SYS_METRICS_HISTORY_SIZE = 60
+# 请求指标合并到 Redis 的间隔（秒）
+METRICS_FLUSH_INTERVAL = 5
+# /metrics 抓取令牌（Prometheus 以 Bearer Token 方式携带），为空时只允许管理员访问
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# 按需性能分析：采样间隔（秒）、最多保留的结果数量、结果保存时间（秒）
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_MAX_PROFILES = 50
+PROFILER_TTL = 7 * 24 * 3600
+# 慢查询阈值（毫秒）及执行 EXPLAIN 的抽样比例
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_EXPLAIN_RATE = 0.1
+# 登录日志异步写入：队列容量（满了改为同步写入）、每批条数、最长等待时间（毫秒）
+LOGIN_LOG_QUEUE_SIZE = 10000
+LOGIN_LOG_BATCH_SIZE = 200
+LOGIN_LOG_FLUSH_INTERVAL_MS = 500
+# 离线 IP 归属地数据文件（ip2region xdb 格式）及查询结果缓存数量
+IP_REGION_DB_PATH = os.path.join(BASE_DIR, "data", "ip2region.xdb")
+IP_REGION_CACHE_SIZE = 10000
+# 过期数据保留天数（purge_expired_data 命令按此清理），不配置的表不清理
+DATA_RETENTION_DAYS = {
+    "login_log": 180,
+    "browse_history": 365,
+    "user_notice": 180,
+}
+# 过期数据分批删除：每批条数、每批之间休眠的毫秒数
+RETENTION_CHUNK_SIZE = 5000
+RETENTION_SLEEP_MS = 100
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -166,6 +246,10 @@ from concurrent_log_handler import ConcurrentRotatingFileHandler
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# 日志写入：记录器只挂 queue_* 处理器，调用线程把日志放入队列即返回，
+# 每个进程的后台线程再交给下面的控制台 / 文件处理器，文件写入、滚动和压缩都不占用请求线程
+# queue_* 按名称引用目标处理器，由 configure_logging 在全部处理器创建之后绑定
+LOGGING_CONFIG = "myapp.logging.handlers.configure_logging"
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -178,6 +262,9 @@ LOGGING = {
             "format": "{asctime} | {levelname:8} | {message}",
             "style": "{",
         },
+        "json": {
+            "()": "myapp.logging.formatters.JsonFormatter",
+        },
     },
     "handlers": {
         "console": {
@@ -192,7 +279,7 @@ LOGGING = {
             "filename": os.path.join(LOG_DIR, "system.log"),
             "maxBytes": 10 * 1024 * 1024,  # 10MB
             "backupCount": 30,  # 保留30个备份
-            "formatter": "verbose",
+            "formatter": "json",
             "encoding": "utf-8",
             "use_gzip": True,  # 压缩旧日志
         },
@@ -202,7 +289,7 @@ LOGGING = {
             "filename": os.path.join(LOG_DIR, "app.log"),
             "maxBytes": 10 * 1024 * 1024,  # 10MB
             "backupCount": 30,  # 保留30个备份
-            "formatter": "verbose",
+            "formatter": "json",
             "encoding": "utf-8",
             "use_gzip": True,  # 压缩旧日志
         },
@@ -212,44 +299,74 @@ LOGGING = {
             "filename": os.path.join(LOG_DIR, "error.log"),
             "maxBytes": 10 * 1024 * 1024,  # 10MB
             "backupCount": 30,  # 保留30个备份
-            "formatter": "verbose",
+            "formatter": "json",
             "encoding": "utf-8",
             "use_gzip": True,  # 压缩旧日志
         },
+        "queue_django": {
+            "class": "myapp.logging.handlers.AsyncHandler",
+            "handlers": ["console", "django_file", "error_file"],
+        },
+        "queue_db": {
+            "class": "myapp.logging.handlers.AsyncHandler",
+            "handlers": ["django_file"],
+        },
+        "queue_server": {
+            "class": "myapp.logging.handlers.AsyncHandler",
+            "handlers": ["console", "django_file"],
+        },
+        "queue_app": {
+            "class": "myapp.logging.handlers.AsyncHandler",
+            "handlers": ["console", "app_file", "error_file"],
+        },
     },
     "loggers": {
         "django": {
-            "handlers": ["console", "django_file", "error_file"],
+            "handlers": ["queue_django"],
             "level": "INFO",
             "propagate": False,
         },
         "django.request": {
-            "handlers": ["console", "django_file", "error_file"],
+            "handlers": ["queue_django"],
             "level": "WARNING",
             "propagate": False,
         },
         "django.db.backends": {
-            "handlers": ["django_file"],
+            "handlers": ["queue_db"],
             "level": "INFO",
             "propagate": False,
         },
         "django.server": {
-            "handlers": ["console", "django_file"],
+            "handlers": ["queue_server"],
             "level": "INFO",
             "propagate": False,
         },
         "myapp": {
-            "handlers": ["console", "app_file", "error_file"],
+            "handlers": ["queue_app"],
             "level": "DEBUG",
             "propagate": False,
         },
+        # 调试追踪（myapp.logging.tracing），改为 DEBUG 开启
+        "myapp.trace": {
+            "handlers": ["queue_app"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
     "root": {
-        "handlers": ["console", "app_file", "error_file"],
+        "handlers": ["queue_app"],
         "level": "INFO",
     },
 }
 
+# 日志采样：记录器名称 -> {级别: 保留比例}，未配置的级别全部保留，子记录器沿用上级配置
+LOG_SAMPLE_RATES = {}
+# 日志限流：记录器名称 -> (count, seconds)，同一调用位置 seconds 秒内最多记录 count 条，超出部分只统计数量
+# 对所有级别生效（包括 ERROR），默认不对整个记录器限流
+LOG_RATE_LIMITS = {}
+# 指定了 rate_key 的高频日志（慢查询、进程池失败等）在记录器没有配置限流时使用的限额
+LOG_RATE_KEY_LIMIT = (20, 60)
+
 # redis配置
 
 REDIS_HOST = "localhost"
@@ -16,9 +16,8 @@ Including another URLconf
 """
 
 from django.urls import path, include
-from django.conf.urls.static import static
-from zhiyin_backend import settings
 
+# 上传文件（MEDIA_URL）由 myapp.views.index.serve_media 提供，支持 Range 请求
 urlpatterns = [
     path("", include("myapp.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]